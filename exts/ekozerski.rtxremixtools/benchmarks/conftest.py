@@ -0,0 +1,179 @@
+"""
+Headless benchmarks of the RTX Remix Tools, only needing pxr (usd-core), numpy and pytest. From the
+"exts/ekozerski.rtxremixtools" folder:
+
+    python -m pytest benchmarks --bench-scale medium
+
+With "--bench-save", results are appended to a JSON history (~/.rtxremixtools/benchmark_results.json by default),
+which is only read otherwise. Each benchmark is compared with the latest run of a previous extension version on the
+same machine and scale (or the latest run at all when there's none), failing when it got slower than
+"--bench-max-slowdown" times.
+"""
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+
+import pytest
+
+
+EXTENSION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, EXTENSION_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_RESULTS_PATH = os.path.join(os.path.expanduser("~"), ".rtxremixtools", "benchmark_results.json")
+_SESSION_KEY = pytest.StashKey()
+
+
+def get_extension_version():
+    with open(os.path.join(EXTENSION_DIR, "config", "extension.toml")) as f:
+        match = re.search(r'^version\s*=\s*"([^"]+)"', f.read(), re.MULTILINE)
+    return match.group(1) if match else "unknown"
+
+
+def get_machine_id():
+    return f"{platform.node()}-{platform.machine()}-{os.cpu_count()}cpu-py{platform.python_version()}"
+
+
+class BenchmarkSession:
+    def __init__(self, config):
+        self.scale_name = config.getoption("bench_scale")
+        self.rounds = config.getoption("bench_rounds")
+        self.max_slowdown = config.getoption("bench_max_slowdown")
+        self.results_path = config.getoption("bench_results")
+        self.save_results = config.getoption("bench_save")
+        self.version = get_extension_version()
+        self.machine = get_machine_id()
+        self.results = dict()
+        self.history = self._load_history()
+        self.baseline = self._find_baseline()
+
+    def _load_history(self):
+        try:
+            with open(self.results_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"runs": []}
+
+    def _find_baseline(self):
+        runs = [
+            run for run in self.history["runs"]
+            if run["machine"] == self.machine and run["scale"] == self.scale_name
+        ]
+        previous_versions = [run for run in runs if run["version"] != self.version]
+        candidates = previous_versions or runs
+        return candidates[-1] if candidates else None
+
+    def record(self, name, timings, counters):
+        """
+        Stores the timings of a benchmark, returning a message when it regressed compared to the baseline.
+        """
+        result = {
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "rounds": len(timings),
+            "counters": counters,
+        }
+        self.results[name] = result
+        baseline_result = self.baseline["results"].get(name) if self.baseline else None
+        if baseline_result and result["min"] > baseline_result["min"] * self.max_slowdown:
+            return (
+                f"{name} regressed: {result['min']:.4f}s against {baseline_result['min']:.4f}s in version "
+                f"{self.baseline['version']} ({result['min'] / baseline_result['min']:.2f}x slower)."
+            )
+        return None
+
+    def save(self):
+        if not self.save_results or not self.results:
+            return
+        self.history["runs"].append({
+            "version": self.version,
+            "machine": self.machine,
+            "scale": self.scale_name,
+            "timestamp": time.time(),
+            "results": self.results,
+        })
+        os.makedirs(os.path.dirname(os.path.abspath(self.results_path)), exist_ok=True)
+        temp_path = f"{self.results_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.history, f, indent=1)
+        os.replace(temp_path, self.results_path)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("rtxremixtools benchmarks")
+    group.addoption(
+        "--bench-scale", default="small", help="Size of the synthetic captures: small, medium, large or huge."
+    )
+    group.addoption("--bench-rounds", type=int, default=3, help="Times each benchmark runs, the fastest one counting.")
+    group.addoption("--bench-results", default=DEFAULT_RESULTS_PATH, help="JSON file keeping the results history.")
+    group.addoption(
+        "--bench-max-slowdown", type=float, default=1.3,
+        help="Fails benchmarks slower than this many times their baseline.",
+    )
+    group.addoption("--bench-save", action="store_true", help="Adds this run to the results history.")
+
+
+def pytest_configure(config):
+    config.stash[_SESSION_KEY] = BenchmarkSession(config)
+
+
+def pytest_sessionfinish(session):
+    session.config.stash[_SESSION_KEY].save()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    benchmark_session = config.stash[_SESSION_KEY]
+    if not benchmark_session.results:
+        return
+    baseline = benchmark_session.baseline
+    terminalreporter.section(
+        f"rtxremixtools benchmarks ({benchmark_session.scale_name} scale, version {benchmark_session.version}"
+        f"{', baseline ' + baseline['version'] if baseline else ''})"
+    )
+    for name, result in benchmark_session.results.items():
+        baseline_result = baseline["results"].get(name) if baseline else None
+        ratio = f" ({result['min'] / baseline_result['min']:.2f}x baseline)" if baseline_result else ""
+        counters = ", ".join(f"{key}={value}" for key, value in result["counters"].items())
+        terminalreporter.write_line(
+            f"{name}: min {result['min']:.4f}s, median {result['median']:.4f}s{ratio}  {counters}"
+        )
+
+
+@pytest.fixture(scope="session")
+def bench_scale(request):
+    from synthetic_capture import SCALES
+
+    scale_name = request.config.getoption("bench_scale")
+    if scale_name not in SCALES:
+        raise pytest.UsageError(f"Unknown --bench-scale '{scale_name}', expected one of {', '.join(SCALES)}.")
+    return SCALES[scale_name]
+
+
+@pytest.fixture
+def remix_benchmark(request):
+    """
+    Runs "fn(*setup())" (or "fn()" when "setup" returns None) the configured number of rounds, only timing "fn", and
+    records the fastest round along with the given counters. Returns the last result of "fn".
+    """
+    benchmark_session = request.config.stash[_SESSION_KEY]
+
+    def run(fn, setup=None, rounds=None, **counters):
+        timings = list()
+        result = None
+        for _ in range(rounds or benchmark_session.rounds):
+            args = setup() if setup is not None else None
+            args = () if args is None else args
+            start = time.perf_counter()
+            result = fn(*args)
+            timings.append(time.perf_counter() - start)
+
+        regression = benchmark_session.record(request.node.name, timings, counters)
+        if regression:
+            pytest.fail(regression)
+        return result
+
+    return run
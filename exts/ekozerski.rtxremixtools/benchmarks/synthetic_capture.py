@@ -0,0 +1,244 @@
+"""
+Generates synthetic RTX Remix style captures (meshes, instances, lights and Looks) and mod files with DCC style meshes,
+at any scale, only depending on pxr and numpy. Captures are written straight as usda text, which is orders of magnitude
+faster than authoring millions of prims through the USD API. Can also run on its own, from the
+"exts/ekozerski.rtxremixtools" folder:
+
+    python benchmarks/synthetic_capture.py capture.usda --scale large
+    python benchmarks/synthetic_capture.py capture.usda --meshes 5000 --instances-per-mesh 20
+"""
+import argparse
+from collections import namedtuple
+import random
+
+import numpy
+from pxr import Sdf, UsdGeom, Vt
+
+
+CaptureScale = namedtuple('CaptureScale', ['meshes', 'instances_per_mesh', 'lights', 'materials', 'mesh_triangles'])
+SCALES = {
+    # About 6 thousand prim specs.
+    'small': CaptureScale(meshes=1000, instances_per_mesh=3, lights=100, materials=250, mesh_triangles=32),
+    # About 150 thousand prim specs.
+    'medium': CaptureScale(meshes=20000, instances_per_mesh=5, lights=2000, materials=5000, mesh_triangles=32),
+    # About 1.3 million prim specs.
+    'large': CaptureScale(meshes=100000, instances_per_mesh=10, lights=10000, materials=25000, mesh_triangles=16),
+    # About 3.6 million prim specs.
+    'huge': CaptureScale(meshes=250000, instances_per_mesh=12, lights=25000, materials=60000, mesh_triangles=8),
+}
+# Meshes cycle through a few geometry variants, so generating huge captures doesn't mean formatting huge arrays.
+GEOMETRY_VARIANTS = 16
+
+
+def count_capture_prims(scale: CaptureScale):
+    # Prim specs of the capture layer: mesh_HASH + its Mesh, one per instance and light, Material + Shader, plus
+    # RootNode and its 4 groups. Instances compose their mesh_HASH's children on top of that.
+    return scale.meshes * (2 + scale.instances_per_mesh) + scale.lights + scale.materials * 2 + 5
+
+
+def make_hashes(count, rng):
+    hashes = set()
+    while len(hashes) < count:
+        hashes.add(f"{rng.getrandbits(64):016X}")
+    return sorted(hashes)
+
+
+def _format_array(values, row_format):
+    return "[" + ", ".join(row_format % tuple(row) for row in values) + "]"
+
+
+def _format_int_array(values):
+    return "[" + ", ".join(str(int(value)) for value in values) + "]"
+
+
+def _make_triangle_strip(triangles, seed):
+    """
+    Vertex interpolated triangles, as the runtime produces them: points, normals and uvs of the same length.
+    """
+    rng = numpy.random.default_rng(seed)
+    vertex_ids = numpy.arange(triangles + 2)
+    xs = (vertex_ids // 2).astype(numpy.float64)
+    ys = (vertex_ids % 2).astype(numpy.float64)
+    points = numpy.stack([xs, ys, rng.uniform(-0.1, 0.1, len(xs))], axis=1) * rng.uniform(1, 50)
+    normals = numpy.tile([0.0, 0.0, 1.0], (len(points), 1))
+    uvs = numpy.stack([xs / max(xs[-1], 1), ys], axis=1)
+    indices = (numpy.arange(triangles)[:, None] + numpy.arange(3)).reshape(-1)
+    return points, normals, uvs, indices
+
+
+def _format_geometry_variant(triangles, seed):
+    points, normals, uvs, indices = _make_triangle_strip(triangles, seed)
+    return "\n".join([
+        "                uniform bool doubleSided = 1",
+        f"                int[] faceVertexCounts = {_format_int_array([3] * triangles)}",
+        f"                int[] faceVertexIndices = {_format_int_array(indices)}",
+        f"                normal3f[] normals = {_format_array(normals, '(%g, %g, %g)')} (",
+        '                    interpolation = "vertex"',
+        "                )",
+        f"                point3f[] points = {_format_array(points, '(%.5f, %.5f, %.5f)')}",
+        f"                texCoord2f[] primvars:texcoord = {_format_array(uvs, '(%.5f, %.5f)')} (",
+        '                    interpolation = "vertex"',
+        "                )",
+    ])
+
+
+def _format_transform(x, y, z):
+    return f"( (1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 0), ({x:.4f}, {y:.4f}, {z:.4f}, 1) )"
+
+
+def generate_capture(output_path, scale: CaptureScale, seed=0):
+    """
+    Writes a capture with the layout the runtime produces: /RootNode/meshes/mesh_HASH (holding a "mesh" Mesh bound to
+    a Looks material), /RootNode/instances/inst_HASH_N referencing them, /RootNode/lights/light_HASH and
+    /RootNode/Looks/mat_HASH. Returns the mesh hashes.
+    """
+    rng = random.Random(seed)
+    mesh_hashes = make_hashes(scale.meshes, rng)
+    light_hashes = make_hashes(scale.lights, rng)
+    material_hashes = make_hashes(scale.materials, rng) or ['0' * 16]
+    variants = [_format_geometry_variant(scale.mesh_triangles, seed + index) for index in range(GEOMETRY_VARIANTS)]
+
+    with open(output_path, 'w') as f:
+        f.write('#usda 1.0\n(\n    defaultPrim = "RootNode"\n    metersPerUnit = 0.01\n    upAxis = "Z"\n)\n\n')
+        f.write('def Xform "RootNode"\n{\n')
+
+        f.write('    def Scope "meshes"\n    {\n')
+        for index, mesh_hash in enumerate(mesh_hashes):
+            material_hash = material_hashes[index % len(material_hashes)]
+            f.write(
+                f'        def Xform "mesh_{mesh_hash}"\n        {{\n            def Mesh "mesh"\n            {{\n'
+                f'{variants[index % GEOMETRY_VARIANTS]}\n'
+                f'                rel material:binding = </RootNode/Looks/mat_{material_hash}>\n'
+                '            }\n        }\n'
+            )
+        f.write('    }\n\n')
+
+        f.write('    def Scope "instances"\n    {\n')
+        for mesh_hash in mesh_hashes:
+            for instance in range(scale.instances_per_mesh):
+                position = [rng.uniform(-10000, 10000) for _ in range(3)]
+                f.write(
+                    f'        def Xform "inst_{mesh_hash}_{instance}" (\n'
+                    f'            prepend references = </RootNode/meshes/mesh_{mesh_hash}>\n        )\n        {{\n'
+                    f'            matrix4d xformOp:transform = {_format_transform(*position)}\n'
+                    '            uniform token[] xformOpOrder = ["xformOp:transform"]\n        }\n'
+                )
+        f.write('    }\n\n')
+
+        f.write('    def Scope "lights"\n    {\n')
+        for light_hash in light_hashes:
+            position = [rng.uniform(-10000, 10000) for _ in range(3)]
+            f.write(
+                f'        def SphereLight "light_{light_hash}"\n        {{\n'
+                f'            color3f inputs:color = ({rng.random():.3f}, {rng.random():.3f}, {rng.random():.3f})\n'
+                f'            float inputs:intensity = {rng.uniform(100, 10000):.1f}\n'
+                f'            float inputs:radius = {rng.uniform(1, 20):.2f}\n'
+                f'            matrix4d xformOp:transform = {_format_transform(*position)}\n'
+                '            uniform token[] xformOpOrder = ["xformOp:transform"]\n        }\n'
+            )
+        f.write('    }\n\n')
+
+        f.write('    def Scope "Looks"\n    {\n')
+        for material_hash in material_hashes:
+            shader_path = f"/RootNode/Looks/mat_{material_hash}/Shader"
+            f.write(
+                f'        def Material "mat_{material_hash}"\n        {{\n'
+                f'            token outputs:mdl:surface.connect = <{shader_path}.outputs:out>\n'
+                '            def Shader "Shader"\n            {\n'
+                '                uniform token info:implementationSource = "sourceAsset"\n'
+                '                uniform asset info:mdl:sourceAsset = @AperturePBR_Opacity.mdl@\n'
+                '                uniform token info:mdl:sourceAsset:subIdentifier = "AperturePBR_Opacity"\n'
+                f'                asset inputs:diffuse_texture = @./textures/{material_hash}.a.rtex.dds@\n'
+                '                token outputs:out\n            }\n        }\n'
+            )
+        f.write('    }\n}\n')
+
+    return mesh_hashes
+
+
+def _make_quad_grid(size):
+    """
+    A DCC style mesh: quads, with faceVarying normals and uvs, which "Fix Meshes Geometry" has to convert.
+    """
+    xs, ys = numpy.meshgrid(numpy.arange(size + 1), numpy.arange(size + 1))
+    points = numpy.stack([xs.reshape(-1), ys.reshape(-1), numpy.zeros(xs.size)], axis=1).astype(numpy.float32)
+    corners = numpy.arange((size + 1) * (size + 1)).reshape(size + 1, size + 1)
+    quads = numpy.stack(
+        [corners[:-1, :-1], corners[:-1, 1:], corners[1:, 1:], corners[1:, :-1]], axis=-1
+    ).reshape(-1, 4)
+    indices = quads.reshape(-1).astype(numpy.int32)
+    normals = numpy.tile(numpy.array([0, 0, 1], dtype=numpy.float32), (len(indices), 1))
+    uvs = (points[indices, :2] / size).astype(numpy.float32)
+    return points, numpy.full(len(quads), 4, dtype=numpy.int32), indices, normals, uvs
+
+
+def generate_mod_meshes(output_path, mesh_count, grid_size=32):
+    """
+    Writes a mod file of "mesh_count" quad grids of grid_size x grid_size faces, each with a few UV maps named the way
+    DCC tools do and the display primvars the runtime doesn't use.
+    """
+    points, counts, indices, normals, uvs = _make_quad_grid(grid_size)
+    layer = Sdf.Layer.CreateNew(output_path)
+    with Sdf.ChangeBlock():
+        root_spec = Sdf.PrimSpec(layer, 'root', Sdf.SpecifierDef, 'Xform')
+        layer.defaultPrim = root_spec.name
+        for index in range(mesh_count):
+            mesh_spec = Sdf.PrimSpec(root_spec, f'mesh_{index}', Sdf.SpecifierDef, 'Mesh')
+            attributes = [
+                ('points', Sdf.ValueTypeNames.Point3fArray, Vt.Vec3fArray.FromNumpy(points + index), None),
+                ('faceVertexCounts', Sdf.ValueTypeNames.IntArray, Vt.IntArray.FromNumpy(counts), None),
+                ('faceVertexIndices', Sdf.ValueTypeNames.IntArray, Vt.IntArray.FromNumpy(indices), None),
+                ('normals', Sdf.ValueTypeNames.Normal3fArray, Vt.Vec3fArray.FromNumpy(normals), 'faceVarying'),
+                ('primvars:UVMap', Sdf.ValueTypeNames.TexCoord2fArray, Vt.Vec2fArray.FromNumpy(uvs), 'faceVarying'),
+                ('primvars:st1', Sdf.ValueTypeNames.TexCoord2fArray, Vt.Vec2fArray.FromNumpy(uvs), 'faceVarying'),
+                ('primvars:displayColor', Sdf.ValueTypeNames.Color3fArray, Vt.Vec3fArray([(1, 1, 1)]), 'constant'),
+            ]
+            for name, type_name, value, interpolation in attributes:
+                attr_spec = Sdf.AttributeSpec(mesh_spec, name, type_name)
+                attr_spec.default = value
+                if interpolation:
+                    attr_spec.SetInfo(UsdGeom.Tokens.interpolation, interpolation)
+    layer.Save()
+    return layer
+
+
+def define_face_varying_mesh(stage, path, triangle_count, seed=0):
+    """
+    Defines a triangulated mesh the way DCC tools export them: indexed points with faceVarying normals and uvs.
+    """
+    vertex_count = triangle_count // 2 + 3
+    rng = numpy.random.default_rng(seed)
+    mesh = UsdGeom.Mesh.Define(stage, path)
+    mesh.CreatePointsAttr(Vt.Vec3fArray.FromNumpy(rng.random((vertex_count, 3), dtype=numpy.float32)))
+    mesh.CreateFaceVertexCountsAttr(Vt.IntArray.FromNumpy(numpy.full(triangle_count, 3, dtype=numpy.int32)))
+    face_vertex_indices = rng.integers(0, vertex_count, triangle_count * 3, dtype=numpy.int32)
+    mesh.CreateFaceVertexIndicesAttr(Vt.IntArray.FromNumpy(face_vertex_indices))
+    mesh.CreateNormalsAttr(Vt.Vec3fArray.FromNumpy(rng.random((triangle_count * 3, 3), dtype=numpy.float32)))
+    mesh.SetNormalsInterpolation(UsdGeom.Tokens.faceVarying)
+    st = UsdGeom.PrimvarsAPI(mesh).CreatePrimvar(
+        'st', Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.faceVarying
+    )
+    st.Set(Vt.Vec2fArray.FromNumpy(rng.random((triangle_count * 3, 2), dtype=numpy.float32)))
+    return mesh
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output_path", help="The .usda capture file to write.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default='small')
+    parser.add_argument("--meshes", type=int, help="Overrides the number of meshes of the scale.")
+    parser.add_argument("--instances-per-mesh", type=int, help="Overrides the number of instances of each mesh.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    scale = SCALES[args.scale]
+    if args.meshes is not None:
+        scale = scale._replace(meshes=args.meshes)
+    if args.instances_per_mesh is not None:
+        scale = scale._replace(instances_per_mesh=args.instances_per_mesh)
+    generate_capture(args.output_path, scale, args.seed)
+    print(f"Wrote '{args.output_path}' with {count_capture_prims(scale)} prim specs.")
+
+
+if __name__ == "__main__":
+    main()
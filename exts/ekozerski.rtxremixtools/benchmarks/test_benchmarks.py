@@ -0,0 +1,218 @@
+"""
+Times the operations scaling with the size of captures and mods, on synthetic data. See conftest.py for the options and
+how results are compared between versions.
+"""
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("pxr")
+pytest.importorskip("numpy")
+
+from pxr import Sdf, Usd, UsdGeom  # noqa: E402
+
+from ekozerski.rtxremixtools.core import capture_merge, geometry, hashes  # noqa: E402
+from synthetic_capture import (  # noqa: E402
+    count_capture_prims, define_face_varying_mesh, generate_capture, generate_mod_meshes
+)
+
+
+@pytest.fixture(scope="session")
+def synthetic_capture(tmp_path_factory, bench_scale):
+    """
+    (capture path, mesh hashes).
+    """
+    capture_path = str(tmp_path_factory.mktemp("captures") / "capture.usda")
+    return capture_path, generate_capture(capture_path, bench_scale)
+
+
+@pytest.fixture(scope="session")
+def capture_stage(synthetic_capture):
+    return Usd.Stage.Open(synthetic_capture[0])
+
+
+@pytest.fixture(scope="session")
+def mod_meshes_path(tmp_path_factory, bench_scale):
+    mod_path = str(tmp_path_factory.mktemp("mods") / "meshes.usd")
+    generate_mod_meshes(mod_path, mesh_count=max(bench_scale.meshes // 100, 4))
+    return mod_path
+
+
+@pytest.fixture(scope="session")
+def synthetic_captures(tmp_path_factory, bench_scale):
+    """
+    Captures of different levels, imported one after the other. Never opened by other benchmarks, so each round
+    parses them again.
+    """
+    captures_dir = tmp_path_factory.mktemp("batch_captures")
+    capture_paths = [str(captures_dir / f"capture_{index}.usda") for index in range(BATCH_CAPTURE_COUNT)]
+    for index, capture_path in enumerate(capture_paths):
+        generate_capture(capture_path, bench_scale, seed=index)
+    return capture_paths
+
+
+@pytest.fixture
+def import_capture_path(synthetic_capture, tmp_path):
+    # A copy, so the layer opened by "capture_stage" isn't reused and the capture is parsed again every round.
+    import_path = str(tmp_path / "import_capture.usda")
+    shutil.copyfile(synthetic_capture[0], import_path)
+    return import_path
+
+
+def test_hash_index_build(remix_benchmark, capture_stage, synthetic_capture, bench_scale):
+    mesh_hashes = synthetic_capture[1]
+    remix_benchmark(
+        lambda: hashes.get_hash_index(capture_stage).get_mesh_path(mesh_hashes[0]),
+        setup=hashes.release_hash_index,
+        prims=count_capture_prims(bench_scale),
+    )
+    hashes.release_hash_index()
+
+
+def test_find_source_mesh_hash_prims(remix_benchmark, capture_stage, synthetic_capture):
+    hash_index = hashes.get_hash_index(capture_stage)
+    instance_paths = [path for mesh_hash in synthetic_capture[1] for path in hash_index.get_instance_paths(mesh_hash)]
+    source_meshes = remix_benchmark(
+        lambda: hashes.find_source_mesh_hash_prims(capture_stage, instance_paths), instances=len(instance_paths)
+    )
+    assert len(source_meshes) == len(synthetic_capture[1])
+    hashes.release_hash_index()
+
+
+def test_get_instance_paths(remix_benchmark, capture_stage, synthetic_capture):
+    hash_index = hashes.get_hash_index(capture_stage)
+    mesh_hashes = synthetic_capture[1]
+    # Building the index lazily on the first query, which "test_hash_index_build" already times.
+    hash_index.is_capture()
+    remix_benchmark(
+        lambda: [hash_index.get_instance_paths(mesh_hash) for mesh_hash in mesh_hashes], meshes=len(mesh_hashes)
+    )
+    hashes.release_hash_index()
+
+
+def test_copy_instances(remix_benchmark, capture_stage, bench_scale):
+    report = remix_benchmark(
+        lambda dest_stage: capture_merge.copy_instances(capture_stage, dest_stage),
+        setup=lambda: (Usd.Stage.CreateInMemory(),),
+        instances=bench_scale.meshes * bench_scale.instances_per_mesh,
+    )
+    assert report.added == bench_scale.meshes * bench_scale.instances_per_mesh
+
+
+@pytest.mark.parametrize("mode", ["layer", "stage"])
+def test_import_capture_usd(remix_benchmark, import_capture_path, bench_scale, mode):
+    remix_benchmark(
+        lambda dest_stage: capture_merge.import_capture(import_capture_path, dest_stage, mode),
+        setup=lambda: (Usd.Stage.CreateInMemory(),),
+        prims=count_capture_prims(bench_scale),
+    )
+
+
+BATCH_CAPTURE_COUNT = 4
+
+
+@pytest.mark.parametrize("parallel", [False, True], ids=["serial", "worker_processes"])
+def test_import_captures(remix_benchmark, synthetic_captures, bench_scale, parallel):
+    # Leaving a core to the main thread, as "Import Captures" does.
+    max_workers = (os.cpu_count() or 1) - 1 if parallel else 0
+    if parallel and max_workers < 1:
+        pytest.skip("Parsing captures in worker processes needs more than one CPU core.")
+    report = remix_benchmark(
+        lambda dest_stage: capture_merge.import_captures(synthetic_captures, dest_stage, max_workers),
+        setup=lambda: (Usd.Stage.CreateInMemory(),),
+        prims=count_capture_prims(bench_scale) * len(synthetic_captures),
+    )
+    assert report.instances.added == bench_scale.meshes * bench_scale.instances_per_mesh * len(synthetic_captures)
+
+
+def count_mod_meshes(mod_meshes_path):
+    layer = Sdf.Layer.OpenAsAnonymous(mod_meshes_path)
+    return len(layer.GetPrimAtPath('/root').nameChildren)
+
+
+def test_fix_meshes_in_file(remix_benchmark, mod_meshes_path, tmp_path):
+    work_path = str(tmp_path / "meshes.usd")
+
+    def setup():
+        # Fixing happens in place, so every round starts from a pristine copy.
+        shutil.copyfile(mod_meshes_path, work_path)
+
+    remix_benchmark(
+        lambda: geometry.fix_meshes_in_file(work_path), setup=setup, meshes=count_mod_meshes(mod_meshes_path)
+    )
+    fixed_stage = Usd.Stage.Open(work_path)
+    assert set(UsdGeom.Mesh(fixed_stage.GetPrimAtPath('/root/mesh_0')).GetFaceVertexCountsAttr().Get()) == {3}
+
+
+def test_convert_uv_primvars_to_st(remix_benchmark, mod_meshes_path):
+    def setup():
+        stage = Usd.Stage.Open(Sdf.Layer.OpenAsAnonymous(mod_meshes_path))
+        return stage, [UsdGeom.Mesh(prim) for prim in stage.Traverse() if prim.IsA(UsdGeom.Mesh)]
+
+    def convert(stage, meshes):
+        [geometry.convert_uv_primvars_to_st(mesh) for mesh in meshes]
+        return stage
+
+    stage = remix_benchmark(convert, setup=setup, meshes=count_mod_meshes(mod_meshes_path))
+    primvar_api = UsdGeom.PrimvarsAPI(stage.GetPrimAtPath('/root/mesh_0'))
+    primvar_names = [primvar.GetName() for primvar in primvar_api.GetPrimvars()]
+    assert 'primvars:st' in primvar_names and 'primvars:UVMap' not in primvar_names
+
+
+@pytest.mark.parametrize("vectorized", [True, False], ids=["vectorized", "per_element"])
+def test_convert_mesh_to_vertex_interpolation_mode(remix_benchmark, bench_scale, vectorized):
+    triangle_count = bench_scale.meshes * 10
+
+    def setup():
+        stage = Usd.Stage.CreateInMemory()
+        return stage, define_face_varying_mesh(stage, '/mesh', triangle_count)
+
+    def convert(stage, mesh):
+        geometry.convert_mesh_to_vertex_interpolation_mode(mesh, vectorized=vectorized)
+        return stage, mesh
+
+    stage, mesh = remix_benchmark(convert, setup=setup, triangles=triangle_count)
+    assert mesh.GetNormalsInterpolation() == UsdGeom.Tokens.vertex
+
+
+def create_export_stage_per_attribute(prim_path, mesh):
+    """
+    Previous implementation, reading every attribute twice through the composed stage.
+    """
+    stage = Usd.Stage.CreateInMemory()
+    UsdGeom.Xform.Define(stage, '/root')
+    new_mesh = UsdGeom.Mesh.Define(stage, f'/root/{prim_path.rsplit("/", 1)[-1]}')
+    [
+        new_mesh.GetPrim().CreateAttribute(attr.GetName(), attr.GetTypeName()).Set(attr.Get())
+        for attr in mesh.GetAttributes()
+        if attr.Get() and attr.GetName() in geometry.EXPORTED_MESH_ATTRIBUTES
+    ]
+    return stage, new_mesh.GetPath()
+
+
+@pytest.mark.parametrize(
+    "create_export_stage",
+    [geometry.create_export_stage, create_export_stage_per_attribute],
+    ids=["spec_copy", "per_attribute"],
+)
+def test_create_export_stage(remix_benchmark, bench_scale, tmp_path, create_export_stage):
+    triangle_count = bench_scale.meshes * 10
+    capture_path = str(tmp_path / "capture.usdc")
+    capture_stage = Usd.Stage.CreateNew(capture_path)
+    define_face_varying_mesh(capture_stage, '/RootNode/meshes/mesh_AAA/mesh', triangle_count)
+    capture_stage.Save()
+    del capture_stage
+    # Reopened from the file, so the values are read from the crate file like with real captures.
+    source_stage = Usd.Stage.Open(capture_path)
+    mesh = source_stage.GetPrimAtPath('/RootNode/meshes/mesh_AAA/mesh')
+    export_path = str(tmp_path / "mesh_AAA.usd")
+
+    def create_and_export():
+        stage, mesh_path = create_export_stage(mesh.GetPath().pathString, mesh)
+        stage.Export(export_path)
+        return mesh_path
+
+    mesh_path = remix_benchmark(create_and_export, triangles=triangle_count)
+    exported_stage = Usd.Stage.Open(export_path)
+    assert len(UsdGeom.Mesh(exported_stage.GetPrimAtPath(mesh_path)).GetNormalsAttr().Get()) == triangle_count * 3
@@ -1 +1,17 @@
-from .extension import *
+import multiprocessing
+
+
+def _is_running_in_kit():
+    # Worker processes spawned from Kit (e.g. to fix meshes) inherit its sys.path, so omni.ext may import there too.
+    if multiprocessing.parent_process() is not None:
+        return False
+    try:
+        import omni.ext
+    except ImportError:
+        # Imported outside Kit, where only the pxr based modules like the core package are usable.
+        return False
+    return True
+
+
+if _is_running_in_kit():
+    from .extension import *
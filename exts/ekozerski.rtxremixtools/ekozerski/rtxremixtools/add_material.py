@@ -1,36 +1,89 @@
 import os
+import re
 from typing import List
+import omni.kit.undo
 from omni import usd, kit
 from omni.kit.window.file_importer import get_file_importer
 from omni.client import make_relative_url
 
-from ekozerski.rtxremixtools.utils import find_source_mesh_hash_prim
+from ekozerski.rtxremixtools import profiling
+from ekozerski.rtxremixtools.commons import log_info, log_warn
+from ekozerski.rtxremixtools.core.hashes import find_source_mesh_hash_prims, get_free_child_name
 
 
-def open_add_material_dialog_for_prim(mesh_hash, ctx, current_stage):
+_MDL_COMMENTS_PATTERN = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_MDL_EXPORTED_MATERIAL_PATTERN = re.compile(r'\bexport\s+material\s+([A-Za-z_]\w*)\s*\(')
+# Normalized path -> (mtime_ns, exported material names)
+_mdl_material_names_cache = dict()
+
+
+def parse_mdl_material_names(mdl_source: str):
+    return _MDL_EXPORTED_MATERIAL_PATTERN.findall(_MDL_COMMENTS_PATTERN.sub('', mdl_source))
+
+
+def get_mdl_material_names(mdl_path):
+    """
+    Returns the materials exported by a MDL file, only reading it again when modified.
+    """
+    mdl_path = os.path.normcase(os.path.abspath(mdl_path))
+    try:
+        mtime_ns = os.stat(mdl_path).st_mtime_ns
+    except OSError:
+        return list()
+
+    cached_mtime_ns, material_names = _mdl_material_names_cache.get(mdl_path, (None, None))
+    if cached_mtime_ns != mtime_ns:
+        with open(mdl_path, 'r', encoding='utf-8', errors='replace') as f:
+            material_names = parse_mdl_material_names(f.read())
+        _mdl_material_names_cache[mdl_path] = (mtime_ns, material_names)
+    return material_names
+
+
+def pick_mdl_material_name(mdl_path):
+    material_names = get_mdl_material_names(mdl_path)
+    # Falling back to the Remix materials naming when the file can't be inspected (or exports many materials).
+    guessed_name = 'AperturePBR_Opacity' if 'Opacity' in os.path.basename(mdl_path) else 'AperturePBR_Translucent'
+    if len(material_names) == 1 or (material_names and guessed_name not in material_names):
+        return material_names[0]
+    return guessed_name
+
+
+@profiling.traced()
+def add_material_to_prims(mesh_hash_prims, mdl_path):
+    """
+    Creates a material from the MDL file under every mesh_HASH prim, grouped as a single undo entry.
+    """
+    current_stage = usd.get_context().get_stage()
+    mtl_name = pick_mdl_material_name(mdl_path)
+    editing_layer = current_stage.GetEditTarget().GetLayer()
+    relative_file_path = make_relative_url(editing_layer.realPath, mdl_path)
+    material_name = os.path.basename(mdl_path).replace('.mdl', '')
+    material_paths = list()
+    with profiling.trace("add_material.create_materials", prims=len(mesh_hash_prims)), omni.kit.undo.group():
+        for mesh_hash in mesh_hash_prims:
+            child_names = {child.GetName() for child in mesh_hash.GetAllChildren()}
+            new_material_path = mesh_hash.GetPath().AppendChild(get_free_child_name(child_names, material_name))
+            kit.commands.execute(
+                'CreateMdlMaterialPrimCommand',
+                mtl_url=relative_file_path,
+                mtl_name=mtl_name,
+                mtl_path=new_material_path.pathString,
+                select_new_prim=False,
+            )
+            material_paths.append(new_material_path.pathString)
+
+    selection = usd.get_context().get_selection()
+    selection.clear_selected_prim_paths()
+    selection.set_selected_prim_paths(material_paths, False)
+    log_info(f"Added material '{mtl_name}' from '{mdl_path}' to {len(material_paths)} prims.")
+
+
+def open_add_material_dialog_for_prims(mesh_hash_prims):
     def create_material_from_mdl_file(filename: str, dirname: str, selections: List[str] = []):
         if not filename.endswith('mdl'):
             raise ValueError(f"The selected file '{filename}' doesn't have a mdl extension.")
-        
-        mesh_hash_path = mesh_hash.GetPath().pathString
-        counter = 0
-        material_name = os.path.basename(filename).replace('.mdl', '')
-        new_material_path = mesh_hash_path + f'/{material_name}_{counter}'
-        while current_stage.GetPrimAtPath(new_material_path).IsValid():
-            counter += 1
-            new_material_path = mesh_hash_path + f'/{material_name}_{counter}'
-
-        # TODO: Get material name by inspecting the MDL file rather than guessing from it's name, so users can  
-              # rename it at will.
-        mtl_name = 'AperturePBR_Opacity' if 'Opacity' in filename else 'AperturePBR_Translucent'
-        editing_layer = current_stage.GetEditTarget().GetLayer()
-        relative_file_path = make_relative_url(editing_layer.realPath, os.path.join(dirname, filename))
-        success, _ = kit.commands.execute('CreateMdlMaterialPrimCommand',
-            mtl_url=relative_file_path,
-            mtl_name=mtl_name,
-            mtl_path=new_material_path,
-            select_new_prim=True,
-        )
+
+        add_material_to_prims(mesh_hash_prims, os.path.join(dirname, filename))
 
     def filter_handler(filename: str, _, extension_option):
         if extension_option == '.mdl':
@@ -51,12 +104,9 @@ def open_add_material_dialog():
     ctx = usd.get_context()
     current_stage = ctx.get_stage()
     selection = ctx.get_selection().get_selected_prim_paths()
-    selected_prims = {
-        path: current_stage.GetPrimAtPath(path)
-        for path in selection
-    }
-    source_meshes = [find_source_mesh_hash_prim(current_stage, prim) for prim in selected_prims.values()]
-    source_meshes = set([mesh for mesh in source_meshes if mesh is not None])
-
-    for mesh_hash in list(source_meshes):
-        open_add_material_dialog_for_prim(mesh_hash, ctx, current_stage)
+    source_meshes = find_source_mesh_hash_prims(current_stage, selection)
+    if not source_meshes:
+        log_warn("No prims to add a material to.")
+        return
+
+    open_add_material_dialog_for_prims(source_meshes)
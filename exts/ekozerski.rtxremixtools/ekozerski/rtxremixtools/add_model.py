@@ -1,105 +1,29 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
 from pathlib import Path
 from typing import List
 
 import omni
+import omni.kit.app
 from omni.client import make_relative_url
 from omni.kit.window.file_importer import get_file_importer
 from omni.kit.window.file_exporter import get_file_exporter
+from omni.kit.window.filepicker import FilePickerDialog
 import omni.usd as usd
-from pxr import UsdGeom, Usd, Sdf
+from pxr import Usd, Sdf
 
-from ekozerski.rtxremixtools.utils import find_inst_hash_prim, find_source_mesh_hash_prim
-from ekozerski.rtxremixtools.commons import log_info
-from ekozerski.rtxremixtools import mesh_utils
+from ekozerski.rtxremixtools.core.hashes import (
+    MESHES_PATH, find_inst_hash_prim, find_source_mesh_hash_prims, get_free_child_name, get_hash_index,
+    is_a_captured_mesh,
+)
+from ekozerski.rtxremixtools.commons import log_error, log_info, log_warn, get_setting
+from ekozerski.rtxremixtools import mesh_utils, profiling
 
 
 class UserCache:
     LAST_OPENED_MODEL = None
-
-
-def open_export_dialog_for_captured_mesh(prim_path, mesh):
-    def setup_references_in_stage(current_stage, reference_file_location):
-        _, mesh_hash, __ = Usd.Prim.GetName(mesh.GetParent()).split('_')
-        xform_prim_path = f'/RootNode/meshes/mesh_{mesh_hash}/Xform_{mesh_hash}_0'
-        omni.kit.commands.execute('CreatePrim', prim_type='Xform', prim_path=xform_prim_path)
-
-        editing_layer = current_stage.GetEditTarget().GetLayer()
-        relative_file_path = make_relative_url(editing_layer.realPath, reference_file_location)
-        omni.kit.commands.execute('AddReference',
-            stage=current_stage,
-            prim_path=Sdf.Path(xform_prim_path),
-            reference=Sdf.Reference(relative_file_path)
-        )
-        selection = omni.usd.get_context().get_selection()
-        selection.clear_selected_prim_paths()
-        source_layer = mesh.GetPrimStack()[-1].layer
-        source_layer.Reload()
-        selection.set_selected_prim_paths([xform_prim_path], False)
-
-    def file_export_handler(filename: str, dirname: str, extension: str = "", selections: List[str] = []):
-        stage = Usd.Stage.CreateInMemory()
-        root_xform = UsdGeom.Xform.Define(stage, '/root').GetPrim()
-        stage.SetDefaultPrim(root_xform)
-        new_mesh = UsdGeom.Mesh.Define(stage, f'/root/{prim_path.rsplit("/", 1)[-1]}')
-
-        needed_attr_names = ['doubleSided', 'extent', 'faceVertexCounts', 'faceVertexIndices', 'normals', 'points', 'primvars:st']
-        [
-            new_mesh.GetPrim().CreateAttribute(attr.GetName(), attr.GetTypeName()).Set(attr.Get())
-            for attr in mesh.GetAttributes()
-            if attr.Get() and attr.GetName() in needed_attr_names
-        ]
-        mesh_utils.convert_mesh_to_vertex_interpolation_mode(new_mesh)
-        
-        ctx = usd.get_context()
-        current_stage = ctx.get_stage()
-        upAxis = UsdGeom.GetStageUpAxis(current_stage)
-        UsdGeom.SetStageUpAxis(stage, upAxis)
-
-        save_location = dirname + filename + extension
-        stage.Export(save_location)
-        setup_references_in_stage(current_stage, save_location)
-        
-        log_info(f"> Exporting {prim_path} in '{save_location}'")
-
-    source_layer = mesh.GetPrimStack()[-1].layer
-    rtx_remix_path_parts = source_layer.realPath.split(os.path.join("rtx-remix"), 1)
-    if len(rtx_remix_path_parts) > 1:
-        rtx_remix_path = os.path.join(rtx_remix_path_parts[0], "rtx-remix", "mods", "gameReadyAssets")
-    else:
-        rtx_remix_path = source_layer.realPath
-    
-    rtx_remix_path = os.path.join(rtx_remix_path, "CustomMesh")
-    
-    file_exporter = get_file_exporter()
-    file_exporter.show_window(
-        title=f'Export "{prim_path}"',
-        export_button_label="Save",
-        export_handler=file_export_handler,
-        filename_url=rtx_remix_path,
-    )
-
-
-def copy_original_mesh(prim_path, mesh, output_path):
-    stage = Usd.Stage.CreateInMemory()
-    root_xform = UsdGeom.Xform.Define(stage, '/root').GetPrim()
-    stage.SetDefaultPrim(root_xform)
-    new_mesh = UsdGeom.Mesh.Define(stage, f'/root/{prim_path.rsplit("/", 1)[-1]}')
-
-    needed_attr_names = ['doubleSided', 'extent', 'faceVertexCounts', 'faceVertexIndices', 'normals', 'points', 'primvars:st']
-    [
-        new_mesh.GetPrim().CreateAttribute(attr.GetName(), attr.GetTypeName()).Set(attr.Get())
-        for attr in mesh.GetAttributes()
-        if attr.Get() and attr.GetName() in needed_attr_names
-    ]
-    mesh_utils.convert_mesh_to_vertex_interpolation_mode(new_mesh)
-    
-    ctx = usd.get_context()
-    current_stage = ctx.get_stage()
-    upAxis = UsdGeom.GetStageUpAxis(current_stage)
-    UsdGeom.SetStageUpAxis(stage, upAxis)
-
-    stage.Export(output_path)
+    EXPORT_DIRECTORY_DIALOG = None
 
 
 def setup_references_in_stage(mesh, current_stage, reference_file_location):
@@ -125,8 +49,12 @@ def setup_references_in_stage(mesh, current_stage, reference_file_location):
 
 def open_export_dialog_for_captured_mesh(prim_path, mesh):
     def export_mesh(filename: str, dirname: str, extension: str = "", selections: List[str] = []):
+        from ekozerski.rtxremixtools.core import geometry
+
         file_location = dirname + filename + extension
-        copy_original_mesh(prim_path, mesh, file_location)
+        weld = get_setting("weld_vertices", False)
+        weld_tolerance = get_setting("weld_tolerance", geometry.DEFAULT_WELD_TOLERANCE)
+        geometry.copy_original_mesh(prim_path, mesh, file_location, weld, weld_tolerance)
         ctx = usd.get_context()
         current_stage = ctx.get_stage()
         setup_references_in_stage(mesh, current_stage, file_location)
@@ -148,44 +76,40 @@ def open_export_dialog_for_captured_mesh(prim_path, mesh):
     )
 
 
-def open_import_dialog_for_add_models(prim_path):
-    def import_mesh(filename: str, dirname: str, selections: List[str] = []):
-        # TODO: Loop through all selections and add them all to the mesh_HASH with their respective xforms correctly named without collisions.
-        mesh_path = mesh.GetPath().pathString
-        new_selection = list()
-        counter = 0
-        for reference_file in selections:
-            xform_name = Path(reference_file).stem
-            new_mesh_path = mesh_path + f'/{xform_name}_{counter}'
-            while current_stage.GetPrimAtPath(new_mesh_path).IsValid():
-                counter += 1
-                new_mesh_path = mesh_path + f'/{xform_name}_{counter}'
-
-            omni.kit.commands.execute('CreatePrim', prim_type='Xform', prim_path=new_mesh_path)
-
-            editing_layer = current_stage.GetEditTarget().GetLayer()
-            relative_file_path = make_relative_url(editing_layer.realPath, reference_file)
-            omni.kit.commands.execute('AddReference',
-                stage=current_stage,
-                prim_path=Sdf.Path(new_mesh_path),
-                reference=Sdf.Reference(relative_file_path)
-            )
-            new_selection.append(new_mesh_path)
-            UserCache.LAST_OPENED_MODEL = os.path.dirname(reference_file)
-            counter += 1
-        source_layer = mesh.GetPrimStack()[-1].layer
-        source_layer.Reload()
-        selection = omni.usd.get_context().get_selection()
-        selection.clear_selected_prim_paths()
-        selection.set_selected_prim_paths(new_selection, False)
-        
+@profiling.traced()
+def add_models_to_prims(mesh_prims, reference_files):
+    """
+    References every model file under every mesh prim as a single undoable command, reloading each captured layer
+    once at the end.
+    """
+    current_stage = usd.get_context().get_stage()
+    editing_layer = current_stage.GetEditTarget().GetLayer()
+    relative_file_paths = [make_relative_url(editing_layer.realPath, file) for file in reference_files]
+    references = list()
+    for mesh in mesh_prims:
+        child_names = {child.GetName() for child in mesh.GetAllChildren()}
+        for reference_file, relative_file_path in zip(reference_files, relative_file_paths):
+            xform_name = get_free_child_name(child_names, Path(reference_file).stem)
+            references.append((mesh.GetPath().AppendChild(xform_name), relative_file_path))
 
-    ctx = usd.get_context()
-    current_stage = ctx.get_stage()
-    inst_prim = current_stage.GetPrimAtPath(prim_path)
-    mesh = find_source_mesh_hash_prim(current_stage, inst_prim)
+    _, new_paths = omni.kit.commands.execute('AddReferencedXformsCommand', references=references)
+    UserCache.LAST_OPENED_MODEL = os.path.dirname(reference_files[-1])
 
-    source_layer = mesh.GetPrimStack()[-1].layer
+    source_layers = {layer.identifier: layer for layer in (mesh.GetPrimStack()[-1].layer for mesh in mesh_prims)}
+    with profiling.trace("add_model.reload_layers", layers=len(source_layers)):
+        [layer.Reload() for layer in source_layers.values()]
+    selection = omni.usd.get_context().get_selection()
+    selection.clear_selected_prim_paths()
+    selection.set_selected_prim_paths([path.pathString for path in new_paths], False)
+    log_info(f"Added {len(reference_files)} models to {len(mesh_prims)} prims.")
+
+
+def open_import_dialog_for_add_models(mesh_prims):
+    def import_mesh(filename: str, dirname: str, selections: List[str] = []):
+        if selections:
+            add_models_to_prims(mesh_prims, selections)
+
+    source_layer = mesh_prims[0].GetPrimStack()[-1].layer
     filename_url = UserCache.LAST_OPENED_MODEL if UserCache.LAST_OPENED_MODEL is not None else source_layer.realPath
 
     file_importer = get_file_importer()
@@ -198,11 +122,159 @@ def open_import_dialog_for_add_models(prim_path):
 
 
 def open_add_model_dialog():
-    for path in usd.get_context().get_selection().get_selected_prim_paths():
-        open_import_dialog_for_add_models(path)
+    ctx = usd.get_context()
+    current_stage = ctx.get_stage()
+    mesh_prims = find_source_mesh_hash_prims(current_stage, ctx.get_selection().get_selected_prim_paths())
+    if not mesh_prims:
+        log_warn("No prims to add models to.")
+        return
+
+    open_import_dialog_for_add_models(mesh_prims)
+
+
+def _get_unique_export_paths(target_dir, mesh_hash, current_stage, taken_paths):
+    """
+    Names the exported file (and the Xform referencing it) after the mesh hash, never overwriting existing files.
+    """
+    stem = f'mesh_{mesh_hash}'
+    counter = 0
+    while True:
+        output_path = os.path.join(target_dir, f'{stem}.usd')
+        xform_path = MESHES_PATH.AppendChild(f'mesh_{mesh_hash}').AppendChild(stem)
+        is_taken = output_path in taken_paths or os.path.exists(output_path)
+        if not is_taken and not current_stage.GetPrimAtPath(xform_path):
+            taken_paths.add(output_path)
+            return output_path, xform_path
+        counter += 1
+        stem = f'mesh_{mesh_hash}_{counter}'
+
+
+@profiling.traced()
+async def setup_mesh_replacements_async(meshes, target_dir):
+    """
+    Exports every captured mesh into "target_dir" at once, named after their hashes, then references them all back
+    into their mesh_HASH prims in a single change block and undo entry.
+    """
+    from ekozerski.rtxremixtools.core import geometry
+    from ekozerski.rtxremixtools.progress import ProgressWindow
+
+    weld = get_setting("weld_vertices", False)
+    weld_tolerance = get_setting("weld_tolerance", geometry.DEFAULT_WELD_TOLERANCE)
+    current_stage = usd.get_context().get_stage()
+    hash_index = get_hash_index(current_stage)
+    meshes_by_hash = dict()
+    for prim_path, mesh in meshes.items():
+        mesh_hash = hash_index.get_owning_hash(prim_path)
+        if mesh_hash is None:
+            log_warn(f"Couldn't find the mesh_HASH of '{prim_path}', skipping it.")
+            continue
+        if mesh_hash in meshes_by_hash:
+            log_warn(
+                f"'{prim_path}' shares the hash {mesh_hash} of '{meshes_by_hash[mesh_hash][0]}', which is the only "
+                "one of them set up for replacement, skipping it."
+            )
+            continue
+        meshes_by_hash[mesh_hash] = (prim_path, mesh)
+    if not meshes_by_hash:
+        return
+
+    max_workers = min(get_setting("max_workers", 0) or os.cpu_count() or 1, len(meshes_by_hash))
+    progress = ProgressWindow("Setting up Mesh Replacements", total=len(meshes_by_hash))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = list()
+    export_jobs = dict()
+    exported_paths = list()
+    taken_paths = set()
+    progress.on_cancel = lambda: [future.cancel() for future in futures]
+    try:
+        for mesh_hash, (prim_path, mesh) in meshes_by_hash.items():
+            if progress.cancelled:
+                break
+            output_path, xform_path = _get_unique_export_paths(target_dir, mesh_hash, current_stage, taken_paths)
+            # Only reading the captured meshes happens on the main thread, processing and exporting run in parallel.
+            stage, mesh_path = geometry.create_export_stage(prim_path, mesh)
+            futures.append(executor.submit(
+                geometry.process_and_export_stage, stage, mesh_path, output_path, weld, weld_tolerance
+            ))
+            export_jobs[output_path] = (mesh, xform_path)
+            await omni.kit.app.get_app().next_update_async()
+
+        for future in asyncio.as_completed([asyncio.wrap_future(future) for future in futures]):
+            try:
+                output_path = await future
+            except asyncio.CancelledError:
+                # Only exports cancelled from the progress window are skipped, cancelling this task stops everything.
+                if not progress.cancelled:
+                    raise
+                progress.advance()
+                continue
+            except Exception as e:
+                log_error(f"Failed exporting mesh: {e}")
+                progress.advance()
+                continue
+
+            exported_paths.append(output_path)
+            progress.advance(os.path.basename(output_path))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        progress.close()
+
+    if not exported_paths:
+        return
+
+    editing_layer = current_stage.GetEditTarget().GetLayer()
+    references = [
+        (export_jobs[output_path][1], make_relative_url(editing_layer.realPath, output_path))
+        for output_path in exported_paths
+    ]
+    omni.kit.commands.execute('AddReferencedXformsCommand', references=references)
+
+    # Reloading once per captured layer rather than once per mesh.
+    source_layers = {
+        layer.identifier: layer
+        for layer in (export_jobs[output_path][0].GetPrimStack()[-1].layer for output_path in exported_paths)
+    }
+    with profiling.trace("add_model.reload_layers", layers=len(source_layers)):
+        [layer.Reload() for layer in source_layers.values()]
+
+    selection = usd.get_context().get_selection()
+    selection.clear_selected_prim_paths()
+    selection.set_selected_prim_paths([xform_path.pathString for xform_path, _ in references], False)
+    log_info(
+        f"Set up {len(exported_paths)} of {len(meshes_by_hash)} mesh replacements in '{target_dir}'"
+        f"{' (cancelled)' if progress.cancelled else ''}."
+    )
+
+
+def open_export_directory_dialog_for_captured_meshes(meshes):
+    def export_meshes(filename: str, dirname: str):
+        UserCache.EXPORT_DIRECTORY_DIALOG.hide()
+        asyncio.ensure_future(setup_mesh_replacements_async(meshes, dirname))
+
+    source_layer = next(iter(meshes.values())).GetPrimStack()[-1].layer
+    rtx_remix_path_parts = source_layer.realPath.split(os.path.join("rtx-remix"), 1)
+    rtx_remix_path = os.path.dirname(source_layer.realPath)
+    if len(rtx_remix_path_parts) > 1:
+        rtx_remix_path = os.path.join(rtx_remix_path_parts[0], "rtx-remix", "mods", "gameReadyAssets")
+
+    if UserCache.EXPORT_DIRECTORY_DIALOG is not None:
+        UserCache.EXPORT_DIRECTORY_DIALOG.destroy()
+    UserCache.EXPORT_DIRECTORY_DIALOG = FilePickerDialog(
+        f'Export {len(meshes)} Meshes to Folder',
+        apply_button_label="Export Here",
+        click_apply_handler=export_meshes,
+        item_filter_fn=lambda item: item.is_folder,
+    )
+    UserCache.EXPORT_DIRECTORY_DIALOG.navigate_to(rtx_remix_path)
 
 
 def open_mesh_replacement_setup_dialog():
-    for path, mesh in mesh_utils.get_selected_mesh_prims().items():
-        if mesh_utils.is_a_captured_mesh(mesh):
-            open_export_dialog_for_captured_mesh(path, mesh)
+    meshes = {
+        path: mesh
+        for path, mesh in mesh_utils.get_selected_mesh_prims().items()
+        if is_a_captured_mesh(mesh)
+    }
+    if len(meshes) == 1:
+        open_export_dialog_for_captured_mesh(*next(iter(meshes.items())))
+    elif meshes:
+        open_export_directory_dialog_for_captured_meshes(meshes)
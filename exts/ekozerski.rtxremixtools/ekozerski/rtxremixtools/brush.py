@@ -10,10 +10,11 @@ from omni.paint.brush.scatter.brush.ui import ParamsUi
 from omni import usd
 
 from . import commons
-from .utils import find_source_mesh_hash_prim
+from . import profiling
+from .core.hashes import find_source_mesh_hash_prim
 
 
-BRUSH_TYPE = "Remix Scatter"
+BRUSH_TYPE = commons.BRUSH_TYPE
 ORIGINAL_GET_DEFAULT_ROOT = get_default_root
 ORIGINAL_GET_STAGE_UP = get_stage_up
 FLIP_UP_AXIS = False
@@ -24,12 +25,8 @@ INST_SELECTION = None
 def select_source_mesh(selection) -> str:
     ctx = usd.get_context()
     current_stage = ctx.get_stage()
-    selected_prims = {
-        path: current_stage.GetPrimAtPath(path)
-        for path in selection
-    }
-
-    return find_source_mesh_hash_prim(current_stage, list(selected_prims.values())[0]).GetPath().pathString
+    source_mesh = find_source_mesh_hash_prim(current_stage, current_stage.GetPrimAtPath(selection[0]))
+    return source_mesh.GetPath().pathString if source_mesh else ""
 
 
 def get_inst_selection_path(prim_path: str) -> str:
@@ -41,6 +38,7 @@ def get_inst_selection_path(prim_path: str) -> str:
     return f"{inst_prim_path}"
 
 
+@profiling.traced()
 def custom_get_default_root(stage):
     ctx = usd.get_context()
     current_stage = ctx.get_stage()
@@ -156,6 +154,7 @@ class RemixScatterBrush(ScatterBrush):
 
     # called once at the beginning of a stroke, setup anything specific to the scripted brush functionality
     # return True if brush is valid, otherwise return False
+    @profiling.traced()
     def begin_stroke(self, *args, **kwargs):
         try:
             ctx = usd.get_context()
@@ -196,6 +195,7 @@ class RemixScatterBrush(ScatterBrush):
                 return False
     
     # called once at the end of a stroke
+    @profiling.traced()
     def end_stroke(self, *args, **kwargs):
         # Only remove pointInstancer prims when NOT using Point Instancing mode
         if self._brush.get("instancing") == INSTANCING.NONE:
@@ -223,6 +223,7 @@ class RemixScatterBrush(ScatterBrush):
 
         return (parent_transform, asset_up_axis)
     
+    @profiling.traced()
     def erase(self, position, *arg, **kwargs):
         """
         Reimplementing the erase method to support inst_<->mesh_ transform translation.
@@ -249,6 +250,7 @@ class RemixScatterBrush(ScatterBrush):
             return True
         return False
     
+    @profiling.traced()
     def _preload_assets(self, stage):
         if stage:
             paint_root = custom_get_default_root(stage) + PAINT_TOOL_ROOT_KIT
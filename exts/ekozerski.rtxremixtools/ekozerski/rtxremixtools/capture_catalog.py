@@ -0,0 +1,318 @@
+"""
+Persistent SQLite catalog of what every capture contains (mesh hashes and instance counts, lights, materials and
+textures), so questions like "which captures include this mesh" don't need to open each capture. Only depends on pxr,
+so it's shared between Kit and the command line, and safe to delete at any time.
+"""
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+import os
+import sqlite3
+import threading
+import time
+
+from pxr import Sdf
+
+from ekozerski.rtxremixtools.commons import log_error, log_info
+from ekozerski.rtxremixtools.core.hashes import MESHES_PATH, INSTANCES_PATH, parse_prim_hash
+
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser("~"), ".rtxremixtools", "capture_catalog.db")
+# Bump whenever the schema or what gets scanned changes, so the catalog is rebuilt from scratch.
+CATALOG_VERSION = 1
+USD_EXTENSIONS = ('.usd', '.usda', '.usdc')
+LIGHTS_PATH = Sdf.Path('/RootNode/lights')
+LOOKS_PATH = Sdf.Path('/RootNode/Looks')
+
+CaptureContents = namedtuple('CaptureContents', ['meshes', 'lights', 'materials', 'textures'])
+CatalogUpdate = namedtuple('CatalogUpdate', ['scanned', 'unchanged', 'removed', 'failed'])
+CaptureMatch = namedtuple('CaptureMatch', ['path', 'matched', 'instance_count'])
+_catalog_indexer = None
+
+_SCHEMA = """
+CREATE TABLE captures (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    directory TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX captures_directory ON captures(directory);
+CREATE TABLE capture_meshes (
+    capture_id INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+    mesh_hash TEXT NOT NULL,
+    instance_count INTEGER NOT NULL,
+    PRIMARY KEY (capture_id, mesh_hash)
+);
+CREATE INDEX capture_meshes_hash ON capture_meshes(mesh_hash);
+CREATE TABLE capture_lights (
+    capture_id INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+    light_hash TEXT NOT NULL,
+    PRIMARY KEY (capture_id, light_hash)
+);
+CREATE INDEX capture_lights_hash ON capture_lights(light_hash);
+CREATE TABLE capture_materials (
+    capture_id INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+    material_hash TEXT NOT NULL,
+    PRIMARY KEY (capture_id, material_hash)
+);
+CREATE INDEX capture_materials_hash ON capture_materials(material_hash);
+CREATE TABLE capture_textures (
+    capture_id INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+    texture_path TEXT NOT NULL,
+    PRIMARY KEY (capture_id, texture_path)
+);
+CREATE INDEX capture_textures_path ON capture_textures(texture_path);
+"""
+_TABLES = ['capture_textures', 'capture_materials', 'capture_lights', 'capture_meshes', 'captures']
+
+
+def normalize_path(path):
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def scan_capture(capture_path) -> CaptureContents:
+    """
+    Reads what a capture contains from its root layer alone. The layer is opened as anonymous, so it's never shared
+    with (or affected by) the layers Kit has open.
+    """
+    layer = Sdf.Layer.OpenAsAnonymous(capture_path)
+    if not layer:
+        raise ValueError(f"Couldn't open capture '{capture_path}'.")
+
+    def child_hashes(parent_path):
+        parent_spec = layer.GetPrimAtPath(parent_path)
+        hashes = [parse_prim_hash(name) for name in parent_spec.nameChildren.keys()] if parent_spec else list()
+        return [prim_hash for prim_hash in hashes if prim_hash is not None]
+
+    instance_counts = Counter(child_hashes(INSTANCES_PATH))
+    meshes = {mesh_hash: instance_counts.get(mesh_hash, 0) for mesh_hash in child_hashes(MESHES_PATH)}
+    meshes.update((mesh_hash, count) for mesh_hash, count in instance_counts.items() if mesh_hash not in meshes)
+
+    textures = set()
+    # Anonymous layers have no real path to anchor relative asset paths to, so they're resolved against the capture.
+    capture_dir = os.path.dirname(os.path.abspath(capture_path))
+
+    def collect_texture(path):
+        if not path.IsPropertyPath() or not path.name.startswith('inputs:'):
+            return
+        spec = layer.GetAttributeAtPath(path)
+        if spec and spec.typeName == Sdf.ValueTypeNames.Asset and spec.default and spec.default.path:
+            textures.add(normalize_path(os.path.join(capture_dir, spec.default.path)))
+
+    if layer.GetPrimAtPath(LOOKS_PATH):
+        layer.Traverse(LOOKS_PATH, collect_texture)
+
+    return CaptureContents(meshes, set(child_hashes(LIGHTS_PATH)), set(child_hashes(LOOKS_PATH)), textures)
+
+
+class CaptureCatalog:
+    def __init__(self, catalog_path=DEFAULT_CATALOG_PATH):
+        self.catalog_path = catalog_path
+        os.makedirs(os.path.dirname(catalog_path), exist_ok=True)
+        with self._transaction() as connection:
+            self._ensure_schema(connection)
+
+    @contextmanager
+    def _transaction(self):
+        # Short lived connections, so the catalog can be used from the indexer thread and the main thread at once.
+        with closing(sqlite3.connect(self.catalog_path, timeout=30)) as connection:
+            connection.execute("PRAGMA foreign_keys = ON")
+            with connection:
+                yield connection
+
+    def _ensure_schema(self, connection):
+        if connection.execute("PRAGMA user_version").fetchone()[0] == CATALOG_VERSION:
+            return
+        [connection.execute(f"DROP TABLE IF EXISTS {table}") for table in _TABLES]
+        connection.executescript(_SCHEMA)
+        connection.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+        # Readers don't block the indexer (and the other way around) in WAL mode.
+        connection.execute("PRAGMA journal_mode = WAL")
+
+    def _store(self, connection, capture_path, captures_dir, file_state, contents: CaptureContents):
+        connection.execute("DELETE FROM captures WHERE path = ?", (capture_path,))
+        capture_id = connection.execute(
+            "INSERT INTO captures (path, directory, size, mtime_ns, indexed_at) VALUES (?, ?, ?, ?, ?)",
+            (capture_path, captures_dir, *file_state, time.time()),
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO capture_meshes VALUES (?, ?, ?)",
+            [(capture_id, mesh_hash, count) for mesh_hash, count in contents.meshes.items()],
+        )
+        connection.executemany(
+            "INSERT INTO capture_lights VALUES (?, ?)", [(capture_id, value) for value in contents.lights]
+        )
+        connection.executemany(
+            "INSERT INTO capture_materials VALUES (?, ?)", [(capture_id, value) for value in contents.materials]
+        )
+        connection.executemany(
+            "INSERT INTO capture_textures VALUES (?, ?)", [(capture_id, value) for value in contents.textures]
+        )
+
+    def update(self, captures_dir, should_cancel=None) -> CatalogUpdate:
+        """
+        Scans the captures added or modified (by size and mtime) since the last update of "captures_dir", and forgets
+        the deleted ones. Each capture is committed on its own, so cancelling keeps everything scanned so far.
+        """
+        captures_dir = normalize_path(captures_dir)
+        file_states = dict()
+        with os.scandir(captures_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(USD_EXTENSIONS):
+                    stat = entry.stat()
+                    file_states[normalize_path(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+
+        with self._transaction() as connection:
+            indexed_states = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in connection.execute(
+                    "SELECT path, size, mtime_ns FROM captures WHERE directory = ?", (captures_dir,)
+                )
+            }
+            removed = [(path,) for path in indexed_states if path not in file_states]
+            connection.executemany("DELETE FROM captures WHERE path = ?", removed)
+
+        changed = sorted(path for path, state in file_states.items() if indexed_states.get(path) != state)
+        scanned = failed = 0
+        for capture_path in changed:
+            if should_cancel is not None and should_cancel():
+                break
+            try:
+                contents = scan_capture(capture_path)
+            except Exception as e:
+                log_error(f"Failed indexing capture '{capture_path}': {e}")
+                failed += 1
+                continue
+
+            with self._transaction() as connection:
+                self._store(connection, capture_path, captures_dir, file_states[capture_path], contents)
+            scanned += 1
+
+        return CatalogUpdate(
+            scanned=scanned, unchanged=len(file_states) - len(changed), removed=len(removed), failed=failed
+        )
+
+    def _find(self, table, column, values, match_all, captures_dir):
+        values = set(values)
+        if not values:
+            return list()
+
+        with self._transaction() as connection:
+            # A temp table rather than "IN (?, ?...)", which is limited in how many values it can take.
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS query_values (value TEXT PRIMARY KEY)")
+            connection.execute("DELETE FROM query_values")
+            connection.executemany("INSERT INTO query_values VALUES (?)", [(value,) for value in values])
+            instance_count = "SUM(t.instance_count)" if table == 'capture_meshes' else "0"
+            query = f"""
+                SELECT c.path, COUNT(*), {instance_count}
+                FROM {table} t
+                JOIN query_values q ON q.value = t.{column}
+                JOIN captures c ON c.id = t.capture_id
+                {'WHERE c.directory = ?' if captures_dir else ''}
+                GROUP BY c.id
+                {'HAVING COUNT(*) = ?' if match_all else ''}
+                ORDER BY COUNT(*) DESC, c.path
+            """
+            parameters = ([normalize_path(captures_dir)] if captures_dir else []) + ([len(values)] if match_all else [])
+            return [CaptureMatch(*row) for row in connection.execute(query, parameters)]
+
+    def find_captures_with_meshes(self, mesh_hashes, match_all=False, captures_dir=None):
+        """
+        Captures containing any (or all, with "match_all") of the mesh hashes, the ones matching the most first.
+        """
+        return self._find('capture_meshes', 'mesh_hash', mesh_hashes, match_all, captures_dir)
+
+    def find_captures_with_lights(self, light_hashes, match_all=False, captures_dir=None):
+        return self._find('capture_lights', 'light_hash', light_hashes, match_all, captures_dir)
+
+    def find_captures_with_materials(self, material_hashes, match_all=False, captures_dir=None):
+        return self._find('capture_materials', 'material_hash', material_hashes, match_all, captures_dir)
+
+    def find_captures_with_textures(self, texture_paths, match_all=False, captures_dir=None):
+        texture_paths = [normalize_path(path) for path in texture_paths]
+        return self._find('capture_textures', 'texture_path', texture_paths, match_all, captures_dir)
+
+
+class CatalogIndexer:
+    """
+    Keeps a catalog up to date from a single background thread, so scanning huge captures folders never blocks the UI.
+    """
+    def __init__(self, catalog: CaptureCatalog):
+        self.catalog = catalog
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="CaptureCatalog")
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._shutting_down = False
+
+    def _update(self, captures_dir):
+        start = time.perf_counter()
+        update = self.catalog.update(captures_dir, should_cancel=lambda: self._shutting_down)
+        if update.scanned or update.removed or update.failed:
+            log_info(
+                f"Indexed captures in '{captures_dir}' in {time.perf_counter() - start:.2f}s: {update.scanned} "
+                f"scanned, {update.unchanged} unchanged, {update.removed} removed, {update.failed} failed."
+            )
+        return update
+
+    def submit(self, captures_dir):
+        """
+        Returns a future of the CatalogUpdate, reusing the one already pending for the same folder.
+        """
+        captures_dir = normalize_path(captures_dir)
+        with self._lock:
+            future = self._pending.get(captures_dir)
+            if future is None or future.done():
+                future = self._pending[captures_dir] = self._executor.submit(self._update, captures_dir)
+            return future
+
+    def shutdown(self):
+        self._shutting_down = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def find_captures_dir(stage):
+    """
+    Finds the "rtx-remix/captures" folder from the stage's layers, working for capture, mod and project stages.
+    """
+    for layer in stage.GetLayerStack(includeSessionLayers=False):
+        if not layer.realPath:
+            continue
+
+        directory = os.path.dirname(layer.realPath)
+        while True:
+            candidates = [
+                directory, os.path.join(directory, "captures"), os.path.join(directory, "rtx-remix", "captures")
+            ]
+            for candidate in candidates:
+                if os.path.basename(candidate).lower() == "captures" and os.path.isdir(candidate):
+                    return candidate
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+    return None
+
+
+def get_catalog_indexer() -> CatalogIndexer:
+    global _catalog_indexer
+    if _catalog_indexer is None:
+        _catalog_indexer = CatalogIndexer(CaptureCatalog())
+    return _catalog_indexer
+
+
+def release_catalog_indexer():
+    global _catalog_indexer
+    if _catalog_indexer is not None:
+        _catalog_indexer.shutdown()
+        _catalog_indexer = None
+
+
+def index_captures_in_background(stage):
+    """
+    Brings the catalog of the stage's captures folder up to date in a background thread, only scanning the captures
+    changed since the last time.
+    """
+    captures_dir = find_captures_dir(stage) if stage else None
+    return get_catalog_indexer().submit(captures_dir) if captures_dir else None
@@ -0,0 +1,164 @@
+"""
+Command line entry point for running the RTX Remix Tools mesh processing outside Kit, only depending on pxr (usd-core)
+and numpy. From the "exts/ekozerski.rtxremixtools" folder:
+
+    python -m ekozerski.rtxremixtools.cli fix-meshes path/to/rtx-remix --workers 8
+    python -m ekozerski.rtxremixtools.cli find-captures path/to/rtx-remix --mesh 0123456789ABCDEF
+"""
+import argparse
+from concurrent.futures import as_completed
+import logging
+import os
+import sys
+import time
+
+from ekozerski.rtxremixtools import capture_catalog, mesh_fix_cache
+from ekozerski.rtxremixtools.core import geometry
+
+
+USD_EXTENSIONS = ('.usd', '.usda', '.usdc')
+
+
+def find_mod_usd_files(root_dir):
+    """
+    Recursively lists USD files under "root_dir". When pointed to a "rtx-remix" folder, only its
+    "mods/gameReadyAssets" folder is scanned. Captured files are never included.
+    """
+    game_ready_assets_dir = os.path.join(root_dir, "mods", "gameReadyAssets")
+    if os.path.isdir(game_ready_assets_dir):
+        root_dir = game_ready_assets_dir
+
+    usd_files = list()
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = sorted(dirname for dirname in dirnames if dirname != "captures")
+        usd_files.extend(
+            os.path.join(dirpath, filename)
+            for filename in sorted(filenames)
+            if filename.lower().endswith(USD_EXTENSIONS)
+        )
+    return usd_files
+
+
+def fix_meshes(args):
+    usd_files = find_mod_usd_files(args.path)
+    if not usd_files:
+        print(f"No USD files found in '{args.path}'.")
+        return 0
+
+    print(f"Fixing meshes in {len(usd_files)} files with {args.workers or os.cpu_count()} workers...")
+    start = time.perf_counter()
+    cache = mesh_fix_cache.MeshFixCache(args.cache)
+    failed = skipped = 0
+    try:
+        with geometry.create_process_pool(args.workers) as executor:
+            futures = [
+                executor.submit(
+                    geometry.fix_meshes_in_file_safe,
+                    path, args.weld, args.weld_tolerance, cache.get(path), args.force,
+                )
+                for path in usd_files
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                if result.error:
+                    failed += 1
+                    print(f"[{done}/{len(usd_files)}] FAILED {result.path}: {result.error}", file=sys.stderr)
+                    continue
+
+                cache.set(result.path, result.cache_entry)
+                skipped += result.skipped
+                print(f"[{done}/{len(usd_files)}] {'SKIPPED ' if result.skipped else ''}{result.path}")
+    finally:
+        cache.save()
+
+    fixed = len(usd_files) - failed - skipped
+    print(f"Done in {time.perf_counter() - start:.2f}s. {fixed} fixed, {skipped} already fixed, {failed} failed.")
+    return 1 if failed else 0
+
+
+def _get_captures_dir(path):
+    captures_dir = os.path.join(path, "captures")
+    return captures_dir if os.path.isdir(captures_dir) else path
+
+
+def index_captures(args):
+    start = time.perf_counter()
+    catalog = capture_catalog.CaptureCatalog(args.catalog)
+    update = catalog.update(_get_captures_dir(args.path))
+    print(
+        f"Done in {time.perf_counter() - start:.2f}s. {update.scanned} scanned, {update.unchanged} unchanged, "
+        f"{update.removed} removed, {update.failed} failed."
+    )
+    return 1 if update.failed else 0
+
+
+def find_captures(args):
+    captures_dir = _get_captures_dir(args.path)
+    catalog = capture_catalog.CaptureCatalog(args.catalog)
+    catalog.update(captures_dir)
+    matches = catalog.find_captures_with_meshes(args.mesh, captures_dir=captures_dir) if args.mesh else []
+    matches += catalog.find_captures_with_lights(args.light, captures_dir=captures_dir) if args.light else []
+    matches += catalog.find_captures_with_materials(args.material, captures_dir=captures_dir) if args.material else []
+    matches += catalog.find_captures_with_textures(args.texture, captures_dir=captures_dir) if args.texture else []
+    for path in dict.fromkeys(match.path for match in matches):
+        print(path)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="rtxremixtools", description="RTX Remix Tools headless utilities.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fix_meshes_parser = subparsers.add_parser(
+        "fix-meshes",
+        help="Triangulation check, vertex interpolation conversion, UV normalization and unused primvars removal.",
+    )
+    fix_meshes_parser.add_argument("path", help="A rtx-remix folder, or any folder containing mod USD files.")
+    fix_meshes_parser.add_argument(
+        "-j", "--workers", type=int, default=0, help="Number of worker processes. Defaults to one per CPU core."
+    )
+    fix_meshes_parser.add_argument("--weld", action="store_true", help="Merge duplicated vertices.")
+    fix_meshes_parser.add_argument(
+        "--weld-tolerance", type=float, default=geometry.DEFAULT_WELD_TOLERANCE,
+        help="Max difference between each value of two vertices for them to be welded.",
+    )
+    fix_meshes_parser.add_argument(
+        "--force", action="store_true", help="Process files even if a previous run already fixed them."
+    )
+    fix_meshes_parser.add_argument(
+        "--cache", default=mesh_fix_cache.DEFAULT_CACHE_PATH, help="Location of the already fixed files cache."
+    )
+    fix_meshes_parser.set_defaults(func=fix_meshes)
+
+    index_captures_parser = subparsers.add_parser(
+        "index-captures", help="Updates the captures catalog, only scanning captures changed since the last update."
+    )
+    index_captures_parser.add_argument("path", help="A rtx-remix folder, or its captures folder.")
+    index_captures_parser.add_argument(
+        "--catalog", default=capture_catalog.DEFAULT_CATALOG_PATH, help="Location of the captures catalog."
+    )
+    index_captures_parser.set_defaults(func=index_captures)
+
+    find_captures_parser = subparsers.add_parser(
+        "find-captures", help="Lists the captures containing any of the given hashes or textures."
+    )
+    find_captures_parser.add_argument("path", help="A rtx-remix folder, or its captures folder.")
+    find_captures_parser.add_argument("--mesh", nargs="+", default=[], help="Mesh hashes.")
+    find_captures_parser.add_argument("--light", nargs="+", default=[], help="Light hashes.")
+    find_captures_parser.add_argument("--material", nargs="+", default=[], help="Material hashes.")
+    find_captures_parser.add_argument("--texture", nargs="+", default=[], help="Texture file paths.")
+    find_captures_parser.add_argument(
+        "--catalog", default=capture_catalog.DEFAULT_CATALOG_PATH, help="Location of the captures catalog."
+    )
+    find_captures_parser.set_defaults(func=find_captures)
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import omni.kit.commands
+import omni.usd
+from pxr import Sdf
+
+from ekozerski.rtxremixtools import profiling
+
+
+PRESERVE_ORIGINAL_DRAW_CALL_ATTR = 'preserveOriginalDrawCall'
+
+
+def _get_missing_prim_paths(layer, prim_path):
+    return [prefix for prefix in prim_path.GetPrefixes() if not layer.GetPrimAtPath(prefix)]
+
+
+def _remove_inert_prim_specs(layer, prim_paths):
+    """
+    Removes the "over" specs Sdf.CreatePrimInLayer had to create, deepest first, unless something was authored in them.
+    """
+    for prim_path in reversed(prim_paths):
+        prim_spec = layer.GetPrimAtPath(prim_path)
+        if prim_spec and prim_spec.IsInert(ignoreChildren=False):
+            prim_spec.realNameParent.RemoveNameChild(prim_spec)
+
+
+def get_preserve_original_draw_call_changes(stage, prim_paths, enabled: bool):
+    """
+    Returns the paths of the prims whose composed "preserveOriginalDrawCall" value differs from "enabled", i.e. the ones
+    that would actually change.
+    """
+    value = 1 if enabled else 0
+    changed_paths = list()
+    for path in prim_paths:
+        prim = stage.GetPrimAtPath(path)
+        if not prim:
+            continue
+        attr = prim.GetAttribute(PRESERVE_ORIGINAL_DRAW_CALL_ATTR)
+        if not attr or attr.Get() != value:
+            changed_paths.append(prim.GetPath())
+    return changed_paths
+
+
+class SetPreserveOriginalDrawCallCommand(omni.kit.commands.Command):
+    """
+    Authors "custom int preserveOriginalDrawCall" on many prims at once in the edit target layer, inside a single
+    Sdf.ChangeBlock and as a single undo entry. Prims already holding the value are left untouched.
+    """
+    def __init__(self, prim_paths, enabled: bool, usd_context_name: str = ""):
+        self._prim_paths = prim_paths
+        self._value = 1 if enabled else 0
+        self._usd_context_name = usd_context_name
+        self._layer = None
+        # Per changed prim: (path, created prim spec paths, whether the attribute spec existed, its previous default)
+        self._undo_records = list()
+
+    def do(self):
+        stage = omni.usd.get_context(self._usd_context_name).get_stage()
+        self._layer = stage.GetEditTarget().GetLayer()
+        self._undo_records = list()
+        changed_paths = get_preserve_original_draw_call_changes(stage, self._prim_paths, bool(self._value))
+
+        with profiling.trace(
+            "commands.SetPreserveOriginalDrawCall", prims=len(self._prim_paths), changed=len(changed_paths)
+        ), Sdf.ChangeBlock():
+            for path in changed_paths:
+                created_paths = _get_missing_prim_paths(self._layer, path)
+                prim_spec = Sdf.CreatePrimInLayer(self._layer, path)
+                attr_spec = self._layer.GetAttributeAtPath(path.AppendProperty(PRESERVE_ORIGINAL_DRAW_CALL_ATTR))
+                self._undo_records.append(
+                    (path, created_paths, bool(attr_spec), attr_spec.default if attr_spec else None)
+                )
+                if not attr_spec:
+                    attr_spec = Sdf.AttributeSpec(
+                        prim_spec, PRESERVE_ORIGINAL_DRAW_CALL_ATTR, Sdf.ValueTypeNames.Int, custom=True
+                    )
+                attr_spec.default = self._value
+
+        return changed_paths
+
+    def undo(self):
+        with Sdf.ChangeBlock():
+            for path, created_paths, attr_existed, previous_default in reversed(self._undo_records):
+                attr_spec = self._layer.GetAttributeAtPath(path.AppendProperty(PRESERVE_ORIGINAL_DRAW_CALL_ATTR))
+                if not attr_spec:
+                    continue
+                if not attr_existed:
+                    self._layer.GetPrimAtPath(path).RemoveProperty(attr_spec)
+                elif previous_default is None:
+                    attr_spec.ClearDefaultValue()
+                else:
+                    attr_spec.default = previous_default
+                _remove_inert_prim_specs(self._layer, created_paths)
+        self._undo_records = list()
+
+
+class AddReferencedXformsCommand(omni.kit.commands.Command):
+    """
+    Defines many Xform prims referencing external files in the edit target layer, inside a single Sdf.ChangeBlock and
+    as a single undo entry. "references" is a list of (prim path, asset path) pairs, asset paths already being
+    relative to the edit target layer when needed.
+    """
+    def __init__(self, references, usd_context_name: str = ""):
+        self._references = [(Sdf.Path(prim_path), asset_path) for prim_path, asset_path in references]
+        self._usd_context_name = usd_context_name
+        self._layer = None
+        # Per reference: (prim path, created prim spec paths, previous specifier, previous type name)
+        self._undo_records = list()
+
+    def do(self):
+        stage = omni.usd.get_context(self._usd_context_name).get_stage()
+        self._layer = stage.GetEditTarget().GetLayer()
+        self._undo_records = list()
+
+        with profiling.trace("commands.AddReferencedXforms", references=len(self._references)), Sdf.ChangeBlock():
+            for prim_path, asset_path in self._references:
+                created_paths = _get_missing_prim_paths(self._layer, prim_path)
+                prim_spec = Sdf.CreatePrimInLayer(self._layer, prim_path)
+                self._undo_records.append((prim_path, created_paths, prim_spec.specifier, prim_spec.typeName))
+                prim_spec.specifier = Sdf.SpecifierDef
+                prim_spec.typeName = 'Xform'
+                prim_spec.referenceList.prependedItems.append(Sdf.Reference(asset_path))
+
+        return [prim_path for prim_path, _ in self._references]
+
+    def undo(self):
+        with Sdf.ChangeBlock():
+            for (prim_path, created_paths, specifier, type_name), (_, asset_path) in reversed(
+                list(zip(self._undo_records, self._references))
+            ):
+                prim_spec = self._layer.GetPrimAtPath(prim_path)
+                if not prim_spec:
+                    continue
+                if prim_path in created_paths:
+                    prim_spec.realNameParent.RemoveNameChild(prim_spec)
+                else:
+                    prim_spec.referenceList.prependedItems.remove(Sdf.Reference(asset_path))
+                    prim_spec.specifier = specifier
+                    prim_spec.typeName = type_name
+                _remove_inert_prim_specs(self._layer, created_paths)
+        self._undo_records = list()
@@ -1,13 +1,58 @@
-import carb
+import importlib
+import logging
+
+try:
+    import carb
+    import carb.settings
+except ImportError:
+    # Running outside Kit (e.g. worker processes), so logs go through the std logging module instead.
+    carb = None
+
+
+SETTINGS_PATH = "/exts/ekozerski.rtxremixtools"
+# Defined here so the brush can be registered without loading the omni.paint.brush.scatter stack behind it.
+BRUSH_TYPE = "Remix Scatter"
+_logger = logging.getLogger("ekozerski.rtxremixtools")
 
 
 def log_info(msg: str):
-    carb.log_info(f"[RTX Remix Tool] {msg}")
+    if carb is None:
+        _logger.info(f"[RTX Remix Tool] {msg}")
+    else:
+        carb.log_info(f"[RTX Remix Tool] {msg}")
 
 
 def log_warn(msg: str):
-    carb.log_warn(f"[RTX Remix Tool] {msg}")
+    if carb is None:
+        _logger.warning(f"[RTX Remix Tool] {msg}")
+    else:
+        carb.log_warn(f"[RTX Remix Tool] {msg}")
 
 
 def log_error(msg: str):
-    carb.log_error(f"[RTX Remix Tool] {msg}")
+    if carb is None:
+        _logger.error(f"[RTX Remix Tool] {msg}")
+    else:
+        carb.log_error(f"[RTX Remix Tool] {msg}")
+
+
+def get_setting(name: str, default=None):
+    settings = carb.settings.get_settings() if carb is not None else None
+    value = settings.get(f"{SETTINGS_PATH}/{name}") if settings is not None else None
+    return default if value is None else value
+
+
+def set_setting(name: str, value):
+    if carb is not None:
+        carb.settings.get_settings().set(f"{SETTINGS_PATH}/{name}", value)
+
+
+def lazy_call(module_name: str, fn_name: str, *args):
+    """
+    Returns a callback only importing this package's "module_name" when called, so menus, actions and hotkeys can be
+    registered at startup without loading the modules behind them.
+    """
+    def call(*call_args, **call_kwargs):
+        module = importlib.import_module(f"{__package__}.{module_name}")
+        return getattr(module, fn_name)(*args, *call_args, **call_kwargs)
+    return call
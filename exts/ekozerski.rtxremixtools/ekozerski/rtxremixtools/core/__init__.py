@@ -0,0 +1,5 @@
+"""
+The RTX Remix Tools logic that only needs pxr and numpy: capture hash resolution (hashes), mesh processing (geometry)
+and capture merging (capture_merge). Never imports omni or carb, so it also runs in worker processes, the command
+line and batch scripts. The Kit modules import the geometry and capture_merge modules lazily, on first use.
+"""
@@ -0,0 +1,776 @@
+import hashlib
+import itertools
+import os
+from collections import Counter, defaultdict, namedtuple
+import time
+
+import numpy
+from pxr import Usd, Sdf, UsdGeom, Gf, Tf
+
+from ekozerski.rtxremixtools import profiling
+from ekozerski.rtxremixtools.commons import log_info, get_setting
+from ekozerski.rtxremixtools.core import geometry
+
+
+ROOT_PATH = Sdf.Path('/RootNode')
+INSTANCES_PATH = Sdf.Path('/RootNode/instances')
+CAPTURE_GROUP_PATHS = ['/RootNode/meshes', '/RootNode/lights', '/RootNode/Looks', '/RootNode/cameras']
+DEFAULT_INSTANCE_MERGE_EPSILON = 1e-4
+# Width of the cells instances are bucketed in by translation, in epsilons.
+_INSTANCE_CELL_SIZE = 64
+
+MergeReport = namedtuple('MergeReport', ['kept', 'added', 'merged'])
+SpecReport = namedtuple('SpecReport', ['new', 'updated', 'reused'])
+# "specs" maps capture group names (meshes, lights, Looks, cameras) to a SpecReport.
+CaptureReport = namedtuple('CaptureReport', ['specs', 'instances'])
+# "cells" lists the translation cells to look for matching transforms in, the instance's own cell first.
+InstanceKey = namedtuple('InstanceKey', ['hash', 'transform', 'cells'])
+# Only plain data (path strings, numpy transforms), so it can be sent back from worker processes.
+ParsedCapture = namedtuple(
+    'ParsedCapture', ['path', 'group_paths', 'child_paths', 'fingerprints', 'instance_paths', 'instance_keys']
+)
+PreparedCapture = namedtuple(
+    'PreparedCapture',
+    ['path', 'layer', 'group_paths', 'child_paths', 'fingerprints', 'instances', 'instance_keys'],
+)
+
+
+def parse_instance_hash(inst_name):
+    parts = inst_name.split('_')
+    return parts[1] if len(parts) >= 2 else inst_name
+
+
+_ROTATION_AXES = {'X': Gf.Vec3d.XAxis(), 'Y': Gf.Vec3d.YAxis(), 'Z': Gf.Vec3d.ZAxis()}
+
+
+def _get_op_transform(op_type_name, value):
+    """
+    The matrix of a single xformOp value, computed the way UsdGeom.XformOp.GetOpTransform does.
+    """
+    if op_type_name == 'transform':
+        return Gf.Matrix4d(value)
+    if op_type_name == 'translate':
+        return Gf.Matrix4d(1).SetTranslate(Gf.Vec3d(value))
+    if op_type_name == 'scale':
+        return Gf.Matrix4d(1).SetScale(Gf.Vec3d(value))
+    if op_type_name == 'orient':
+        return Gf.Matrix4d(1).SetRotate(Gf.Quatd(value.GetReal(), Gf.Vec3d(value.GetImaginary())))
+    if op_type_name.startswith('rotate'):
+        axes = op_type_name[len('rotate'):]
+        angles = [value] if len(axes) == 1 else list(value)
+        transform = Gf.Matrix4d(1)
+        # The first axis of the op name is applied first.
+        for axis, angle in zip(axes, angles):
+            transform = transform * Gf.Matrix4d(1).SetRotate(Gf.Rotation(_ROTATION_AXES[axis], float(angle)))
+        return transform
+    raise ValueError(f"Unsupported xformOp type '{op_type_name}'.")
+
+
+def compute_spec_local_transform(layer: Sdf.Layer, prim_path: Sdf.Path) -> Gf.Matrix4d:
+    """
+    Computes a prim's local transform straight from its xformOp specs in "layer", without composing a stage.
+    """
+    transform = Gf.Matrix4d(1)
+    op_order_spec = layer.GetAttributeAtPath(prim_path.AppendProperty('xformOpOrder'))
+    op_order = op_order_spec.default if op_order_spec and op_order_spec.default else []
+    for op_name in op_order:
+        if op_name == '!resetXformStack!':
+            transform = Gf.Matrix4d(1)
+            continue
+
+        is_inverse_op = op_name.startswith('!invert!')
+        attr_name = op_name[len('!invert!'):] if is_inverse_op else op_name
+        op_spec = layer.GetAttributeAtPath(prim_path.AppendProperty(attr_name))
+        if not op_spec or op_spec.default is None:
+            continue
+
+        op_transform = _get_op_transform(attr_name.split(':')[1], op_spec.default)
+        if is_inverse_op:
+            op_transform = op_transform.GetInverse()
+        # The first op in xformOpOrder is the outermost one.
+        transform = op_transform * transform
+    return transform
+
+
+def get_stage_instances(stage: Usd.Stage, instance_prims=None):
+    """
+    Returns (hash, world transform, layer, prim path) for every instance of a composed stage, or only for
+    "instance_prims" if given.
+    """
+    if instance_prims is None:
+        instances_prim = stage.GetPrimAtPath(INSTANCES_PATH)
+        instance_prims = instances_prim.GetAllChildren() if instances_prim else list()
+
+    # The cache computes the shared parents' transforms only once for all instances.
+    xform_cache = UsdGeom.XformCache(Usd.TimeCode.Default())
+    root_layer = stage.GetRootLayer()
+    return [
+        (
+            parse_instance_hash(inst.GetName()),
+            xform_cache.GetLocalToWorldTransform(inst),
+            root_layer,
+            inst.GetPath(),
+        )
+        for inst in instance_prims
+    ]
+
+
+def get_layer_instances(layer: Sdf.Layer):
+    """
+    Same as "get_stage_instances", but walking the instance prim specs of a single layer.
+    """
+    instances_spec = layer.GetPrimAtPath(INSTANCES_PATH)
+    if not instances_spec:
+        return list()
+
+    parent_transform = (
+        compute_spec_local_transform(layer, INSTANCES_PATH) * compute_spec_local_transform(layer, ROOT_PATH)
+    )
+    return [
+        (
+            parse_instance_hash(inst_spec.name),
+            compute_spec_local_transform(layer, inst_spec.path) * parent_transform,
+            layer,
+            inst_spec.path,
+        )
+        for inst_spec in instances_spec.nameChildren
+    ]
+
+
+def get_instance_keys(instances, epsilon=DEFAULT_INSTANCE_MERGE_EPSILON):
+    """
+    Returns the InstanceKeys of the given instances, bucketing all transforms at once by translation in cells of
+    _INSTANCE_CELL_SIZE epsilons. Neighbouring cells are only listed for the translations within an epsilon of their
+    border, so matching a transform usually looks in a single cell.
+    """
+    if not instances:
+        return list()
+
+    transforms = numpy.array([transform for _, transform, _, _ in instances], dtype=numpy.float64)
+    transforms = transforms.reshape(len(instances), 16)
+    scaled = transforms[:, 12:15] / (epsilon * _INSTANCE_CELL_SIZE)
+    cells = numpy.floor(scaled)
+    fractions = scaled - cells
+    # Twice the epsilon, so float rounding near a border never hides a neighbour.
+    margin = 2.0 / _INSTANCE_CELL_SIZE
+    offsets = numpy.where(fractions < margin, -1, numpy.where(fractions > 1.0 - margin, 1, 0))
+    has_neighbours = numpy.any(offsets != 0, axis=1).tolist()
+    keys = list()
+    for inst, transform, cell, cell_offsets, neighbours in zip(
+        instances, transforms, map(tuple, cells.astype(numpy.int64).tolist()), offsets.tolist(), has_neighbours
+    ):
+        if neighbours:
+            cells_to_probe = tuple(
+                (cell[0] + x, cell[1] + y, cell[2] + z)
+                for x, y, z in itertools.product(*[(0, offset) if offset else (0,) for offset in cell_offsets])
+            )
+        else:
+            cells_to_probe = (cell,)
+        keys.append(InstanceKey(inst[0], transform, cells_to_probe))
+    return keys
+
+
+class InstanceMatcher:
+    """
+    Finds the instances of the same hash whose transform values are all within "epsilon" of a given InstanceKey's,
+    wherever they fall on a grid.
+    """
+    def __init__(self, epsilon):
+        self.epsilon = epsilon
+        # (hash, cell) -> [(transform, item)]
+        self._buckets = defaultdict(list)
+
+    def find(self, key: InstanceKey):
+        """
+        Returns the item added with a matching key, or None.
+        """
+        for cell in key.cells:
+            for transform, item in self._buckets.get((key.hash, cell), ()):
+                if numpy.all(numpy.abs(transform - key.transform) <= self.epsilon):
+                    return item
+        return None
+
+    def add(self, key: InstanceKey, item):
+        self._buckets[(key.hash, key.cells[0])].append((key.transform, item))
+
+    def remove(self, key: InstanceKey, item):
+        bucket = self._buckets[(key.hash, key.cells[0])]
+        bucket[:] = [entry for entry in bucket if entry[1] != item]
+
+
+# Sdf list ops (relationship targets, connections, references...) only show their items in str, not in repr.
+_LIST_OP_TYPES = (
+    Sdf.PathListOp, Sdf.ReferenceListOp, Sdf.PayloadListOp, Sdf.TokenListOp, Sdf.StringListOp, Sdf.IntListOp,
+    Sdf.Int64ListOp, Sdf.UIntListOp, Sdf.UInt64ListOp,
+)
+
+
+def _update_digest(digest, value):
+    if hasattr(value, '__len__') and not isinstance(value, (str, bytes)):
+        array = numpy.asarray(value)
+        # Object arrays (paths, strings...) would only hash pointers, so those go through repr instead.
+        if array.dtype != object:
+            digest.update(array.tobytes())
+            return
+    digest.update((str(value) if isinstance(value, _LIST_OP_TYPES) else repr(value)).encode())
+
+
+def compute_spec_fingerprint(layer: Sdf.Layer, prim_path):
+    """
+    Digest of a prim spec and everything under it (child prims, properties, metadata and default values), or None if
+    the layer has no such spec. Array values are hashed as raw bytes, so even big meshes are cheap to fingerprint.
+    """
+    if not layer.GetPrimAtPath(prim_path):
+        return None
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    def update(path):
+        spec = layer.GetObjectAtPath(path)
+        if spec is None:
+            # Relationship targets and attribute connections, already hashed with their property's info.
+            return
+        digest.update(str(path).encode())
+        for key in sorted(spec.ListInfoKeys()):
+            digest.update(key.encode())
+            _update_digest(digest, spec.GetInfo(key))
+
+    layer.Traverse(prim_path, update)
+    return digest.hexdigest()
+
+
+class SpecFingerprintIndex:
+    """
+    Fingerprints of the mesh_HASH, light and Look specs in a stage's root layer, computed on demand and dropped
+    whenever the stage reports a change under them, so re-importing a capture doesn't hash the destination again.
+    """
+    def __init__(self, stage):
+        self.stage = stage
+        self._fingerprints = dict()
+        self._listener = Tf.Notice.Register(Usd.Notice.ObjectsChanged, self._on_objects_changed, stage)
+
+    def release(self):
+        if self._listener is not None:
+            self._listener.Revoke()
+            self._listener = None
+
+    def _on_objects_changed(self, notice, sender):
+        for path in itertools.chain(notice.GetResyncedPaths(), notice.GetChangedInfoOnlyPaths()):
+            if path.pathElementCount < 3:
+                # A capture group (or an ancestor) changed.
+                self._fingerprints.clear()
+                return
+            self._fingerprints.pop(path.GetPrefixes()[2], None)
+
+    def get(self, prim_path):
+        fingerprint = self._fingerprints.get(prim_path)
+        if fingerprint is None:
+            fingerprint = compute_spec_fingerprint(self.stage.GetRootLayer(), prim_path)
+            if fingerprint is not None:
+                self._fingerprints[prim_path] = fingerprint
+        return fingerprint
+
+    def set(self, prim_path, fingerprint):
+        self._fingerprints[prim_path] = fingerprint
+
+
+_fingerprint_index = None
+
+
+def get_fingerprint_index(stage) -> SpecFingerprintIndex:
+    """
+    Returns the spec fingerprint index of "stage". Only the last requested stage is indexed.
+    """
+    global _fingerprint_index
+    if _fingerprint_index is None or _fingerprint_index.stage != stage:
+        release_fingerprint_index()
+        _fingerprint_index = SpecFingerprintIndex(stage)
+    return _fingerprint_index
+
+
+def release_fingerprint_index():
+    global _fingerprint_index
+    if _fingerprint_index is not None:
+        _fingerprint_index.release()
+        _fingerprint_index = None
+
+
+def _rebuild_instances(source_instances, source_keys, dest_stage: Usd.Stage, epsilon) -> MergeReport:
+    """
+    Rebuilds /RootNode/instances from scratch with all destination and source instances, renumbering them.
+    """
+    dest_instances = get_stage_instances(dest_stage)
+
+    # Instances are only kept when no previous one of the same hash matches their transform. Destination instances go
+    # first, so they keep their names and the merge result doesn't depend on which capture was imported first.
+    matcher = InstanceMatcher(epsilon)
+    # Grouped by mesh hash
+    hash_groups = defaultdict(list)
+    unique_counts = list()
+    dest_keys = get_instance_keys(dest_instances, epsilon)
+    for keys, instances in [(dest_keys, dest_instances), (source_keys, source_instances)]:
+        unique_count = 0
+        for key, (_, _, layer, path) in zip(keys, instances):
+            if matcher.find(key) is None:
+                matcher.add(key, path)
+                hash_groups[key.hash].append((layer, path))
+                unique_count += 1
+        unique_counts.append(unique_count)
+    kept_count, added_count = unique_counts
+
+    temp_inst_merge_layer = Sdf.Layer.CreateAnonymous()
+    Sdf.PrimSpec(temp_inst_merge_layer, 'RootNode', Sdf.SpecifierDef)
+    Sdf.PrimSpec(temp_inst_merge_layer.GetPrimAtPath('RootNode'), 'instances', Sdf.SpecifierDef)
+
+    for hash, prims_data in hash_groups.items():
+        inst_count = 0
+        for prim_layer, prim_path in prims_data:
+            new_inst_prim_path = f'/RootNode/instances/inst_{hash}_{inst_count}'
+            Sdf.CopySpec(prim_layer, prim_path, temp_inst_merge_layer, Sdf.Path(new_inst_prim_path))
+            inst_count += 1
+
+    dest_layer = dest_stage.GetRootLayer()
+    # temp_instances_merge_layer instances counts will always be >= dest_layer's, so we can just copy and replace on top.
+    Sdf.CopySpec(temp_inst_merge_layer, INSTANCES_PATH, dest_layer, INSTANCES_PATH)
+    # Instances were renumbered, so the incremental index must start over.
+    release_instance_index()
+    return MergeReport(kept=kept_count, added=added_count, merged=len(source_instances) - added_count)
+
+
+class InstanceIndex:
+    """
+    Transform keys and next free inst_HASH_N counter per hash of a destination stage's instances. Kept between
+    imports, so only instances added, removed or changed since the last import need to be looked at.
+    """
+    def __init__(self, stage, epsilon):
+        self.stage = stage
+        self.epsilon = epsilon
+        self.keys_by_name = dict()
+        self.matcher = InstanceMatcher(epsilon)
+        self.next_counters = defaultdict(int)
+        self._changed_names = set()
+        self._all_changed = False
+        self._listener = Tf.Notice.Register(Usd.Notice.ObjectsChanged, self._on_objects_changed, stage)
+
+    def release(self):
+        if self._listener is not None:
+            self._listener.Revoke()
+            self._listener = None
+
+    def _on_objects_changed(self, notice, sender):
+        for path in itertools.chain(notice.GetResyncedPaths(), notice.GetChangedInfoOnlyPaths()):
+            prim_path = path.GetPrimPath()
+            if INSTANCES_PATH.HasPrefix(prim_path):
+                # The instances group (or an ancestor) changed, so every instance transform may have too.
+                self._all_changed = True
+            elif prim_path.HasPrefix(INSTANCES_PATH):
+                self._changed_names.add(prim_path.GetPrefixes()[2].name)
+
+    def _forget(self, name):
+        key = self.keys_by_name.pop(name, None)
+        if key is not None:
+            self.matcher.remove(key, name)
+
+    def _reserve_name(self, name):
+        counter = name.rsplit('_', 1)[-1]
+        if counter.isdigit():
+            inst_hash = parse_instance_hash(name)
+            self.next_counters[inst_hash] = max(self.next_counters[inst_hash], int(counter) + 1)
+
+    def sync(self):
+        """
+        Computes the keys of the instances added or changed since the last sync, dropping the removed ones.
+        """
+        if self._all_changed:
+            self.keys_by_name.clear()
+            self.matcher = InstanceMatcher(self.epsilon)
+        for name in self._changed_names:
+            self._forget(name)
+        self._changed_names.clear()
+        self._all_changed = False
+
+        instances_prim = self.stage.GetPrimAtPath(INSTANCES_PATH)
+        instance_prims = instances_prim.GetAllChildren() if instances_prim else list()
+        current_names = {prim.GetName() for prim in instance_prims}
+        for name in [name for name in self.keys_by_name if name not in current_names]:
+            self._forget(name)
+
+        new_instances = get_stage_instances(
+            self.stage, [prim for prim in instance_prims if prim.GetName() not in self.keys_by_name]
+        )
+        for key, (_, _, _, path) in zip(get_instance_keys(new_instances, self.epsilon), new_instances):
+            self.keys_by_name[path.name] = key
+            self.matcher.add(key, path.name)
+            self._reserve_name(path.name)
+
+    def __contains__(self, key):
+        return self.matcher.find(key) is not None
+
+    def add(self, key):
+        name = f'inst_{key.hash}_{self.next_counters[key.hash]}'
+        self.next_counters[key.hash] += 1
+        self.keys_by_name[name] = key
+        self.matcher.add(key, name)
+        return name
+
+    def ignore_changes(self, names):
+        """
+        Forgets the changes reported for "names", e.g. for the instances this index just added itself.
+        """
+        self._changed_names.difference_update(names)
+
+
+_instance_index = None
+
+
+def get_instance_index(stage, epsilon) -> InstanceIndex:
+    """
+    Returns the instance index of "stage" for "epsilon". Only the last requested stage is indexed.
+    """
+    global _instance_index
+    if _instance_index is None or _instance_index.stage != stage or _instance_index.epsilon != epsilon:
+        release_instance_index()
+        _instance_index = InstanceIndex(stage, epsilon)
+    return _instance_index
+
+
+def release_instance_index():
+    global _instance_index
+    if _instance_index is not None:
+        _instance_index.release()
+        _instance_index = None
+
+
+def _append_new_instances(source_instances, source_keys, dest_stage: Usd.Stage, epsilon) -> MergeReport:
+    """
+    Only copies the source instances not present yet in the destination, as new inst_HASH_N specs appended to
+    /RootNode/instances, so existing instances are never rewritten.
+    """
+    dest_layer = dest_stage.GetRootLayer()
+    if not dest_layer.GetPrimAtPath(INSTANCES_PATH):
+        Sdf.CreatePrimInLayer(dest_layer, INSTANCES_PATH).specifier = Sdf.SpecifierDef
+
+    instance_index = get_instance_index(dest_stage, epsilon)
+    instance_index.sync()
+    kept_count = len(instance_index.keys_by_name)
+
+    added_names = list()
+    with Sdf.ChangeBlock():
+        for key, (_, _, layer, path) in zip(source_keys, source_instances):
+            if key in instance_index:
+                continue
+            added_names.append(instance_index.add(key))
+            Sdf.CopySpec(layer, path, dest_layer, INSTANCES_PATH.AppendChild(added_names[-1]))
+    # Their keys are already known, so the changes reported for the copies don't need to be looked at again.
+    instance_index.ignore_changes(added_names)
+
+    added_count = len(added_names)
+    return MergeReport(kept=kept_count, added=added_count, merged=len(source_instances) - added_count)
+
+
+def merge_instances(
+    source_instances, dest_stage: Usd.Stage, epsilon=None, incremental=None, source_keys=None
+) -> MergeReport:
+    """
+    Merges the (hash, transform, layer, path) "source_instances" into the destination stage's root layer, either
+    appending only the new ones ("incremental") or rebuilding the whole /RootNode/instances. "source_keys" may be
+    given when already computed by "get_instance_keys" with the same epsilon.
+    """
+    epsilon = epsilon or get_setting("instance_merge_epsilon", DEFAULT_INSTANCE_MERGE_EPSILON)
+    if incremental is None:
+        incremental = get_setting("incremental_instance_merge", True)
+    if source_keys is None:
+        source_keys = get_instance_keys(source_instances, epsilon)
+
+    with profiling.trace("capture_merge.merge_instances", instances=len(source_instances), incremental=incremental):
+        if incremental:
+            return _append_new_instances(source_instances, source_keys, dest_stage, epsilon)
+        return _rebuild_instances(source_instances, source_keys, dest_stage, epsilon)
+
+
+def copy_instances(source_stage: Usd.Stage, dest_stage: Usd.Stage) -> MergeReport:
+    return merge_instances(get_stage_instances(source_stage), dest_stage)
+
+
+def _get_memory_usage_bytes():
+    """
+    The current resident memory of the process, or None where it can't be read. USD allocates outside of Python's
+    allocator, so tracemalloc wouldn't see most of it.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _define_capture_groups(current_stage, group_paths):
+    # This is needed or else Sdf.CopySpec gets iffy on non-capture scenes.
+    current_stage.DefinePrim("/RootNode")
+    current_stage.DefinePrim("/RootNode/meshes")
+    current_stage.DefinePrim("/RootNode/lights")
+    current_stage.DefinePrim("/RootNode/Looks")
+    if '/RootNode/cameras' in group_paths:
+        current_stage.DefinePrim("/RootNode/cameras")
+
+
+@profiling.traced()
+def import_capture_from_stage(capture_path, current_stage, epsilon=DEFAULT_INSTANCE_MERGE_EPSILON, fingerprint=True):
+    """
+    Opens the capture as a fully composed Usd.Stage. Specs already present with the same fingerprint are skipped too.
+    """
+    capture_stage = Usd.Stage.Open(capture_path)
+    capture_layer = capture_stage.GetRootLayer()
+
+    capture_layer.subLayerPaths = []
+
+    group_paths = [path for path in CAPTURE_GROUP_PATHS if capture_stage.GetPrimAtPath(path)]
+    child_paths = [
+        prim.GetPath()
+        for group_path in group_paths
+        for prim in capture_stage.GetPrimAtPath(group_path).GetAllChildren()
+    ]
+    fingerprints = [compute_spec_fingerprint(capture_layer, path) for path in child_paths] if fingerprint else None
+    instances = get_stage_instances(capture_stage)
+    prepared = PreparedCapture(
+        capture_path, capture_layer, group_paths, child_paths, fingerprints, instances,
+        get_instance_keys(instances, epsilon),
+    )
+    return apply_prepared_capture(prepared, current_stage, epsilon)
+
+
+def _open_capture_layer(capture_path) -> Sdf.Layer:
+    with profiling.trace("capture_merge.open_capture_layer", capture=capture_path):
+        capture_layer = Sdf.Layer.FindOrOpen(capture_path)
+    if not capture_layer:
+        raise ValueError(f"Couldn't open capture '{capture_path}'.")
+    return capture_layer
+
+
+def _parse_capture_layer(capture_layer, capture_path, epsilon, fingerprint) -> ParsedCapture:
+    with profiling.trace("capture_merge.parse_capture", capture=capture_path) as span:
+        group_paths = [path for path in CAPTURE_GROUP_PATHS if capture_layer.GetPrimAtPath(path)]
+        child_paths = [
+            child_spec.path
+            for group_path in group_paths
+            for child_spec in capture_layer.GetPrimAtPath(group_path).nameChildren
+        ]
+        fingerprints = [compute_spec_fingerprint(capture_layer, path) for path in child_paths] if fingerprint else None
+        instances = get_layer_instances(capture_layer)
+        span.set(child_prims=len(child_paths), instances=len(instances))
+    return ParsedCapture(
+        capture_path, group_paths, [str(path) for path in child_paths], fingerprints,
+        [str(path) for _, _, _, path in instances], get_instance_keys(instances, epsilon),
+    )
+
+
+def parse_capture(capture_path, epsilon=DEFAULT_INSTANCE_MERGE_EPSILON, fingerprint=True) -> ParsedCapture:
+    """
+    Opens the capture's root layer and extracts everything the import needs (specs to copy and their fingerprints,
+    instance hashes and transform keys), without touching the current stage. Runs in worker processes, which don't
+    share the GIL with the main thread.
+    """
+    return _parse_capture_layer(_open_capture_layer(capture_path), capture_path, epsilon, fingerprint)
+
+
+def prepare_capture(
+    capture_path, epsilon=DEFAULT_INSTANCE_MERGE_EPSILON, fingerprint=True, parsed: ParsedCapture = None
+) -> PreparedCapture:
+    """
+    Only opens the capture's root Sdf.Layer and walks its prim specs, never composing a stage, as the import is purely
+    a spec copy anyway. The layer is parsed here unless already "parsed" by "parse_capture", e.g. in a worker process.
+    """
+    capture_layer = _open_capture_layer(capture_path)
+    if parsed is None:
+        parsed = _parse_capture_layer(capture_layer, capture_path, epsilon, fingerprint)
+    # The transforms are only needed to compute keys, which come parsed already.
+    instances = [
+        (key.hash, key.transform, capture_layer, Sdf.Path(path))
+        for key, path in zip(parsed.instance_keys, parsed.instance_paths)
+    ]
+    return PreparedCapture(
+        capture_path, capture_layer, parsed.group_paths, [Sdf.Path(path) for path in parsed.child_paths],
+        parsed.fingerprints, instances, parsed.instance_keys,
+    )
+
+
+class CapturePrefetcher:
+    """
+    Parses captures in order in "executor"'s worker processes (see "geometry.create_process_pool"), at most
+    "lookahead" captures ahead of the one being applied, so they don't all sit in memory at once. Without an executor,
+    captures are left to "prepare_capture" to parse in the calling thread.
+    """
+    def __init__(self, capture_paths, epsilon, fingerprint, executor=None, lookahead=0):
+        self.capture_paths = capture_paths
+        self.epsilon = epsilon
+        self.fingerprint = fingerprint
+        self.executor = executor
+        self.lookahead = lookahead
+        self.cancelled = False
+        self._futures = dict()
+        [self._submit(index) for index in range(lookahead)]
+
+    def _submit(self, index):
+        if self.executor is not None and index < len(self.capture_paths) and not self.cancelled:
+            self._futures[index] = self.executor.submit(
+                parse_capture, self.capture_paths[index], self.epsilon, self.fingerprint
+            )
+
+    def pop(self, index):
+        """
+        Returns the future ParsedCapture of the capture at "index", or None when parsing is left to the caller.
+        """
+        future = self._futures.pop(index, None)
+        if future is None:
+            # Captures past the lookahead, or all of them when there's no executor.
+            self._submit(index)
+            future = self._futures.pop(index, None)
+        if self.lookahead:
+            self._submit(index + self.lookahead)
+        return future
+
+    def cancel(self):
+        """
+        Cancels the pending parses. Captures already being parsed can't be interrupted.
+        """
+        self.cancelled = True
+        [future.cancel() for future in self._futures.values()]
+
+
+def apply_prepared_capture(prepared: PreparedCapture, current_stage, epsilon) -> CaptureReport:
+    """
+    Copies a pre-parsed capture's specs into the current stage's root layer. Must run on the main thread. Specs
+    already present with the same fingerprint are skipped when the capture was prepared with fingerprints.
+    """
+    with profiling.trace("capture_merge.apply_prepared_capture", capture=prepared.path) as span:
+        capture_report = _apply_prepared_capture(prepared, current_stage, epsilon)
+        if span:
+            span.set(
+                copied_prims=sum(counts.new + counts.updated for counts in capture_report.specs.values()),
+                reused_prims=sum(counts.reused for counts in capture_report.specs.values()),
+                added_instances=capture_report.instances.added,
+            )
+    return capture_report
+
+
+def _apply_prepared_capture(prepared: PreparedCapture, current_stage, epsilon) -> CaptureReport:
+    current_layer = current_stage.GetRootLayer()
+    _define_capture_groups(current_stage, prepared.group_paths)
+    fingerprint_index = get_fingerprint_index(current_stage) if prepared.fingerprints is not None else None
+    spec_counts = defaultdict(Counter)
+    copied_indices = list()
+
+    with Sdf.ChangeBlock():
+        # Copying children one by one so existing prims in the destination are merged rather than replaced.
+        for index, child_path in enumerate(prepared.child_paths):
+            group_counts = spec_counts[child_path.GetParentPath().name]
+            if not current_layer.GetPrimAtPath(child_path):
+                group_counts['new'] += 1
+            elif fingerprint_index is not None and fingerprint_index.get(child_path) == prepared.fingerprints[index]:
+                group_counts['reused'] += 1
+                continue
+            else:
+                group_counts['updated'] += 1
+            Sdf.CopySpec(prepared.layer, child_path, current_layer, child_path)
+            copied_indices.append(index)
+
+    # Merged out of the change block, so the instance index receives the notices of its own copies before ignoring them.
+    instances_report = merge_instances(prepared.instances, current_stage, epsilon, source_keys=prepared.instance_keys)
+
+    # Only recorded once the change block is closed, as its change notices drop the fingerprints of copied specs.
+    if fingerprint_index is not None:
+        for index in copied_indices:
+            fingerprint_index.set(prepared.child_paths[index], prepared.fingerprints[index])
+
+    specs_report = {
+        group_name: SpecReport(counts['new'], counts['updated'], counts['reused'])
+        for group_name, counts in spec_counts.items()
+    }
+    return CaptureReport(specs=specs_report, instances=instances_report)
+
+
+def format_capture_report(report: CaptureReport):
+    specs = ", ".join(
+        f"{group_name} {counts.new} new, {counts.updated} updated, {counts.reused} reused"
+        for group_name, counts in report.specs.items()
+    )
+    instances = report.instances
+    return (
+        f"{specs + '. ' if specs else ''}Instances: {instances.added} added, {instances.merged} merged, "
+        f"{instances.kept} kept."
+    )
+
+
+def sum_capture_reports(reports):
+    specs = dict()
+    for report in reports:
+        for group_name, counts in report.specs.items():
+            specs[group_name] = SpecReport(*map(sum, zip(specs.get(group_name, (0, 0, 0)), counts)))
+    return CaptureReport(
+        specs=specs,
+        instances=MergeReport(
+            kept=reports[0].instances.kept if reports else 0,
+            added=sum(report.instances.added for report in reports),
+            merged=sum(report.instances.merged for report in reports),
+        ),
+    )
+
+
+def import_capture(capture_path, current_stage, mode=None):
+    """
+    Imports a capture into "current_stage"'s root layer. "mode" is either "layer" (only opens the capture's root layer,
+    the default) or "stage" (composes the whole capture stage), defaulting to the "import_captures_mode" setting.
+    """
+    mode = mode or get_setting("import_captures_mode", "layer")
+    epsilon = get_setting("instance_merge_epsilon", DEFAULT_INSTANCE_MERGE_EPSILON)
+    skip_unchanged = get_setting("skip_unchanged_capture_specs", True)
+    memory_before = _get_memory_usage_bytes()
+    start = time.perf_counter()
+
+    with profiling.trace("capture_merge.import_capture", capture=capture_path, mode=mode):
+        if mode == "stage":
+            capture_report = import_capture_from_stage(capture_path, current_stage, epsilon, skip_unchanged)
+        else:
+            prepared = prepare_capture(capture_path, epsilon, fingerprint=skip_unchanged)
+            capture_report = apply_prepared_capture(prepared, current_stage, epsilon)
+
+    elapsed = time.perf_counter() - start
+    memory_report = ""
+    if memory_before is not None:
+        memory = _get_memory_usage_bytes()
+        memory_report = f", memory {memory / 2**20:.0f} MB ({(memory - memory_before) / 2**20:+.0f} MB)"
+    log_info(
+        f"Imported '{capture_path}' in {elapsed:.2f}s ({mode} mode){memory_report}. "
+        f"{format_capture_report(capture_report)}"
+    )
+    return capture_report
+
+
+def import_captures(capture_paths, current_stage, max_workers=0) -> CaptureReport:
+    """
+    Imports many captures in "layer" mode, in the given order, parsing the next ones in up to "max_workers" worker
+    processes while the current one is copied (all of them in the calling thread when 0). Stops at the first capture
+    failing to import. Kit's "Import Captures" does the same with a progress window.
+    """
+    epsilon = get_setting("instance_merge_epsilon", DEFAULT_INSTANCE_MERGE_EPSILON)
+    skip_unchanged = get_setting("skip_unchanged_capture_specs", True)
+    max_workers = min(max_workers, len(capture_paths))
+    executor = geometry.create_process_pool(max_workers) if max_workers > 0 else None
+    prefetcher = CapturePrefetcher(capture_paths, epsilon, skip_unchanged, executor, lookahead=max_workers * 2)
+    capture_reports = list()
+    try:
+        for index, capture_path in enumerate(capture_paths):
+            future = prefetcher.pop(index)
+            prepared = prepare_capture(capture_path, epsilon, skip_unchanged, future.result() if future else None)
+            capture_reports.append(apply_prepared_capture(prepared, current_stage, epsilon))
+    finally:
+        prefetcher.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    return sum_capture_reports(capture_reports)
@@ -0,0 +1,589 @@
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import multiprocessing
+import os
+import sys
+
+import numpy
+from pxr import UsdGeom, Usd, Sdf, Vt
+
+from ekozerski.rtxremixtools.commons import log_error, log_warn
+from ekozerski.rtxremixtools import mesh_fix_cache, profiling
+
+
+DEFAULT_WELD_TOLERANCE = 1e-6
+# Width of the cells vertices are bucketed in by position when welding, in tolerances.
+_WELD_CELL_SIZE = 64
+# Multipliers mixing the 3 coordinates of a cell into one int64 (wrapping around). Colliding cells only add candidates.
+_CELL_HASH_MULTIPLIERS = numpy.array([73856093, 19349663, 83492791], dtype=numpy.int64)
+
+
+def _gather_per_element(data, indices):
+    return [data[i] for i in indices]
+
+
+def _gather_vectorized(data, indices):
+    """
+    Reads the VtArray as a zero-copy numpy view and gathers all elements at once with fancy indexing.
+    Falls back to per-element copies for types without numpy support (strings, tokens...).
+    """
+    array_type = type(data)
+    if not hasattr(array_type, 'FromNumpy'):
+        return _gather_per_element(data, indices)
+
+    return array_type.FromNumpy(numpy.asarray(data)[indices])
+
+
+def _ear_clip_polygon(polygon):
+    """
+    Triangulates a simple 2D polygon in counter clockwise order, returning triangles as local corner indices.
+    """
+    def cross(a, b, c):
+        return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+    def is_inside_triangle(p, a, b, c):
+        return cross(a, b, p) >= 0 and cross(b, c, p) >= 0 and cross(c, a, p) >= 0
+
+    remaining = list(range(len(polygon)))
+    triangles = list()
+    while len(remaining) > 3:
+        count = len(remaining)
+        for i in range(count):
+            a, b, c = remaining[i - 1], remaining[i], remaining[(i + 1) % count]
+            if cross(polygon[a], polygon[b], polygon[c]) <= 0:
+                continue
+            if any(
+                is_inside_triangle(polygon[p], polygon[a], polygon[b], polygon[c])
+                for p in remaining if p not in (a, b, c)
+            ):
+                continue
+            triangles.append((a, b, c))
+            remaining.pop(i)
+            break
+        else:
+            # Degenerate or self-intersecting polygon, so a fan is as good as anything for what's left.
+            triangles.extend((remaining[0], remaining[k], remaining[k + 1]) for k in range(1, len(remaining) - 1))
+            return triangles
+
+    triangles.append(tuple(remaining))
+    return triangles
+
+
+def _find_concave_faces(points, face_vertex_indices, face_vertex_counts, face_starts):
+    """
+    Returns the indices of non-convex polygons by checking every corner against the polygon's normal (Newell's method).
+    """
+    polygon_faces = numpy.flatnonzero(face_vertex_counts > 3)
+    if not len(polygon_faces):
+        return polygon_faces
+
+    counts = face_vertex_counts[polygon_faces]
+    starts = face_starts[polygon_faces]
+    corner_face = numpy.repeat(numpy.arange(len(polygon_faces)), counts)
+    local = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    corner_counts = counts[corner_face]
+    corner_starts = starts[corner_face]
+    current = points[face_vertex_indices[corner_starts + local]]
+    previous = points[face_vertex_indices[corner_starts + (local - 1) % corner_counts]]
+    following = points[face_vertex_indices[corner_starts + (local + 1) % corner_counts]]
+
+    normals = numpy.add.reduceat(numpy.cross(current, following), numpy.cumsum(counts) - counts)
+    turns = numpy.einsum('ij,ij->i', numpy.cross(current - previous, following - current), normals[corner_face])
+    is_concave = numpy.zeros(len(polygon_faces), dtype=bool)
+    numpy.logical_or.at(is_concave, corner_face, turns < 0)
+    return polygon_faces[is_concave]
+
+
+def _ear_clip_face(points, face_vertex_indices, start, count):
+    polygon = points[face_vertex_indices[start:start + count]]
+    normal = numpy.cross(polygon, numpy.roll(polygon, -1, axis=0)).sum(axis=0)
+    # Projecting onto the plane most aligned to the polygon, keeping it counter clockwise.
+    dropped_axis = int(numpy.argmax(numpy.abs(normal)))
+    polygon_2d = polygon[:, [(dropped_axis + 1) % 3, (dropped_axis + 2) % 3]]
+    if normal[dropped_axis] < 0:
+        polygon_2d[:, 0] *= -1
+    return numpy.asarray(_ear_clip_polygon(polygon_2d.tolist()), dtype=numpy.int64) + start
+
+
+def _expand_face_indices(face_indices, triangle_starts, triangle_counts):
+    face_indices = numpy.asarray(face_indices, dtype=numpy.int64)
+    counts = triangle_counts[face_indices]
+    local = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return numpy.repeat(triangle_starts[face_indices], counts) + local
+
+
+@profiling.traced()
+def triangulate_mesh(mesh):
+    """
+    Triangulates every polygon of the mesh working on the flat faceVertexCounts/faceVertexIndices arrays. Convex
+    polygons are fan triangulated all at once, while the few concave ones go through ear clipping.
+    faceVarying and uniform primvars, face GeomSubsets and holeIndices are carried along.
+    Returns False if the mesh was already triangulated.
+    """
+    prim = mesh.GetPrim()
+    counts_attr = mesh.GetFaceVertexCountsAttr()
+    indices_attr = mesh.GetFaceVertexIndicesAttr()
+    face_vertex_counts = numpy.asarray(counts_attr.Get(), dtype=numpy.int64)
+    if numpy.all(face_vertex_counts == 3):
+        return False
+
+    face_vertex_indices = numpy.asarray(indices_attr.Get(), dtype=numpy.int64)
+    face_starts = numpy.cumsum(face_vertex_counts) - face_vertex_counts
+    triangle_counts = numpy.maximum(face_vertex_counts - 2, 0)
+    triangle_starts = numpy.cumsum(triangle_counts) - triangle_counts
+    triangle_faces = numpy.repeat(numpy.arange(len(face_vertex_counts)), triangle_counts)
+    local_triangles = numpy.arange(triangle_counts.sum()) - triangle_starts[triangle_faces]
+
+    # Fan triangulation, as (face-vertex) corners 0, k+1, k+2 for each of the face's triangles.
+    fan_origins = face_starts[triangle_faces]
+    corners = numpy.stack([fan_origins, fan_origins + local_triangles + 1, fan_origins + local_triangles + 2], axis=1)
+
+    points = numpy.asarray(mesh.GetPointsAttr().Get(), dtype=numpy.float64)
+    for face in _find_concave_faces(points, face_vertex_indices, face_vertex_counts, face_starts):
+        start = triangle_starts[face]
+        corners[start:start + triangle_counts[face]] = _ear_clip_face(
+            points, face_vertex_indices, face_starts[face], face_vertex_counts[face]
+        )
+    corners = corners.ravel()
+
+    def carry_over(value_holder, interpolation, is_indexed=False):
+        if interpolation == UsdGeom.Tokens.faceVarying:
+            element_indices = corners
+        elif interpolation == UsdGeom.Tokens.uniform:
+            element_indices = triangle_faces
+        else:
+            return
+
+        if is_indexed:
+            value_holder.SetIndices(_gather_vectorized(value_holder.GetIndices(), element_indices))
+            return
+        value = value_holder.Get()
+        if value:
+            value_holder.Set(_gather_vectorized(value, element_indices))
+
+    for var in UsdGeom.PrimvarsAPI(prim).GetPrimvars():
+        carry_over(var, var.GetInterpolation(), var.IsIndexed())
+    carry_over(mesh.GetNormalsAttr(), mesh.GetNormalsInterpolation())
+
+    for subset in UsdGeom.Subset.GetAllGeomSubsets(mesh):
+        if subset.GetElementTypeAttr().Get() == UsdGeom.Tokens.face:
+            subset_indices = subset.GetIndicesAttr().Get()
+            new_indices = _expand_face_indices(subset_indices, triangle_starts, triangle_counts)
+            subset.GetIndicesAttr().Set(Vt.IntArray.FromNumpy(new_indices.astype(numpy.int32)))
+    hole_indices = mesh.GetHoleIndicesAttr().Get()
+    if hole_indices:
+        new_holes = _expand_face_indices(hole_indices, triangle_starts, triangle_counts)
+        mesh.GetHoleIndicesAttr().Set(Vt.IntArray.FromNumpy(new_holes.astype(numpy.int32)))
+
+    indices_attr.Set(Vt.IntArray.FromNumpy(face_vertex_indices[corners].astype(numpy.int32)))
+    counts_attr.Set(Vt.IntArray.FromNumpy(numpy.full(len(triangle_faces), 3, dtype=numpy.int32)))
+    return True
+
+
+@profiling.traced()
+def convert_mesh_to_vertex_interpolation_mode(mesh, vectorized=True):
+    """
+    This method attemps to convert Remix meshes' interpolation mode from constant or faceVarying to vertex.
+    If there is any faceVarying attribute, it means the data arrays (points, uvs, normals...) will have different
+    lengths, so this script will copy data around using the faceVertexIndices array to ensure they all end up with the
+    same length.
+
+    The "vectorized" path gathers the arrays with numpy in bulk, while the per-element path is kept for reference and
+    benchmarking purposes.
+    """
+    # TODO: Study interpolation modes in depth to implement a decent conversion script.
+    prim = mesh.GetPrim()
+    primvar_api = UsdGeom.PrimvarsAPI(prim)
+    # Constant primvars hold a single value for the whole mesh, so they're left as they are.
+    primvars = {var for var in primvar_api.GetPrimvars() if var.GetInterpolation() != UsdGeom.Tokens.constant}
+    face_varying_primvars = [v for v in primvars if v.GetInterpolation() == UsdGeom.Tokens.faceVarying]
+    if face_varying_primvars or mesh.GetNormalsInterpolation() == UsdGeom.Tokens.faceVarying:
+        non_face_varying_primvars = list(primvars.difference(face_varying_primvars))
+        non_face_varying_primvars = [var for var in non_face_varying_primvars if var.GetInterpolation() != 'uniform']
+        indices = prim.GetAttribute("faceVertexIndices")
+        indices_arr = indices.Get()
+        if vectorized:
+            gather = _gather_vectorized
+            indices_arr = numpy.asarray(indices_arr)
+        else:
+            gather = _gather_per_element
+
+        # Settings points separately since it doesn't have a "SetInterpolation" like primvars.
+        points = prim.GetAttribute("points")
+        points.Set(gather(points.Get(), indices_arr))
+
+        for var in non_face_varying_primvars:
+            original_arr = var.Get()
+            if original_arr:
+                var.Set(gather(original_arr, indices_arr))
+
+        if vectorized:
+            indices.Set(Vt.IntArray.FromNumpy(numpy.arange(len(indices_arr), dtype=numpy.int32)))
+        else:
+            indices.Set([i for i in range(len(indices_arr))])
+    
+    [var.SetInterpolation(UsdGeom.Tokens.vertex) for var in primvars]
+    mesh.SetNormalsInterpolation(UsdGeom.Tokens.vertex)
+
+
+@profiling.traced()
+def convert_uv_primvars_to_st(mesh):
+    # https://github.com/NVIDIAGameWorks/dxvk-remix/blob/ebb0ecfd638d6a32ab5f10708b5b07bc763cf79b/src/dxvk/rtx_render/rtx_mod_usd.cpp#L696
+    # https://github.com/Kim2091/RTXRemixTools/blob/8ae25224ef8d1d284f3e208f671b2ce6a35b82af/RemixMeshConvert/For%20USD%20Composer/RemixMeshConvert_OV.py#L4
+    known_uv_names = [
+        'primvars:st',
+        'primvars:uv',
+        'primvars:st0',
+        'primvars:st1',
+        'primvars:st2',
+        'primvars:UVMap',
+        'primvars:UVChannel_1',
+        'primvars:map1',
+    ]
+    # Preserving the order of found primvars to use the first one, in case a primvars:st can't be found.
+    primvar_api = UsdGeom.PrimvarsAPI(mesh)
+    uv_primvars = OrderedDict(
+        (primvar.GetName(), primvar)
+        for primvar in primvar_api.GetPrimvars()
+        if primvar.GetTypeName().role == 'TextureCoordinate'
+        or primvar.GetName() in known_uv_names
+    )
+    if not uv_primvars:
+        return
+    
+    # Picking only one UV and blowing up everything else as the runtime only reads the first anyway.
+    considered_uv = uv_primvars.get('primvars:st') or next(iter(uv_primvars.values()))
+    uv_data = considered_uv.Get()
+    [primvar_api.RemovePrimvar(uv_name) for uv_name in uv_primvars.keys()]
+
+    # Recreating the primvar with appropriate name, type and role
+    new_uv_primvar = primvar_api.CreatePrimvar('primvars:st', Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.vertex)
+    new_uv_primvar.Set(uv_data)
+
+
+@profiling.traced()
+def remove_unused_primvars(mesh):
+    unused_primvar_names = [
+        'primvars:displayColor',
+        'primvars:displayOpacity',
+    ]
+    primvar_api = UsdGeom.PrimvarsAPI(mesh)
+    [primvar_api.RemovePrimvar(uv_name) for uv_name in unused_primvar_names]
+
+
+@profiling.traced()
+def _as_row_keys(array):
+    """
+    Views each row of a 2D array as a single binary value, to sort, search and deduplicate rows at once.
+    """
+    array = numpy.ascontiguousarray(array)
+    return array.view(numpy.dtype((numpy.void, array.dtype.itemsize * array.shape[1]))).ravel()
+
+
+def _expand_ranges(starts, counts):
+    """
+    Concatenates the index ranges [start, start + count) into a single array.
+    """
+    range_offsets = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return numpy.repeat(starts, counts) + range_offsets
+
+
+def _find_close_row_pairs(rows, tolerance):
+    """
+    Returns (i, j) index arrays of the rows whose every column differs by at most "tolerance". Rows are bucketed by
+    their first 3 columns (the point) in cells of _WELD_CELL_SIZE tolerances, and only compared with the rows of the
+    same cell, or of a neighbouring cell when they lie within a tolerance of its border.
+    """
+    scaled = rows[:, :3] / (tolerance * _WELD_CELL_SIZE)
+    cells = numpy.floor(scaled).astype(numpy.int64)
+    fractions = scaled - cells
+    # Twice the tolerance, so float rounding near a border never hides a neighbour.
+    margin = 2.0 / _WELD_CELL_SIZE
+    cell_keys = cells @ _CELL_HASH_MULTIPLIERS
+    order = numpy.argsort(cell_keys, kind='stable')
+    sorted_keys = cell_keys[order]
+
+    # Rows of the same cell, each one paired with the ones after it.
+    run_starts = numpy.flatnonzero(numpy.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    run_ends = numpy.r_[run_starts[1:], len(sorted_keys)]
+    sorted_run_ends = numpy.repeat(run_ends, numpy.diff(numpy.r_[run_starts, len(sorted_keys)]))
+    counts = sorted_run_ends - numpy.arange(len(sorted_keys)) - 1
+    pair_i = [order[numpy.repeat(numpy.arange(len(sorted_keys)), counts)]]
+    pair_j = [order[_expand_ranges(numpy.arange(len(sorted_keys)) + 1, counts)]]
+
+    # Rows of the neighbouring cells, only for the rows close enough to their border.
+    for offset in itertools.product((-1, 0, 1), repeat=3):
+        if not any(offset):
+            continue
+        probing = numpy.ones(len(rows), dtype=bool)
+        for axis, direction in enumerate(offset):
+            if direction < 0:
+                probing &= fractions[:, axis] < margin
+            elif direction > 0:
+                probing &= fractions[:, axis] > 1.0 - margin
+        probing_rows = numpy.flatnonzero(probing)
+        probe_keys = (cells[probing_rows] + numpy.array(offset, dtype=numpy.int64)) @ _CELL_HASH_MULTIPLIERS
+        # Searching sorted keys is much faster, each search starting where the previous one ended.
+        probe_order = numpy.argsort(probe_keys)
+        probing_rows, probe_keys = probing_rows[probe_order], probe_keys[probe_order]
+        starts = numpy.searchsorted(sorted_keys, probe_keys, side='left')
+        counts = numpy.searchsorted(sorted_keys, probe_keys, side='right') - starts
+        pair_i.append(numpy.repeat(probing_rows, counts))
+        pair_j.append(order[_expand_ranges(starts, counts)])
+
+    pair_i, pair_j = numpy.concatenate(pair_i), numpy.concatenate(pair_j)
+    close = numpy.all(numpy.abs(rows[pair_i] - rows[pair_j]) <= tolerance, axis=1) & (pair_i != pair_j)
+    return pair_i[close], pair_j[close]
+
+
+def _label_connected_rows(row_count, pair_i, pair_j):
+    """
+    Labels each row with the lowest row index it's connected to through the (i, j) pairs.
+    """
+    labels = numpy.arange(row_count)
+    while True:
+        new_labels = labels.copy()
+        numpy.minimum.at(new_labels, pair_i, labels[pair_j])
+        numpy.minimum.at(new_labels, pair_j, labels[pair_i])
+        new_labels = new_labels[new_labels]
+        if numpy.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def find_weld_representatives(rows, tolerance):
+    """
+    Returns, for each row, the index of the first row it's welded to: rows are merged with every row whose columns are
+    all within "tolerance" of theirs (and with the rows those are merged with), wherever they fall on a grid.
+    """
+    if tolerance <= 0:
+        _, first_index, inverse = numpy.unique(_as_row_keys(rows + 0.0), return_index=True, return_inverse=True)
+        return first_index[inverse.ravel()]
+    return _label_connected_rows(len(rows), *_find_close_row_pairs(rows, tolerance))
+
+
+def weld_vertices(mesh, tolerance=DEFAULT_WELD_TOLERANCE):
+    """
+    Merges vertices whose point, normal, uv and any other per-vertex primvar are all within "tolerance" of each other,
+    building a compact vertex buffer and remapping "faceVertexIndices" to it. Meant to run after the mesh was converted
+    to "vertex" interpolation mode, which otherwise leaves one unique vertex per face-vertex.
+    """
+    prim = mesh.GetPrim()
+    points_attr = mesh.GetPointsAttr()
+    points = points_attr.Get()
+    indices_attr = mesh.GetFaceVertexIndicesAttr()
+    face_vertex_indices = indices_attr.Get()
+    if not points or not face_vertex_indices:
+        return
+
+    vertex_count = len(points)
+    vertex_data = [(points_attr, points)]
+    normals_attr = mesh.GetNormalsAttr()
+    normals = normals_attr.Get()
+    if normals and len(normals) == vertex_count:
+        vertex_data.append((normals_attr, normals))
+
+    indexed_primvars = []
+    for var in UsdGeom.PrimvarsAPI(prim).GetPrimvars():
+        if var.GetInterpolation() not in [UsdGeom.Tokens.vertex, UsdGeom.Tokens.varying]:
+            continue
+        value = var.ComputeFlattened() if var.IsIndexed() else var.Get()
+        if not value or len(value) != vertex_count:
+            continue
+        if not hasattr(type(value), 'FromNumpy'):
+            log_warn(f"Skipping vertex welding on {prim.GetPath()}: primvar '{var.GetName()}' can't be compared.")
+            return
+        if var.IsIndexed():
+            indexed_primvars.append(var)
+        vertex_data.append((var, value))
+
+    # One row per vertex with all its values, points first.
+    columns = [numpy.asarray(value).reshape(vertex_count, -1).astype(numpy.float64) for _, value in vertex_data]
+    representatives = find_weld_representatives(numpy.hstack(columns), tolerance)
+    # Each group is represented by its first vertex, so the welded vertices keep their order between runs.
+    is_kept = representatives == numpy.arange(vertex_count)
+    kept_vertices = numpy.flatnonzero(is_kept)
+    if len(kept_vertices) == vertex_count:
+        return
+    vertex_remap = (numpy.cumsum(is_kept, dtype=numpy.int32) - 1)[representatives]
+
+    for attr, value in vertex_data:
+        attr.Set(type(value).FromNumpy(numpy.asarray(value)[kept_vertices]))
+    [var.BlockIndices() for var in indexed_primvars]
+    indices_attr.Set(Vt.IntArray.FromNumpy(vertex_remap[numpy.asarray(face_vertex_indices)]))
+
+
+def fix_meshes_in_file(usd_file_path, weld=False, weld_tolerance=DEFAULT_WELD_TOLERANCE):
+    with profiling.trace("geometry.open_stage", file=usd_file_path):
+        stage = Usd.Stage.Open(usd_file_path)
+    mesh_prims = [prim for prim in stage.TraverseAll() if UsdGeom.Mesh(prim)]
+    for prim in mesh_prims:
+        faceVertices = prim.GetAttribute("faceVertexCounts").Get()
+        if not faceVertices:
+            log_error(f"Mesh {prim.GetPath()} in '{usd_file_path}' doesn't have any faces.")
+            continue
+        with profiling.trace("geometry.fix_mesh", mesh=prim.GetPath().pathString, faces=len(faceVertices)) as span:
+            # Triangulating first, as the interpolation conversion relies on faceVarying data being per triangle corner.
+            triangulate_mesh(UsdGeom.Mesh(prim))
+            convert_mesh_to_vertex_interpolation_mode(UsdGeom.Mesh(prim))
+            convert_uv_primvars_to_st(UsdGeom.Mesh(prim))
+            remove_unused_primvars(UsdGeom.Mesh(prim))
+            if weld:
+                weld_vertices(UsdGeom.Mesh(prim), weld_tolerance)
+            if span:
+                span.set(points=len(UsdGeom.Mesh(prim).GetPointsAttr().Get() or []))
+
+    with profiling.trace("geometry.save_stage", file=usd_file_path, meshes=len(mesh_prims)):
+        stage.Save()
+
+
+FixResult = namedtuple('FixResult', ['path', 'error', 'skipped', 'cache_entry', 'trace_events'], defaults=[None])
+
+
+def fix_meshes_in_file_safe(
+    usd_file_path, weld=False, weld_tolerance=DEFAULT_WELD_TOLERANCE, cache_entry=None, force=False, profile=False
+):
+    """
+    Process pool entry point for "fix_meshes_in_file", reporting errors in the returned FixResult rather than raising,
+    so one broken file doesn't abort the whole batch. Files still matching their "cache_entry" from a previous run
+    with the same options are skipped, unless "force" is set. With "profile", the phases traced in the worker process
+    are sent back in the FixResult, as workers don't share the ring buffer of the main process.
+    """
+    options = {'weld': weld, 'weld_tolerance': weld_tolerance}
+    if profile:
+        profiling.set_enabled(True)
+        profiling.clear()
+    try:
+        if not force:
+            valid_entry = mesh_fix_cache.validate_entry(cache_entry, usd_file_path, options)
+            if valid_entry:
+                return FixResult(usd_file_path, None, True, valid_entry)
+
+        fix_meshes_in_file(usd_file_path, weld, weld_tolerance)
+        return FixResult(
+            usd_file_path, None, False, mesh_fix_cache.create_entry(usd_file_path, options),
+            profiling.get_events() if profile else None,
+        )
+    except Exception as e:
+        return FixResult(usd_file_path, f"{type(e).__name__}: {e}", False, None)
+
+
+def _get_python_executable():
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+
+    # Inside Kit, sys.executable is the Kit binary rather than its bundled python interpreter.
+    if sys.platform == 'win32':
+        return os.path.join(sys.prefix, 'python.exe')
+    return os.path.join(sys.prefix, 'bin', 'python3')
+
+
+def create_process_pool(max_workers=None):
+    """
+    Creates a process pool whose workers only import pxr and this module. Each worker opens its own Usd.Stage.
+    """
+    mp_context = multiprocessing.get_context('spawn')
+    mp_context.set_executable(_get_python_executable())
+    return ProcessPoolExecutor(max_workers=max_workers or None, mp_context=mp_context)
+
+
+EXPORTED_MESH_ATTRIBUTES = [
+    'doubleSided', 'extent', 'faceVertexCounts', 'faceVertexIndices', 'normals', 'points', 'primvars:st'
+]
+_ATTRIBUTE_VALUE_KEYS = ('default', 'timeSamples', 'typeName')
+
+
+def find_attribute_specs(mesh, attr_names):
+    """
+    Maps each attribute name to its specs across the mesh's prim stack, strongest first, without composing or reading
+    any value.
+    """
+    attr_specs = defaultdict(list)
+    for prim_spec in mesh.GetPrimStack():
+        for attr_name in attr_names:
+            attr_spec = prim_spec.layer.GetAttributeAtPath(prim_spec.path.AppendProperty(attr_name))
+            if attr_spec:
+                attr_specs[attr_name].append(attr_spec)
+    return attr_specs
+
+
+def copy_flattened_attribute_specs(attr_specs, layer, attr_path):
+    """
+    Copies an attribute's specs (strongest first) into a single spec of "layer", the way they compose: the default
+    value and the time samples each from the strongest spec holding them, and each metadata field from the strongest
+    spec authoring it (dictionaries like customData aren't merged key by key). Returns False without copying anything
+    when the value is empty.
+    """
+    default_spec = next((spec for spec in attr_specs if spec.HasDefaultValue()), None)
+    samples_spec = next((spec for spec in attr_specs if spec.HasInfo('timeSamples')), None)
+    # VtArrays share their buffer when read, so checking for empty values doesn't copy anything.
+    if samples_spec is None and (default_spec is None or not default_spec.default):
+        return False
+
+    value_spec = min([spec for spec in (default_spec, samples_spec) if spec is not None], key=attr_specs.index)
+    Sdf.CopySpec(value_spec.layer, value_spec.path, layer, attr_path)
+    if len(attr_specs) > 1:
+        new_spec = layer.GetAttributeAtPath(attr_path)
+        # A stronger spec only holding time samples doesn't hide the default value of a weaker one, nor the reverse.
+        if default_spec is not None and default_spec is not value_spec:
+            new_spec.default = default_spec.default
+        if samples_spec is not None and samples_spec is not value_spec:
+            new_spec.SetInfo('timeSamples', samples_spec.GetInfo('timeSamples'))
+        value_index = attr_specs.index(value_spec)
+        # Stronger specs override the copied metadata, the strongest last, while weaker ones only fill the gaps.
+        for attr_spec in reversed(attr_specs[:value_index]):
+            for key in attr_spec.ListInfoKeys():
+                if key not in _ATTRIBUTE_VALUE_KEYS:
+                    new_spec.SetInfo(key, attr_spec.GetInfo(key))
+        for attr_spec in attr_specs[value_index + 1:]:
+            for key in attr_spec.ListInfoKeys():
+                if key not in _ATTRIBUTE_VALUE_KEYS and not new_spec.HasInfo(key):
+                    new_spec.SetInfo(key, attr_spec.GetInfo(key))
+    return True
+
+
+def create_export_stage(prim_path, mesh):
+    """
+    Copies the captured mesh data needed by the runtime into a new in memory stage, returning it along with the new
+    mesh path. Attributes are copied spec to spec (values, time samples and metadata like "interpolation", flattened
+    across the mesh's layers), so arrays are never converted back and forth to python. Reads the current stage, so it
+    must run on the main thread.
+    """
+    with profiling.trace("geometry.create_export_stage", mesh=prim_path) as span:
+        layer = Sdf.Layer.CreateAnonymous('.usd')
+        root_spec = Sdf.PrimSpec(layer, 'root', Sdf.SpecifierDef, 'Xform')
+        layer.defaultPrim = root_spec.name
+        mesh_spec = Sdf.PrimSpec(root_spec, prim_path.rsplit("/", 1)[-1], Sdf.SpecifierDef, 'Mesh')
+        attr_specs = find_attribute_specs(mesh, EXPORTED_MESH_ATTRIBUTES)
+        for attr_name, specs in attr_specs.items():
+            copy_flattened_attribute_specs(specs, layer, mesh_spec.path.AppendProperty(attr_name))
+
+        layer.pseudoRoot.SetInfo(UsdGeom.Tokens.upAxis, UsdGeom.GetStageUpAxis(mesh.GetStage()))
+        points_spec = layer.GetAttributeAtPath(mesh_spec.path.AppendProperty('points'))
+        if span and points_spec:
+            span.set(points=len(points_spec.default or []))
+        return Usd.Stage.Open(layer), mesh_spec.path
+
+
+def process_and_export_stage(
+    stage, mesh_path, output_path, weld=False, weld_tolerance=DEFAULT_WELD_TOLERANCE
+):
+    """
+    Only touches the given in memory stage, so many can run at once in worker threads.
+    """
+    with profiling.trace("geometry.process_and_export_stage", output_path=output_path) as span:
+        new_mesh = UsdGeom.Mesh(stage.GetPrimAtPath(mesh_path))
+        convert_mesh_to_vertex_interpolation_mode(new_mesh)
+        if weld:
+            weld_vertices(new_mesh, weld_tolerance)
+        if span:
+            span.set(points=len(new_mesh.GetPointsAttr().Get() or []))
+
+        stage.Export(output_path)
+        return output_path
+
+
+def copy_original_mesh(prim_path, mesh, output_path, weld=False, weld_tolerance=DEFAULT_WELD_TOLERANCE):
+    stage, mesh_path = create_export_stage(prim_path, mesh)
+    process_and_export_stage(stage, mesh_path, output_path, weld, weld_tolerance)
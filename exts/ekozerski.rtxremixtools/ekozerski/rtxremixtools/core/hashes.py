@@ -0,0 +1,261 @@
+import os
+
+from pxr import Usd, Sdf, Tf
+
+
+MESHES_PATH = Sdf.Path('/RootNode/meshes')
+INSTANCES_PATH = Sdf.Path('/RootNode/instances')
+
+
+def parse_prim_hash(prim_name):
+    """
+    Returns the HASH from "mesh_HASH" and "inst_HASH_N" like names, or None.
+    """
+    parts = prim_name.split('_')
+    return parts[1] if len(parts) >= 2 else None
+
+
+def get_free_child_name(child_names: set, name: str):
+    """
+    Picks the first free "name_N", adding it to "child_names" so the next call doesn't pick it again.
+    """
+    counter = 0
+    while f'{name}_{counter}' in child_names:
+        counter += 1
+    child_name = f'{name}_{counter}'
+    child_names.add(child_name)
+    return child_name
+
+
+class CaptureHashIndex:
+    """
+    Stage-scoped index of the captured hashes: hash -> mesh_HASH path, hash -> inst_HASH_N paths and the reverse
+    path -> hash. Built lazily once and kept up to date from Usd.Notice.ObjectsChanged, so resolving large selections
+    doesn't need to walk up the prim hierarchy for every prim.
+    """
+    def __init__(self, stage):
+        self.stage = stage
+        self._dirty = True
+        self._is_capture = False
+        self._mesh_paths = dict()
+        # Dicts used as insertion ordered sets, so instances can be removed in O(1).
+        self._instance_paths = dict()
+        self._hash_by_path = dict()
+        self._listener = Tf.Notice.Register(Usd.Notice.ObjectsChanged, self._on_objects_changed, stage)
+
+    def release(self):
+        if self._listener is not None:
+            self._listener.Revoke()
+            self._listener = None
+
+    def _add(self, prim_path):
+        prim_hash = parse_prim_hash(prim_path.name)
+        if prim_hash is None:
+            return
+
+        self._hash_by_path[prim_path] = prim_hash
+        if prim_path.GetParentPath() == MESHES_PATH:
+            self._mesh_paths[prim_hash] = prim_path
+        else:
+            self._instance_paths.setdefault(prim_hash, dict())[prim_path] = None
+
+    def _remove(self, prim_path):
+        prim_hash = self._hash_by_path.pop(prim_path, None)
+        if prim_hash is None:
+            return
+
+        if prim_path.GetParentPath() == MESHES_PATH:
+            self._mesh_paths.pop(prim_hash, None)
+        else:
+            self._instance_paths.get(prim_hash, dict()).pop(prim_path, None)
+
+    def _rebuild(self):
+        self._mesh_paths.clear()
+        self._instance_paths.clear()
+        self._hash_by_path.clear()
+        meshes_prim = self.stage.GetPrimAtPath(MESHES_PATH)
+        self._is_capture = bool(meshes_prim)
+        if meshes_prim:
+            [self._add(prim.GetPath()) for prim in meshes_prim.GetAllChildren()]
+        instances_prim = self.stage.GetPrimAtPath(INSTANCES_PATH)
+        if instances_prim:
+            [self._add(prim.GetPath()) for prim in instances_prim.GetAllChildren()]
+        self._dirty = False
+
+    def _ensure_built(self):
+        if self._dirty:
+            self._rebuild()
+
+    def _on_objects_changed(self, notice, sender):
+        if self._dirty:
+            return
+
+        for path in notice.GetResyncedPaths():
+            if MESHES_PATH.HasPrefix(path) or INSTANCES_PATH.HasPrefix(path):
+                # The containers themselves (or an ancestor) changed, so rebuilding on the next query.
+                self._dirty = True
+                return
+            if path.IsPrimPath() and path.GetParentPath() in (MESHES_PATH, INSTANCES_PATH):
+                self._remove(path)
+                if self.stage.GetPrimAtPath(path):
+                    self._add(path)
+
+    def is_capture(self):
+        self._ensure_built()
+        return self._is_capture
+
+    def get_owning_hash(self, prim_path):
+        """
+        Returns the hash of the mesh_HASH/inst_HASH_N prim "prim_path" is (or is nested in), or None.
+        """
+        self._ensure_built()
+        prim_path = Sdf.Path(prim_path)
+        if prim_path.pathElementCount < 3:
+            return None
+        return self._hash_by_path.get(prim_path.GetPrefixes()[2])
+
+    def get_mesh_path(self, mesh_hash):
+        self._ensure_built()
+        return self._mesh_paths.get(mesh_hash)
+
+    def get_instance_paths(self, mesh_hash):
+        self._ensure_built()
+        return list(self._instance_paths.get(mesh_hash, dict()).keys())
+
+    def get_source_mesh_path(self, prim_path):
+        mesh_hash = self.get_owning_hash(prim_path)
+        return self.get_mesh_path(mesh_hash) if mesh_hash is not None else None
+
+
+_hash_index = None
+
+
+def get_hash_index(stage) -> CaptureHashIndex:
+    """
+    Returns the hash index of "stage". Only the last requested stage is indexed.
+    """
+    global _hash_index
+    if _hash_index is None or _hash_index.stage != stage:
+        release_hash_index()
+        _hash_index = CaptureHashIndex(stage)
+    return _hash_index
+
+
+def release_hash_index():
+    global _hash_index
+    if _hash_index is not None:
+        _hash_index.release()
+        _hash_index = None
+
+
+def find_source_mesh_hash_prim(current_stage, prim):
+    hash_index = get_hash_index(current_stage)
+    if not hash_index.is_capture():
+        return prim
+
+    mesh_path = hash_index.get_source_mesh_path(prim.GetPath())
+    return current_stage.GetPrimAtPath(mesh_path) if mesh_path is not None else None
+
+
+def find_source_mesh_hash_prims(current_stage, prim_paths):
+    """
+    Resolves the unique mesh_HASH prims of many selected prim paths at once.
+    """
+    hash_index = get_hash_index(current_stage)
+    if not hash_index.is_capture():
+        prims = [current_stage.GetPrimAtPath(path) for path in prim_paths]
+        return list({prim.GetPath(): prim for prim in prims if prim}.values())
+
+    mesh_paths = {hash_index.get_source_mesh_path(path) for path in prim_paths}
+    prims = [current_stage.GetPrimAtPath(path) for path in mesh_paths if path is not None]
+    return [prim for prim in prims if prim]
+
+
+def find_inst_hash_prim(instance_mesh):
+    hash_index = get_hash_index(instance_mesh.GetStage())
+    instance_path = instance_mesh.GetPath()
+    if instance_path.HasPrefix(INSTANCES_PATH) and hash_index.get_owning_hash(instance_path) is not None:
+        return instance_mesh.GetStage().GetPrimAtPath(instance_path.GetPrefixes()[2])
+
+    search_prim = instance_mesh
+    while search_prim.GetParent().IsValid() and search_prim.GetParent().GetPath() != INSTANCES_PATH:
+        search_prim = search_prim.GetParent()
+
+    if not search_prim:
+        return None
+
+    return search_prim
+
+
+LAYER_CAPTURE = 'capture'
+LAYER_MOD = 'mod'
+LAYER_OTHER = 'other'
+
+
+def classify_layer_path(layer_path):
+    """
+    "capture" for the captured meshes files (rtx-remix/captures/meshes), "mod" for files in a mods folder, otherwise
+    "other".
+    """
+    layer_path = os.path.normpath(layer_path)
+    if os.path.normpath("captures/meshes") in layer_path:
+        return LAYER_CAPTURE
+    if f"{os.sep}mods{os.sep}" in layer_path or layer_path.startswith(f"mods{os.sep}"):
+        return LAYER_MOD
+    return LAYER_OTHER
+
+
+class LayerClassifier:
+    """
+    Memoizes "classify_layer_path" by layer identifier, dropping entries of layers reloaded or renamed.
+    """
+    def __init__(self):
+        self._classes = dict()
+        self._listeners = [
+            Tf.Notice.RegisterGlobally(Sdf.Notice.LayerDidReloadContent, self._on_layer_reloaded),
+            Tf.Notice.RegisterGlobally(Sdf.Notice.LayerIdentifierDidChange, self._on_layer_identifier_changed),
+        ]
+
+    def release(self):
+        [listener.Revoke() for listener in self._listeners]
+        self._listeners = list()
+        self._classes.clear()
+
+    def clear(self):
+        self._classes.clear()
+
+    def _on_layer_reloaded(self, notice, layer):
+        self._classes.pop(layer.identifier, None)
+
+    def _on_layer_identifier_changed(self, notice, layer):
+        self._classes.pop(notice.oldIdentifier, None)
+
+    def classify(self, layer):
+        layer_class = self._classes.get(layer.identifier)
+        if layer_class is None:
+            layer_class = self._classes[layer.identifier] = classify_layer_path(layer.realPath or layer.identifier)
+        return layer_class
+
+
+_layer_classifier = None
+
+
+def get_layer_classifier() -> LayerClassifier:
+    global _layer_classifier
+    if _layer_classifier is None:
+        _layer_classifier = LayerClassifier()
+    return _layer_classifier
+
+
+def release_layer_classifier():
+    global _layer_classifier
+    if _layer_classifier is not None:
+        _layer_classifier.release()
+        _layer_classifier = None
+
+
+def is_a_captured_mesh(mesh):
+    """
+    Returns True if the Mesh's defining USD file is located in the captures folder.
+    """
+    return get_layer_classifier().classify(mesh.GetPrimStack()[-1].layer) == LAYER_CAPTURE
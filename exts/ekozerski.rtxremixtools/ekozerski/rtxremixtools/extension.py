@@ -1,14 +1,19 @@
+import sys
+import time
+
 import omni.ext
-import omni.ui as ui
+import omni.kit.app
+import omni.kit.commands
+import omni.usd
 from omni.kit import context_menu
 from omni.kit.hotkeys.core import get_hotkey_registry
 from omni.kit.actions.core import get_action_registry
 from omni.paint.system.core import register_brush, unregister_brush
-from omni.paint.brush.scatter.brush import get_ext_path
 
+from . import commands
 from . import commons
-from .rtx_context_menu import build_rtx_remix_menu
-from .brush import RemixScatterBrush
+from . import profiling
+from .rtx_context_menu import build_rtx_remix_menu, invalidate_menu_enablement
 
 
 # Any class derived from `omni.ext.IExt` in top level module (defined in `python.modules` of `extension.toml`) will be
@@ -16,13 +21,22 @@ from .brush import RemixScatterBrush
 # on_shutdown() is called.
 class RtxRemixTools(omni.ext.IExt):
     def on_startup(self, ext_id):
+        start = time.perf_counter()
         self.ext_id = ext_id
         commons.log_info(f"Starting Up")
+        profiling.refresh_from_settings()
+        self._profiling_setting_subscriptions = [
+            omni.kit.app.SettingChangeSubscription(
+                f"{commons.SETTINGS_PATH}/{name}", lambda *_: profiling.refresh_from_settings()
+            )
+            for name in ["profiling_enabled", "profiling_buffer_size"]
+        ]
 
         menu = {"name": "RTX Remix", "populate_fn": build_rtx_remix_menu}
         self._context_menu_subscription = context_menu.add_menu(menu, "MENU", "")
         self.hotkey_registry = get_hotkey_registry()
 
+        omni.kit.commands.register_all_commands_in_module(commands)
         register_actions(self.ext_id)
         self.select_source_mesh_hotkey = self.hotkey_registry.register_hotkey(
             self.ext_id,
@@ -31,9 +45,22 @@ class RtxRemixTools(omni.ext.IExt):
             "select_source_mesh",
             filter=None,
         )
+        self.select_mesh_instances_hotkey = self.hotkey_registry.register_hotkey(
+            self.ext_id,
+            "SHIFT + I",
+            self.ext_id,
+            "select_mesh_instances",
+            filter=None,
+        )
 
-        register_brush(RemixScatterBrush.get_type(), __package__, RemixScatterBrush.__name__)
-        
+        # Only naming the module of the brush, so it's imported when first painting. The omni.paint.brush.scatter
+        # extension it builds on is still enabled with this one, as a dependency.
+        register_brush(commons.BRUSH_TYPE, f"{__package__}.brush", "RemixScatterBrush")
+
+        self._stage_event_subscription = omni.usd.get_context().get_stage_event_stream().create_subscription_to_pop(
+            self._on_stage_event, name="ekozerski.rtxremixtools stage events"
+        )
+        commons.log_info(f"Started up in {(time.perf_counter() - start) * 1000:.1f}ms")
 
     def on_shutdown(self):
         commons.log_info(f"Shutting Down")
@@ -42,25 +69,78 @@ class RtxRemixTools(omni.ext.IExt):
         self.hotkey_registry.deregister_hotkey(
             self.select_source_mesh_hotkey,
         )
+        self.hotkey_registry.deregister_hotkey(
+            self.select_mesh_instances_hotkey,
+        )
         deregister_actions(self.ext_id)
-        unregister_brush(RemixScatterBrush.get_type(), __package__, RemixScatterBrush.__name__)
+        omni.kit.commands.unregister_module_commands(commands)
+        unregister_brush(commons.BRUSH_TYPE, f"{__package__}.brush", "RemixScatterBrush")
+        release_stage_indices()
+        hashes = _get_loaded_module("core.hashes")
+        if hashes is not None:
+            hashes.release_layer_classifier()
+        self._stage_event_subscription = None
+        self._profiling_setting_subscriptions = None
+        capture_catalog = _get_loaded_module("capture_catalog")
+        if capture_catalog is not None:
+            capture_catalog.release_catalog_indexer()
 
+    def _on_stage_event(self, event):
+        if event.type in [
+            int(omni.usd.StageEventType.SELECTION_CHANGED),
+            int(omni.usd.StageEventType.OPENED),
+            int(omni.usd.StageEventType.CLOSED),
+        ]:
+            invalidate_menu_enablement()
+        if event.type in [int(omni.usd.StageEventType.OPENED), int(omni.usd.StageEventType.CLOSED)]:
+            hashes = _get_loaded_module("core.hashes")
+            if hashes is not None:
+                hashes.get_layer_classifier().clear()
+            release_stage_indices()
 
-def register_actions(extension_id):
-    from . import select_source_mesh
 
+def _get_loaded_module(module_name: str):
+    """
+    Returns this package's "module_name" only if something already imported it, so releasing its state never loads it.
+    """
+    return sys.modules.get(f"{__package__}.{module_name}")
+
+
+def release_stage_indices():
+    """
+    Drops the indices holding on to a stage and its change listeners, so closed stages can be freed.
+    """
+    hashes = _get_loaded_module("core.hashes")
+    if hashes is not None:
+        hashes.release_hash_index()
+    capture_merge = _get_loaded_module("core.capture_merge")
+    if capture_merge is not None:
+        capture_merge.release_fingerprint_index()
+        capture_merge.release_instance_index()
+
+
+def register_actions(extension_id):
     action_registry = get_action_registry()
     actions_tag = "RTX Remix Tools Actions"
 
     action_registry.register_action(
         extension_id,
         "select_source_mesh",
-        select_source_mesh.select_source_meshes,
+        commons.lazy_call("select_source_mesh", "select_source_meshes"),
         display_name="Select Source Mesh",
         description="Selects the corresponding mesh_HASH the prim is related to.",
         tag=actions_tag,
     )
 
+    action_registry.register_action(
+        extension_id,
+        "select_mesh_instances",
+        commons.lazy_call("select_source_mesh", "select_mesh_instances"),
+        display_name="Select Mesh Instances",
+        description="Selects every inst_HASH_N sharing the hash of the selected prims.",
+        tag=actions_tag,
+    )
+
 
 def deregister_actions(extension_id):
     action_registry = get_action_registry()
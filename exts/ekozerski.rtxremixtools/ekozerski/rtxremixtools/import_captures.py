@@ -1,91 +1,190 @@
-from collections import defaultdict
+import asyncio
+import os
+import time
 from typing import List
 
-from pxr import Usd, Sdf, UsdGeom
+import omni.kit.app
+import omni.ui as ui
 from omni.usd import get_context
 from omni.kit.window.file_importer import get_file_importer
 
+from ekozerski.rtxremixtools import capture_catalog, profiling
+from ekozerski.rtxremixtools.commons import log_error, log_info, log_warn, get_setting
+from ekozerski.rtxremixtools.core.hashes import get_hash_index
 
-def copy_instances(source_stage: Usd.Stage, dest_stage: Usd.Stage):
-    def parse_instance_hash(inst):
-        parts = inst.GetName().split('_')
-        return parts[1] if len(parts) >= 2 else inst.GetName()
-
-    def get_instance_transform(inst):
-        xform = UsdGeom.Xformable(inst)
-        time = Usd.TimeCode.Default()
-        return xform.ComputeLocalToWorldTransform(time)
-    
-    dest_instances_prim = dest_stage.GetPrimAtPath('/RootNode/instances')
-    dest_instances = dest_instances_prim.GetAllChildren() if dest_instances_prim else list()
-    source_instances_prim = source_stage.GetPrimAtPath('/RootNode/instances')
-    source_instances = source_instances_prim.GetAllChildren() if source_instances_prim else list()
-
-    # HASH + Transform data used as dict key to resolve duplicate instances
-    instances_map = {
-        (parse_instance_hash(inst), get_instance_transform(inst)): (inst, inst.GetStage().GetRootLayer())
-        for inst in source_instances + dest_instances
-    }
-    # Group by mesh hash
-    hash_groups = defaultdict(list)
-    for (hash_key, _), prim_data in instances_map.items():
-        hash_groups[hash_key].append(prim_data)
-    
-    temp_inst_merge_layer = Sdf.Layer.CreateAnonymous()
-    Sdf.PrimSpec(temp_inst_merge_layer, 'RootNode', Sdf.SpecifierDef)
-    Sdf.PrimSpec(temp_inst_merge_layer.GetPrimAtPath('RootNode'), 'instances', Sdf.SpecifierDef)
-
-    for hash, prims_data in hash_groups.items():
-        inst_count = 0
-        for prim, prim_layer in prims_data:
-            new_inst_prim_path = f'/RootNode/instances/inst_{hash}_{inst_count}'
-            Sdf.CopySpec(prim_layer, prim.GetPath(), temp_inst_merge_layer, Sdf.Path(new_inst_prim_path))
-            inst_count += 1
-    
-    dest_layer = dest_stage.GetRootLayer()
-    # temp_instances_merge_layer instances counts will always be >= dest_layer's, so we can just copy and replace on top.
-    Sdf.CopySpec(temp_inst_merge_layer, Sdf.Path('/RootNode/instances'), dest_layer, Sdf.Path('/RootNode/instances'))
-
-
-def import_capture_usd(capture_path):
-    def copy_child_prims_specs(parent_path: str):
-        # Performing one Sdf.CopySpec on parents like RootNode/meshes won't merge prims
-        # Instead, will remove destination mesh_HASH and add source's prims on top. So we copy one by one ;)
-        for prim in capture_stage.GetPrimAtPath(parent_path).GetAllChildren():
-            Sdf.CopySpec(capture_layer, prim.GetPath(), current_layer, prim.GetPath())
 
-    ctx = get_context()
-    current_stage = ctx.get_stage()
-    current_layer = current_stage.GetRootLayer()
-    capture_stage = Usd.Stage.Open(capture_path)
-    capture_layer = capture_stage.GetRootLayer()
-
-    capture_layer.subLayerPaths = []
-
-    # This is needed or else Sdf.CopySpec gets iffy on non-capture scenes.
-    current_stage.DefinePrim("/RootNode")
-    current_stage.DefinePrim("/RootNode/meshes")
-    current_stage.DefinePrim("/RootNode/lights")
-    current_stage.DefinePrim("/RootNode/Looks")
-    if capture_stage.GetPrimAtPath('/RootNode/cameras'):
-        current_stage.DefinePrim("/RootNode/cameras")
-    
-    with Sdf.ChangeBlock():
-        copy_child_prims_specs('/RootNode/meshes')
-        copy_child_prims_specs('/RootNode/lights')
-        copy_child_prims_specs('/RootNode/Looks')
-        if capture_stage.GetPrimAtPath('/RootNode/cameras'):
-            copy_child_prims_specs('/RootNode/cameras')
-        copy_instances(capture_stage, current_stage)
+_capture_matches_window = None
+
+
+def import_capture_usd(capture_path, mode=None, current_stage=None):
+    """
+    Imports a capture into the current stage's root layer (or "current_stage"'s), see "capture_merge.import_capture".
+    """
+    from ekozerski.rtxremixtools.core import capture_merge
+
+    return capture_merge.import_capture(capture_path, current_stage or get_context().get_stage(), mode)
+
+
+async def import_captures_async(capture_paths, mode=None):
+    """
+    Imports many captures, parsing the next ones in worker processes while the main thread copies the specs of the
+    current one ("layer" mode only). Captures are applied in the given order, so the result is the same as importing
+    them one by one.
+    """
+    from ekozerski.rtxremixtools.core import capture_merge, geometry
+    from ekozerski.rtxremixtools.progress import ProgressWindow
+
+    mode = mode or get_setting("import_captures_mode", "layer")
+    epsilon = get_setting("instance_merge_epsilon", capture_merge.DEFAULT_INSTANCE_MERGE_EPSILON)
+    skip_unchanged = get_setting("skip_unchanged_capture_specs", True)
+    # Leaving a core to the main thread, which copies the specs meanwhile. With a single core, parsing in a worker
+    # would only add the cost of opening each capture twice.
+    max_workers = get_setting("max_workers", 0) or (os.cpu_count() or 1) - 1
+    max_workers = min(max_workers, len(capture_paths)) if mode != "stage" else 0
+    current_stage = get_context().get_stage()
+    progress = ProgressWindow("Importing Captures", total=len(capture_paths))
+    executor = geometry.create_process_pool(max_workers) if max_workers > 0 else None
+    prefetcher = capture_merge.CapturePrefetcher(
+        capture_paths, epsilon, skip_unchanged, executor, lookahead=max_workers * 2
+    )
+    progress.on_cancel = prefetcher.cancel
+    start = time.perf_counter()
+    capture_reports = list()
+    with profiling.trace("import_captures.import_captures_async", captures=len(capture_paths), mode=mode) as span:
+        try:
+            for index, capture_path in enumerate(capture_paths):
+                if progress.cancelled:
+                    break
+
+                try:
+                    if mode == "stage":
+                        capture_report = capture_merge.import_capture_from_stage(
+                            capture_path, current_stage, epsilon, skip_unchanged
+                        )
+                    else:
+                        future = prefetcher.pop(index)
+                        parsed = await asyncio.wrap_future(future) if future is not None else None
+                        prepared = capture_merge.prepare_capture(capture_path, epsilon, skip_unchanged, parsed)
+                        capture_report = capture_merge.apply_prepared_capture(prepared, current_stage, epsilon)
+                except asyncio.CancelledError:
+                    # Only parses cancelled from the progress window end the import here, cancelling the task raises.
+                    if not progress.cancelled:
+                        raise
+                    break
+                except Exception as e:
+                    log_error(f"Failed importing capture '{capture_path}': {e}")
+                    progress.advance(os.path.basename(capture_path))
+                    continue
+
+                capture_reports.append(capture_report)
+                progress.advance(os.path.basename(capture_path))
+                # Letting the UI refresh between captures.
+                await omni.kit.app.get_app().next_update_async()
+        finally:
+            prefetcher.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            progress.close()
+            span.set(imported=len(capture_reports), cancelled=progress.cancelled)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    total_report = capture_merge.sum_capture_reports(capture_reports)
+    copied_prims = sum(counts.new + counts.updated for counts in total_report.specs.values())
+    copied_prims += total_report.instances.added
+    log_info(
+        f"Imported {len(capture_reports)} of {len(capture_paths)} captures in {elapsed:.2f}s "
+        f"({len(capture_reports) / elapsed:.2f} captures/s, {copied_prims / elapsed:.0f} prims/s)"
+        f"{' (cancelled)' if progress.cancelled else ''}. {capture_merge.format_capture_report(total_report)}"
+    )
+    return total_report
+
 
 def import_captures():
     def import_selected_captures(filename: str, dirname: str, selections: List[str] = []):
-        for capture_usd in selections:
-            import_capture_usd(capture_usd)
-    
+        if selections:
+            asyncio.ensure_future(import_captures_async(selections))
+
     file_importer = get_file_importer()
     file_importer.show_window(
         title=f'Import Models',
         import_button_label="Import",
         import_handler=import_selected_captures
     )
+
+
+async def find_captures_containing_selection_async():
+    """
+    Queries the catalog for the other captures containing the mesh hashes of the selected prims.
+    """
+    ctx = get_context()
+    current_stage = ctx.get_stage()
+    hash_index = get_hash_index(current_stage)
+    mesh_hashes = {hash_index.get_owning_hash(path) for path in ctx.get_selection().get_selected_prim_paths()}
+    mesh_hashes.discard(None)
+    if not mesh_hashes:
+        log_warn("No mesh_HASH or inst_HASH_N prims selected.")
+        return None
+
+    indexing = capture_catalog.index_captures_in_background(current_stage)
+    if indexing is None:
+        log_warn("Couldn't find the rtx-remix/captures folder of the current stage.")
+        return None
+
+    # The first query indexes the whole captures folder, later ones only wait for the captures changed since.
+    await asyncio.wrap_future(indexing)
+    start = time.perf_counter()
+    matches = capture_catalog.get_catalog_indexer().catalog.find_captures_with_meshes(
+        mesh_hashes, captures_dir=capture_catalog.find_captures_dir(current_stage)
+    )
+    current_layers = {
+        capture_catalog.normalize_path(layer.realPath)
+        for layer in current_stage.GetLayerStack(includeSessionLayers=False) if layer.realPath
+    }
+    matches = [match for match in matches if match.path not in current_layers]
+    log_info(
+        f"Found {len(matches)} captures containing {len(mesh_hashes)} selected meshes in "
+        f"{(time.perf_counter() - start) * 1000:.1f}ms."
+    )
+    return matches
+
+
+def _show_capture_matches(matches):
+    global _capture_matches_window
+    if _capture_matches_window is not None:
+        _capture_matches_window.destroy()
+
+    def import_matches():
+        _capture_matches_window.visible = False
+        asyncio.ensure_future(import_captures_async([match.path for match in matches]))
+
+    _capture_matches_window = ui.Window("Captures Containing Selection", width=500, height=300)
+    with _capture_matches_window.frame:
+        with ui.VStack(spacing=5):
+            with ui.ScrollingFrame():
+                with ui.VStack(height=0):
+                    if not matches:
+                        ui.Label("No other capture contains the selected meshes.")
+                    for match in matches:
+                        ui.Label(
+                            f"{os.path.basename(match.path)}: {match.matched} meshes, {match.instance_count} instances",
+                            tooltip=match.path,
+                        )
+            ui.Button("Import All", clicked_fn=import_matches, height=24, enabled=bool(matches))
+
+
+def find_captures_containing_selection():
+    async def find_and_show():
+        matches = await find_captures_containing_selection_async()
+        if matches is not None:
+            _show_capture_matches(matches)
+
+    asyncio.ensure_future(find_and_show())
+
+
+def import_captures_containing_selection():
+    async def find_and_import():
+        matches = await find_captures_containing_selection_async()
+        if matches:
+            await import_captures_async([match.path for match in matches])
+
+    asyncio.ensure_future(find_and_import())
@@ -0,0 +1,100 @@
+"""
+Persistent cache of the files already processed by "Fix Meshes Geometry", so they can be skipped on later runs.
+Shared between Kit and the command line, and safe to delete at any time.
+"""
+import hashlib
+import json
+import os
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".rtxremixtools", "mesh_fix_cache.json")
+# Bump whenever the fixing logic changes, so previously fixed files are processed again.
+CACHE_VERSION = 1
+
+
+def _cache_key(file_path):
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def create_entry(file_path, options):
+    """
+    Describes the current state of an already fixed file.
+    """
+    stat = os.stat(file_path)
+    return {
+        'version': CACHE_VERSION,
+        'state': 'fixed',
+        'options': options,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': hash_file(file_path),
+    }
+
+
+def validate_entry(entry, file_path, options):
+    """
+    Returns the (possibly refreshed) entry if "file_path" is still in the state it was left by a previous fix with the
+    same options, otherwise None. The file is only hashed when its size matches but its mtime doesn't, so files
+    touched without content changes (e.g. version control checkouts) are still recognized.
+    """
+    if not entry or entry.get('version') != CACHE_VERSION or entry.get('options') != options:
+        return None
+
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+
+    if stat.st_size != entry['size']:
+        return None
+    if stat.st_mtime_ns == entry['mtime_ns']:
+        return entry
+    if hash_file(file_path) != entry['sha256']:
+        return None
+    return dict(entry, mtime_ns=stat.st_mtime_ns)
+
+
+class MeshFixCache:
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH):
+        self.cache_path = cache_path
+        self._entries = self._load()
+        self._updated = dict()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    def get(self, file_path):
+        key = _cache_key(file_path)
+        return self._updated.get(key) or self._entries.get(key)
+
+    def set(self, file_path, entry):
+        self._updated[_cache_key(file_path)] = entry
+
+    def save(self):
+        """
+        Merges the updated entries on top of the latest cache file contents, in case another process (Kit or the
+        command line) saved it in the meantime.
+        """
+        if not self._updated:
+            return
+
+        self._entries = self._load()
+        self._entries.update(self._updated)
+        self._updated = dict()
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(temp_path, self.cache_path)
@@ -1,9 +1,12 @@
-from collections import OrderedDict
+import asyncio
 import os
-from pxr import UsdGeom, Usd, Sdf
+
 import omni.usd as usd
+from pxr import UsdGeom
 
-from ekozerski.rtxremixtools.commons import log_error
+from ekozerski.rtxremixtools.commons import log_error, log_info, get_setting
+from ekozerski.rtxremixtools import mesh_fix_cache, profiling
+from ekozerski.rtxremixtools.core.hashes import is_a_captured_mesh
 
 
 def get_selected_mesh_prims():
@@ -23,110 +26,75 @@ def get_selected_mesh_prims():
     return meshes
 
 
-def convert_mesh_to_vertex_interpolation_mode(mesh):
-    """
-    This method attemps to convert Remix meshes' interpolation mode from constant or faceVarying to vertex.
-    If there is any faceVarying attribute, it means the data arrays (points, uvs, normals...) will have different
-    lengths, so this script will copy data around using the faceVertexIndices array to ensure they all end up with the
-    same length.
-    """
-    # TODO: Study interpolation modes in depth to implement a decent conversion script.
-    prim = mesh.GetPrim()
-    primvar_api = UsdGeom.PrimvarsAPI(prim)
-    primvars = {var for var in primvar_api.GetPrimvars()}
-    face_varying_primvars = [v for v in primvars if v.GetInterpolation() == UsdGeom.Tokens.faceVarying]
-    if face_varying_primvars or mesh.GetNormalsInterpolation() == UsdGeom.Tokens.faceVarying:
-        non_face_varying_primvars = list(primvars.difference(face_varying_primvars))
-        non_face_varying_primvars = [var for var in non_face_varying_primvars if var.GetInterpolation() != 'uniform']
-        indices = prim.GetAttribute("faceVertexIndices")
-
-        # Settings points separately since it doesn't have a "SetInterpolation" like primvars.
-        points = prim.GetAttribute("points")
-        points_arr = points.Get()
-        new_arr = [points_arr[i] for i in indices.Get()]
-        points.Set(new_arr)
-
-        for var in non_face_varying_primvars:
-            original_arr = var.Get()
-            if original_arr:
-                new_arr = [original_arr[i] for i in indices.Get()]
-                var.Set(new_arr)
-        
-        indices.Set([i for i in range(len(indices.Get()))])
-    
-    [var.SetInterpolation(UsdGeom.Tokens.vertex) for var in primvars]
-    mesh.SetNormalsInterpolation(UsdGeom.Tokens.vertex)
-
-
-def convert_uv_primvars_to_st(mesh):
-    # https://github.com/NVIDIAGameWorks/dxvk-remix/blob/ebb0ecfd638d6a32ab5f10708b5b07bc763cf79b/src/dxvk/rtx_render/rtx_mod_usd.cpp#L696
-    # https://github.com/Kim2091/RTXRemixTools/blob/8ae25224ef8d1d284f3e208f671b2ce6a35b82af/RemixMeshConvert/For%20USD%20Composer/RemixMeshConvert_OV.py#L4
-    known_uv_names = [
-        'primvars:st',
-        'primvars:uv',
-        'primvars:st0',
-        'primvars:st1',
-        'primvars:st2',
-        'primvars:UVMap',
-        'primvars:UVChannel_1',
-        'primvars:map1',
-    ]
-    # Preserving the order of found primvars to use the first one, in case a primvars:st can't be found.
-    primvar_api = UsdGeom.PrimvarsAPI(mesh)
-    uv_primvars = OrderedDict(
-        (primvar.GetName(), primvar)
-        for primvar in primvar_api.GetPrimvars()
-        if primvar.GetTypeName().role == 'TextureCoordinate'
-        or primvar.GetName() in known_uv_names
+@profiling.traced()
+async def _fix_layers_async(layers, max_workers, weld, weld_tolerance, force):
+    from ekozerski.rtxremixtools.core import geometry
+    from ekozerski.rtxremixtools.progress import ProgressWindow
+
+    cache = mesh_fix_cache.MeshFixCache()
+    progress = ProgressWindow("Fixing Meshes Geometry", total=len(layers))
+    executor = geometry.create_process_pool(min(max_workers or os.cpu_count() or 1, len(layers)))
+    profile = profiling.is_enabled()
+    try:
+        futures = [
+            executor.submit(
+                geometry.fix_meshes_in_file_safe, path, weld, weld_tolerance, cache.get(path), force, profile
+            )
+            for path in layers.keys()
+        ]
+        # Files already being processed can't be interrupted, so only the pending ones get cancelled.
+        progress.on_cancel = lambda: [future.cancel() for future in futures]
+        fixed_paths = list()
+        skipped_count = 0
+        for future in asyncio.as_completed([asyncio.wrap_future(future) for future in futures]):
+            try:
+                result = await future
+            except asyncio.CancelledError:
+                # Only files cancelled from the progress window are skipped, cancelling this task stops everything.
+                if not progress.cancelled:
+                    raise
+                progress.advance()
+                continue
+
+            if result.trace_events:
+                profiling.add_events(result.trace_events)
+            if result.error:
+                log_error(f"Failed fixing meshes in '{result.path}': {result.error}")
+            else:
+                cache.set(result.path, result.cache_entry)
+                if result.skipped:
+                    skipped_count += 1
+                else:
+                    fixed_paths.append(result.path)
+            progress.advance(os.path.basename(result.path))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        progress.close()
+        cache.save()
+
+    # Reloading on the main thread, once per file.
+    with profiling.trace("mesh_utils.reload_layers", files=len(fixed_paths)):
+        [layers[path].Reload() for path in fixed_paths]
+    log_info(
+        f"Fixed meshes in {len(fixed_paths)} of {len(layers)} files, {skipped_count} already fixed"
+        f"{' (cancelled)' if progress.cancelled else ''}."
     )
-    if not uv_primvars:
-        return
-    
-    # Picking only one UV and blowing up everything else as the runtime only reads the first anyway.
-    considered_uv = uv_primvars.get('primvars:st') or next(iter(uv_primvars.values()))
-    uv_data = considered_uv.Get()
-    [primvar_api.RemovePrimvar(uv_name) for uv_name in uv_primvars.keys()]
-
-    # Recreating the primvar with appropriate name, type and role
-    new_uv_primvar = primvar_api.CreatePrimvar('primvars:st', Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.vertex)
-    new_uv_primvar.Set(uv_data)
-
-
-def remove_unused_primvars(mesh):
-    unused_primvar_names = [
-        'primvars:displayColor',
-        'primvars:displayOpacity',
-    ]
-    primvar_api = UsdGeom.PrimvarsAPI(mesh)
-    [primvar_api.RemovePrimvar(uv_name) for uv_name in unused_primvar_names]
-
-
-def fix_meshes_in_file(usd_file_path):
-    stage = Usd.Stage.Open(usd_file_path)
-    mesh_prims = [prim for prim in stage.TraverseAll() if UsdGeom.Mesh(prim)]
-    for prim in mesh_prims:
-        faceVertices = prim.GetAttribute("faceVertexCounts").Get()
-        if not faceVertices or not all({x == 3 for x in faceVertices}):
-            log_error(f"Mesh {prim.GetPath()} in '{usd_file_path}' hasn't been triangulated and this tools doesn't do that for you yet :(")
-            continue
-        convert_mesh_to_vertex_interpolation_mode(UsdGeom.Mesh(prim))
-        convert_uv_primvars_to_st(UsdGeom.Mesh(prim))
-        remove_unused_primvars(UsdGeom.Mesh(prim))
-
-    stage.Save()
-
-
-def is_a_captured_mesh(mesh):
-    """
-    Returns True if the Mesh's defining USD file is located in the captures folder.
-    """
-    return os.path.normpath("captures/meshes") in os.path.normpath(mesh.GetPrimStack()[-1].layer.realPath)
-
 
 
 def fix_meshes_geometry():
+    from ekozerski.rtxremixtools.core import geometry
+
     meshes = {k: v for k,v in get_selected_mesh_prims().items() if not is_a_captured_mesh(v)}
+    weld = get_setting("weld_vertices", False)
+    weld_tolerance = get_setting("weld_tolerance", geometry.DEFAULT_WELD_TOLERANCE)
+    max_workers = get_setting("max_workers", 0)
+    force = not get_setting("skip_fixed_meshes", True)
+
+    # Many selected meshes may come from the same file, so each layer is only fixed once.
+    layers = dict()
     for path, mesh in meshes.items():
         source_layer = mesh.GetPrimStack()[-1].layer
-        fix_meshes_in_file(source_layer.realPath)
-        source_layer.Reload()
+        layers.setdefault(source_layer.realPath, source_layer)
+
+    if layers:
+        asyncio.ensure_future(_fix_layers_async(layers, max_workers, weld, weld_tolerance, force))
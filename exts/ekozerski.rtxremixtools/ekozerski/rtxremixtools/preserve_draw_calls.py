@@ -1,25 +1,35 @@
 from omni import usd, kit
-from pxr import Sdf
 
-from ekozerski.rtxremixtools.utils import find_source_mesh_hash_prim
+from ekozerski.rtxremixtools import profiling
+from ekozerski.rtxremixtools.commons import log_info
+from ekozerski.rtxremixtools.commands import get_preserve_original_draw_call_changes
+from ekozerski.rtxremixtools.core.hashes import find_source_mesh_hash_prims
 
 
-def set_preserve_original_draw_call(enabled: bool = False):
+@profiling.traced()
+def set_preserve_original_draw_call(enabled: bool = False, dry_run: bool = False):
+    """
+    Sets "preserveOriginalDrawCall" on the mesh_HASH prims of the selection, as a single undoable command. With
+    "dry_run", only logs and returns the prims that would change.
+    """
     ctx = usd.get_context()
     current_stage = ctx.get_stage()
     selection = ctx.get_selection().get_selected_prim_paths()
-    selected_prims = {
-        path: current_stage.GetPrimAtPath(path)
-        for path in selection
-    }
-
-    source_meshes = [find_source_mesh_hash_prim(current_stage, prim) for prim in selected_prims.values()]
-    source_meshes = set([mesh for mesh in source_meshes if mesh is not None])
-    for mesh_prim in source_meshes:
-        kit.commands.execute(
-            'CreateUsdAttributeCommand',
-            prim=mesh_prim,
-            attr_name='preserveOriginalDrawCall',
-            attr_type=Sdf.ValueTypeNames.Int,
-            attr_value=1 if enabled else 0
+    mesh_paths = [mesh_prim.GetPath() for mesh_prim in find_source_mesh_hash_prims(current_stage, selection)]
+    if dry_run:
+        changed_paths = get_preserve_original_draw_call_changes(current_stage, mesh_paths, enabled)
+        log_info(
+            f"Setting preserveOriginalDrawCall to {int(enabled)} would change {len(changed_paths)} of "
+            f"{len(mesh_paths)} prims: {', '.join(path.pathString for path in changed_paths)}"
         )
+        return changed_paths
+
+    _, changed_paths = kit.commands.execute(
+        'SetPreserveOriginalDrawCallCommand',
+        prim_paths=mesh_paths,
+        enabled=enabled,
+    )
+    log_info(
+        f"Set preserveOriginalDrawCall to {int(enabled)} on {len(changed_paths or [])} of {len(mesh_paths)} prims."
+    )
+    return changed_paths
@@ -0,0 +1,186 @@
+"""
+Lightweight tracing of the RTX Remix actions: each traced phase records its wall time and a few counters (prims, array
+sizes...) into a ring buffer, which can be summarized in the log or exported as a Chrome trace (chrome://tracing or
+https://ui.perfetto.dev). Disabled by default, in which case a trace is a single flag check.
+"""
+from collections import deque, namedtuple
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+from ekozerski.rtxremixtools.commons import log_info, get_setting
+
+
+DEFAULT_BUFFER_SIZE = 10000
+DEFAULT_TRACES_DIR = os.path.join(os.path.expanduser("~"), ".rtxremixtools", "traces")
+
+TraceEvent = namedtuple('TraceEvent', ['name', 'start_ns', 'duration_ns', 'process_id', 'thread_id', 'args'])
+
+_enabled = False
+_events = deque(maxlen=DEFAULT_BUFFER_SIZE)
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled: bool, buffer_size: int = None):
+    global _enabled, _events
+    if buffer_size is not None and buffer_size != _events.maxlen:
+        _events = deque(_events, maxlen=max(1, int(buffer_size)))
+    _enabled = bool(enabled)
+
+
+def refresh_from_settings():
+    set_enabled(get_setting("profiling_enabled", False), get_setting("profiling_buffer_size", DEFAULT_BUFFER_SIZE))
+
+
+def get_events():
+    return list(_events)
+
+
+def clear():
+    _events.clear()
+
+
+def add_events(events):
+    """
+    Appends events traced somewhere else, like worker processes, which have their own ring buffer.
+    """
+    _events.extend(events)
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start_ns')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration_ns = time.perf_counter_ns() - self.start_ns
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        _events.append(
+            TraceEvent(self.name, self.start_ns, duration_ns, os.getpid(), threading.get_ident(), self.args)
+        )
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __bool__(self):
+        return True
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+    def __bool__(self):
+        # So callers can skip computing expensive counters with "if span:".
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def trace(name, **args):
+    """
+    Context manager timing a phase, the yielded span taking more counters with "span.set(points=...)".
+    """
+    return _Span(name, args) if _enabled else _NULL_SPAN
+
+
+def traced(name=None):
+    """
+    Decorator tracing every call of a function (or coroutine function), named after it unless "name" is given.
+    """
+    def decorator(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                with _Span(span_name, {}):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summarize(events=None):
+    """
+    Returns {name: (calls, total seconds, max seconds)}, the slowest phases first.
+    """
+    totals = dict()
+    for event in _events if events is None else events:
+        calls, total_ns, max_ns = totals.get(event.name, (0, 0, 0))
+        totals[event.name] = (calls + 1, total_ns + event.duration_ns, max(max_ns, event.duration_ns))
+    return {
+        name: (calls, total_ns / 1e9, max_ns / 1e9)
+        for name, (calls, total_ns, max_ns) in sorted(totals.items(), key=lambda item: -item[1][1])
+    }
+
+
+def log_summary():
+    summary = summarize()
+    if not summary:
+        log_info("No traced events (is /exts/ekozerski.rtxremixtools/profiling_enabled set?).")
+        return
+    lines = [
+        f"  {name}: {calls} calls, {total:.3f}s total, {max_duration:.3f}s max"
+        for name, (calls, total, max_duration) in summary.items()
+    ]
+    log_info("Traced phases:\n" + "\n".join(lines))
+
+
+def export_chrome_trace(output_path=None, events=None):
+    """
+    Writes the events in the Chrome trace event format ("complete" events, in microseconds). Returns the file path.
+    """
+    if output_path is None:
+        output_path = os.path.join(DEFAULT_TRACES_DIR, time.strftime("trace_%Y%m%d_%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    trace_events = [
+        {
+            "name": event.name,
+            "cat": "rtxremixtools",
+            "ph": "X",
+            "ts": event.start_ns / 1000,
+            "dur": event.duration_ns / 1000,
+            "pid": event.process_id,
+            "tid": event.thread_id,
+            "args": {key: value if isinstance(value, (int, float, bool)) else str(value)
+                     for key, value in event.args.items()},
+        }
+        for event in (_events if events is None else events)
+    ]
+    with open(output_path, 'w') as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+    log_info(f"Exported {len(trace_events)} traced events to '{output_path}'.")
+    return output_path
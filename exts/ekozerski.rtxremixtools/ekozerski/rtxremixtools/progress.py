@@ -0,0 +1,40 @@
+import omni.ui as ui
+
+
+class ProgressWindow:
+    """
+    Small window reporting the progress of long running operations, with a button to cancel them.
+    """
+    def __init__(self, title: str, total: int, on_cancel=None):
+        self.total = total
+        self.done = 0
+        self.cancelled = False
+        self.on_cancel = on_cancel
+        self._progress_model = ui.SimpleFloatModel(0.0)
+        self._window = ui.Window(title, width=450, height=0, flags=ui.WINDOW_FLAGS_NO_COLLAPSE)
+        with self._window.frame:
+            with ui.VStack(spacing=5, height=0):
+                self._label = ui.Label(f"[0/{total}]", elided_text=True)
+                ui.ProgressBar(self._progress_model, height=20)
+                ui.Button("Cancel", clicked_fn=self.cancel, height=24)
+
+    def advance(self, message: str = ""):
+        self.done += 1
+        self._progress_model.set_value(self.done / max(self.total, 1))
+        if not self.cancelled:
+            self._label.text = f"[{self.done}/{self.total}] {message}"
+
+    def cancel(self):
+        if self.cancelled:
+            return
+
+        self.cancelled = True
+        self._label.text = "Cancelling..."
+        if self.on_cancel is not None:
+            self.on_cancel()
+
+    def close(self):
+        if self._window is not None:
+            self._window.visible = False
+            self._window.destroy()
+            self._window = None
@@ -1,13 +1,52 @@
+from collections import namedtuple
+
 from omni.kit.ui import get_custom_glyph_code
 from omni import usd
 import omni.ui as ui
+from pxr import UsdGeom
+
+from . import commons
+from . import profiling
+
+
+MenuEnablement = namedtuple('MenuEnablement', ['has_selection', 'has_mod_meshes', 'has_captured_meshes'])
+_menu_enablement = None
+
+
+def invalidate_menu_enablement():
+    global _menu_enablement
+    _menu_enablement = None
+
+
+def get_menu_enablement() -> MenuEnablement:
+    """
+    Classifies the selection once per selection change rather than every time the menu opens, which lags with
+    thousands of selected prims.
+    """
+    global _menu_enablement
+    if _menu_enablement is not None:
+        return _menu_enablement
+
+    # Imported on the first menu opening rather than at startup.
+    from .core import hashes
 
-from . import mesh_utils
-from . import add_model
-from . import add_material
-from . import preserve_draw_calls
-from . import select_source_mesh
-from . import import_captures
+    ctx = usd.get_context()
+    current_stage = ctx.get_stage()
+    selection = ctx.get_selection().get_selected_prim_paths()
+    has_mod_meshes = has_captured_meshes = False
+    for path in selection:
+        prim = current_stage.GetPrimAtPath(path)
+        if not UsdGeom.Mesh(prim):
+            continue
+        if hashes.is_a_captured_mesh(prim):
+            has_captured_meshes = True
+        else:
+            has_mod_meshes = True
+        if has_mod_meshes and has_captured_meshes:
+            break
+
+    _menu_enablement = MenuEnablement(bool(selection), has_mod_meshes, has_captured_meshes)
+    return _menu_enablement
 
 
 def _build_fix_mesh_geometry_menu_item():
@@ -22,11 +61,8 @@ def _build_fix_mesh_geometry_menu_item():
     ])
     ui.MenuItem(
         "Fix Meshes Geometry",
-        triggered_fn=mesh_utils.fix_meshes_geometry,
-        enabled=any([
-            not mesh_utils.is_a_captured_mesh(mesh)
-            for mesh in mesh_utils.get_selected_mesh_prims().values()
-        ]),
+        triggered_fn=commons.lazy_call("mesh_utils", "fix_meshes_geometry"),
+        enabled=get_menu_enablement().has_mod_meshes,
         tooltip=tooltip
     )
 
@@ -38,11 +74,8 @@ def _build_setup_for_mesh_replacements_menu_item():
     ])
     ui.MenuItem(
         "Setup for Mesh Replacement",
-        triggered_fn=add_model.open_mesh_replacement_setup_dialog,
-        enabled=any([
-            mesh_utils.is_a_captured_mesh(mesh)
-            for mesh in mesh_utils.get_selected_mesh_prims().values()
-        ]),
+        triggered_fn=commons.lazy_call("add_model", "open_mesh_replacement_setup_dialog"),
+        enabled=get_menu_enablement().has_captured_meshes,
         tooltip=tooltip
     )
 
@@ -53,9 +86,9 @@ def _build_add_model_menu_item():
     ])
     ui.MenuItem(
         "Add Model",
-        triggered_fn=add_model.open_add_model_dialog,
+        triggered_fn=commons.lazy_call("add_model", "open_add_model_dialog"),
         tooltip=tooltip,
-        enabled=bool(usd.get_context().get_selection().get_selected_prim_paths())
+        enabled=get_menu_enablement().has_selection
     )
 
 
@@ -65,9 +98,9 @@ def _build_add_material_menu_item():
     ])
     ui.MenuItem(
         "Add Material",
-        triggered_fn=add_material.open_add_material_dialog,
+        triggered_fn=commons.lazy_call("add_material", "open_add_material_dialog"),
         tooltip=tooltip,
-        enabled=bool(usd.get_context().get_selection().get_selected_prim_paths())
+        enabled=get_menu_enablement().has_selection
     )
 
 
@@ -79,9 +112,9 @@ def _build_preserve_original_draw_call_menu_item():
     ])
     ui.MenuItem(
         "Preserve",
-        triggered_fn=lambda: preserve_draw_calls.set_preserve_original_draw_call(True),
+        triggered_fn=commons.lazy_call("preserve_draw_calls", "set_preserve_original_draw_call", True),
         tooltip=tooltip,
-        enabled=bool(usd.get_context().get_selection().get_selected_prim_paths())
+        enabled=get_menu_enablement().has_selection
     )
 
 
@@ -93,9 +126,9 @@ def _build_dont_preserve_original_draw_call_menu_item():
     ])
     ui.MenuItem(
         "Don't Preserve",
-        triggered_fn=lambda: preserve_draw_calls.set_preserve_original_draw_call(False),
+        triggered_fn=commons.lazy_call("preserve_draw_calls", "set_preserve_original_draw_call", False),
         tooltip=tooltip,
-        enabled=bool(usd.get_context().get_selection().get_selected_prim_paths())
+        enabled=get_menu_enablement().has_selection
     )
 
 
@@ -105,9 +138,21 @@ def _build_select_source_meshes_menu():
     ])
     ui.MenuItem(
         "Select Source Mesh (Shift + F)",
-        triggered_fn=select_source_mesh.select_source_meshes,
+        triggered_fn=commons.lazy_call("select_source_mesh", "select_source_meshes"),
+        tooltip=tooltip,
+        enabled=get_menu_enablement().has_selection
+    )
+
+
+def _build_select_mesh_instances_menu():
+    tooltip = ''.join([
+        "Selects every inst_HASH_N prim sharing the same hash as the selected mesh_HASH or instance prims."
+    ])
+    ui.MenuItem(
+        "Select Mesh Instances (Shift + I)",
+        triggered_fn=commons.lazy_call("select_source_mesh", "select_mesh_instances"),
         tooltip=tooltip,
-        enabled=bool(usd.get_context().get_selection().get_selected_prim_paths())
+        enabled=get_menu_enablement().has_selection
     )
 
 
@@ -117,11 +162,53 @@ def _build_import_captures_menu():
     ])
     ui.MenuItem(
         "Import Captures",
-        triggered_fn=import_captures.import_captures,
+        triggered_fn=commons.lazy_call("import_captures", "import_captures"),
         tooltip=tooltip
     )
 
 
+def _build_find_captures_containing_selection_menu():
+    tooltip = ''.join([
+        "Lists the other captures containing the selected meshes, looked up in the captures catalog."
+    ])
+    ui.MenuItem(
+        "Find Captures Containing Selection",
+        triggered_fn=commons.lazy_call("import_captures", "find_captures_containing_selection"),
+        tooltip=tooltip,
+        enabled=get_menu_enablement().has_selection
+    )
+
+
+def _build_import_captures_containing_selection_menu():
+    tooltip = ''.join([
+        "Imports only the captures containing the selected meshes, looked up in the captures catalog."
+    ])
+    ui.MenuItem(
+        "Import Captures Containing Selection",
+        triggered_fn=commons.lazy_call("import_captures", "import_captures_containing_selection"),
+        tooltip=tooltip,
+        enabled=get_menu_enablement().has_selection
+    )
+
+
+def _build_profiling_menu():
+    with ui.Menu("Profiling"):
+        ui.MenuItem(
+            "Enable Profiling",
+            checkable=True,
+            checked=profiling.is_enabled(),
+            triggered_fn=lambda: commons.set_setting("profiling_enabled", not profiling.is_enabled()),
+            tooltip="Records how long each action and its phases take, with prim counts and array sizes."
+        )
+        ui.MenuItem("Log Profiling Summary", triggered_fn=profiling.log_summary)
+        ui.MenuItem(
+            "Export Chrome Trace",
+            triggered_fn=profiling.export_chrome_trace,
+            tooltip="Exports the traced events to ~/.rtxremixtools/traces, to open in chrome://tracing or Perfetto."
+        )
+        ui.MenuItem("Clear Traced Events", triggered_fn=profiling.clear)
+
+
 def build_rtx_remix_menu(event):
     icon = get_custom_glyph_code("${glyphs}/menu_create.svg")
     with ui.Menu(f' {icon}  RTX Remix'):
@@ -133,4 +220,8 @@ def build_rtx_remix_menu(event):
             _build_preserve_original_draw_call_menu_item()
             _build_dont_preserve_original_draw_call_menu_item()
         _build_select_source_meshes_menu()
+        _build_select_mesh_instances_menu()
         _build_import_captures_menu()
+        _build_find_captures_containing_selection_menu()
+        _build_import_captures_containing_selection_menu()
+        _build_profiling_menu()
@@ -1,20 +1,35 @@
 from omni import usd
 
-from ekozerski.rtxremixtools.utils import find_source_mesh_hash_prim
+from ekozerski.rtxremixtools import profiling
+from ekozerski.rtxremixtools.core.hashes import find_source_mesh_hash_prims, get_hash_index
 
 
 def select_source_meshes():
     ctx = usd.get_context()
     current_stage = ctx.get_stage()
     selection = ctx.get_selection().get_selected_prim_paths()
-    selected_prims = {
-        path: current_stage.GetPrimAtPath(path)
-        for path in selection
-    }
+    with profiling.trace("select_source_mesh.find_source_meshes", selected=len(selection)) as span:
+        source_meshes = find_source_mesh_hash_prims(current_stage, selection)
+        paths = [mesh.GetPath().pathString for mesh in source_meshes]
+        span.set(found=len(paths))
+    selection = usd.get_context().get_selection()
+    selection.clear_selected_prim_paths()
+    selection.set_selected_prim_paths(paths, False)
+
 
-    source_meshes = [find_source_mesh_hash_prim(current_stage, prim) for prim in selected_prims.values()]
-    source_meshes = set([mesh for mesh in source_meshes if mesh is not None])
-    paths = [mesh.GetPath().pathString for mesh in source_meshes]
+def select_mesh_instances():
+    ctx = usd.get_context()
+    current_stage = ctx.get_stage()
+    selection = ctx.get_selection().get_selected_prim_paths()
+    with profiling.trace("select_source_mesh.find_mesh_instances", selected=len(selection)) as span:
+        hash_index = get_hash_index(current_stage)
+        mesh_hashes = {hash_index.get_owning_hash(path) for path in selection}
+        paths = [
+            instance_path.pathString
+            for mesh_hash in mesh_hashes if mesh_hash is not None
+            for instance_path in hash_index.get_instance_paths(mesh_hash)
+        ]
+        span.set(found=len(paths))
     selection = usd.get_context().get_selection()
     selection.clear_selected_prim_paths()
     selection.set_selected_prim_paths(paths, False)
@@ -1 +1,8 @@
-from .test_hello_world import *
\ No newline at end of file
+from .test_hello_world import *
+from .test_add_material import *
+from .test_capture_catalog import *
+from .test_capture_merge import *
+from .test_commands import *
+from .test_geometry import *
+from .test_hashes import *
+from .test_profiling import *
@@ -0,0 +1,23 @@
+import omni.kit.test
+
+from ekozerski.rtxremixtools import add_material
+
+
+MDL_SOURCE = """
+mdl 1.6;
+import ::anno::*;
+
+// export material Commented(
+/* export material AlsoCommented(
+*/
+export material MyCustomPBR(
+    uniform float opacity = 1.0 [[ anno::display_name("Opacity") ]]
+) = AperturePBR_Opacity(opacity_constant: opacity);
+
+material NotExported() = material();
+"""
+
+
+class TestAddMaterial(omni.kit.test.AsyncTestCase):
+    async def test_parse_mdl_material_names(self):
+        self.assertEqual(add_material.parse_mdl_material_names(MDL_SOURCE), ['MyCustomPBR'])
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import omni.kit.test
+from pxr import Sdf, Usd, UsdGeom, UsdShade
+
+from ekozerski.rtxremixtools import capture_catalog
+
+
+def create_capture_file(path, mesh_hashes, instance_hashes, texture=None):
+    stage = Usd.Stage.CreateNew(path)
+    for mesh_hash in mesh_hashes:
+        UsdGeom.Mesh.Define(stage, f'/RootNode/meshes/mesh_{mesh_hash}')
+    for index, instance_hash in enumerate(instance_hashes):
+        UsdGeom.Xform.Define(stage, f'/RootNode/instances/inst_{instance_hash}_{index}')
+    if texture:
+        shader = UsdShade.Shader.Define(stage, '/RootNode/Looks/mat_CCC/Shader')
+        shader.CreateInput('diffuse_texture', Sdf.ValueTypeNames.Asset).Set(texture)
+    stage.Save()
+
+
+class TestCaptureCatalog(omni.kit.test.AsyncTestCase):
+    async def test_update_only_scans_changed_captures(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            first_capture = os.path.join(temp_dir, 'capture_1.usda')
+            second_capture = os.path.join(temp_dir, 'capture_2.usda')
+            create_capture_file(first_capture, ['AAA', 'BBB'], ['AAA', 'AAA', 'BBB'], texture='./textures/CCC.dds')
+            create_capture_file(second_capture, ['BBB'], ['BBB'])
+            catalog = capture_catalog.CaptureCatalog(os.path.join(temp_dir, 'catalog.db'))
+
+            update = catalog.update(temp_dir)
+            self.assertEqual(update, capture_catalog.CatalogUpdate(scanned=2, unchanged=0, removed=0, failed=0))
+            self.assertEqual(
+                catalog.find_captures_with_meshes(['AAA']),
+                [capture_catalog.CaptureMatch(capture_catalog.normalize_path(first_capture), 1, 2)],
+            )
+            self.assertEqual(len(catalog.find_captures_with_meshes(['AAA', 'BBB'])), 2)
+            self.assertEqual(len(catalog.find_captures_with_meshes(['AAA', 'BBB'], match_all=True)), 1)
+            self.assertEqual(len(catalog.find_captures_with_materials(['CCC'])), 1)
+            texture_path = os.path.join(temp_dir, 'textures', 'CCC.dds')
+            self.assertEqual(len(catalog.find_captures_with_textures([texture_path])), 1)
+
+            create_capture_file(second_capture, ['AAA'], ['AAA'])
+            os.remove(first_capture)
+            update = catalog.update(temp_dir)
+            self.assertEqual(update, capture_catalog.CatalogUpdate(scanned=1, unchanged=0, removed=1, failed=0))
+            self.assertEqual(
+                [match.path for match in catalog.find_captures_with_meshes(['AAA'])],
+                [capture_catalog.normalize_path(second_capture)],
+            )
@@ -0,0 +1,220 @@
+import pickle
+
+import omni.kit.test
+from pxr import Usd, UsdGeom, Gf, Sdf
+
+from ekozerski.rtxremixtools.core import capture_merge
+
+
+def create_capture_stage(instances):
+    """
+    "instances" being a list of (hash, translation) tuples.
+    """
+    stage = Usd.Stage.CreateInMemory()
+    stage.DefinePrim('/RootNode/instances')
+    counters = dict()
+    for inst_hash, translation in instances:
+        inst_count = counters.get(inst_hash, 0)
+        counters[inst_hash] = inst_count + 1
+        xform = UsdGeom.Xform.Define(stage, f'/RootNode/instances/inst_{inst_hash}_{inst_count}')
+        xform.AddTransformOp().Set(Gf.Matrix4d(1).SetTranslate(Gf.Vec3d(*translation)))
+        xform.AddScaleOp().Set(Gf.Vec3f(2, 2, 2))
+    return stage
+
+
+class TestCaptureMerge(omni.kit.test.AsyncTestCase):
+    async def test_spec_transform_matches_composed_transform(self):
+        stage = create_capture_stage([('AAA', (1, 2, 3))])
+        layer_instances = capture_merge.get_layer_instances(stage.GetRootLayer())
+        stage_instances = capture_merge.get_stage_instances(stage)
+        self.assertTrue(Gf.IsClose(layer_instances[0][1], stage_instances[0][1], 1e-9))
+
+    async def test_spec_transform_supports_every_op_type(self):
+        stage = create_capture_stage([])
+        xform = UsdGeom.Xform.Define(stage, '/RootNode/instances/inst_AAA_0')
+        xform.AddTranslateOp().Set(Gf.Vec3d(1, 2, 3))
+        xform.AddRotateXYZOp().Set(Gf.Vec3f(10, 20, 30))
+        xform.AddRotateZOp().Set(45.0)
+        xform.AddOrientOp().Set(Gf.Quatf(0.5, 0.5, 0.5, 0.5))
+        xform.AddScaleOp().Set(Gf.Vec3f(1, 2, 3))
+        xform.AddTranslateOp(opSuffix='pivot').Set(Gf.Vec3d(0, 1, 0))
+        xform.AddTranslateOp(opSuffix='pivot', isInverseOp=True)
+
+        layer_instances = capture_merge.get_layer_instances(stage.GetRootLayer())
+        stage_instances = capture_merge.get_stage_instances(stage)
+        self.assertTrue(Gf.IsClose(layer_instances[0][1], stage_instances[0][1], 1e-5))
+
+    async def test_merge_instances_ignores_float_noise(self):
+        dest_stage = create_capture_stage([('AAA', (0, 0, 0)), ('AAA', (10, 0, 0))])
+        source_stage = create_capture_stage([('AAA', (10, 1e-7, 0)), ('AAA', (20, 0, 0)), ('BBB', (0, 0, 0))])
+
+        report = capture_merge.merge_instances(
+            capture_merge.get_layer_instances(source_stage.GetRootLayer()), dest_stage, epsilon=1e-4,
+            incremental=False,
+        )
+
+        self.assertEqual(report, capture_merge.MergeReport(kept=2, added=2, merged=1))
+        instance_names = [prim.GetName() for prim in dest_stage.GetPrimAtPath('/RootNode/instances').GetAllChildren()]
+        self.assertEqual(instance_names, ['inst_AAA_0', 'inst_AAA_1', 'inst_AAA_2', 'inst_BBB_0'])
+
+    async def test_merge_instances_across_cell_borders(self):
+        # Translations 2e-7 apart around 0.5 * epsilon, where rounding to an epsilon grid would split them.
+        dest_stage = create_capture_stage([('AAA', (0.5e-4 - 1e-7, 0, 0)), ('AAA', (0, 0, 64e-4 - 1e-7))])
+        source_stage = create_capture_stage([('AAA', (0.5e-4 + 1e-7, 0, 0)), ('AAA', (0, 0, 64e-4 + 1e-7))])
+
+        for incremental in [False, True]:
+            report = capture_merge.merge_instances(
+                capture_merge.get_layer_instances(source_stage.GetRootLayer()), dest_stage, epsilon=1e-4,
+                incremental=incremental,
+            )
+            self.assertEqual(report, capture_merge.MergeReport(kept=2, added=0, merged=2))
+        capture_merge.release_instance_index()
+
+    async def test_incremental_merge_only_appends_new_instances(self):
+        dest_stage = create_capture_stage([('AAA', (0, 0, 0)), ('AAA', (10, 0, 0))])
+        source_stage = create_capture_stage([('AAA', (10, 0, 0)), ('AAA', (20, 0, 0)), ('BBB', (0, 0, 0))])
+        source_instances = capture_merge.get_layer_instances(source_stage.GetRootLayer())
+
+        report = capture_merge.merge_instances(source_instances, dest_stage, epsilon=1e-4, incremental=True)
+        self.assertEqual(report, capture_merge.MergeReport(kept=2, added=2, merged=1))
+
+        dest_stage.RemovePrim('/RootNode/instances/inst_AAA_0')
+        report = capture_merge.merge_instances(source_instances, dest_stage, epsilon=1e-4, incremental=True)
+        self.assertEqual(report, capture_merge.MergeReport(kept=3, added=0, merged=3))
+        instance_names = [prim.GetName() for prim in dest_stage.GetPrimAtPath('/RootNode/instances').GetAllChildren()]
+        self.assertEqual(instance_names, ['inst_AAA_1', 'inst_AAA_2', 'inst_BBB_0'])
+
+    async def test_incremental_merge_sees_changed_instances(self):
+        dest_stage = create_capture_stage([('AAA', (0, 0, 0))])
+        report = capture_merge.copy_instances(create_capture_stage([('AAA', (5, 0, 0))]), dest_stage)
+        self.assertEqual(report, capture_merge.MergeReport(kept=1, added=1, merged=0))
+
+        # Moving an instance already known to the index, then importing one where it used to be.
+        dest_stage.GetAttributeAtPath('/RootNode/instances/inst_AAA_0.xformOp:transform').Set(
+            Gf.Matrix4d(1).SetTranslate(Gf.Vec3d(7, 0, 0))
+        )
+        report = capture_merge.copy_instances(create_capture_stage([('AAA', (0, 0, 0))]), dest_stage)
+        self.assertEqual(report, capture_merge.MergeReport(kept=2, added=1, merged=0))
+        capture_merge.release_instance_index()
+
+    async def test_apply_capture_does_not_rekey_its_own_instances(self):
+        capture_stage = create_capture_stage([('AAA', (0, 0, 0)), ('BBB', (5, 0, 0))])
+        dest_stage = Usd.Stage.CreateInMemory()
+        prepared = capture_merge.prepare_capture(capture_stage.GetRootLayer().identifier)
+        capture_merge.apply_prepared_capture(prepared, dest_stage, 1e-4)
+
+        instance_index = capture_merge.get_instance_index(dest_stage, 1e-4)
+        keys_by_name = dict(instance_index.keys_by_name)
+        instance_index.sync()
+        self.assertEqual(sorted(keys_by_name), ['inst_AAA_0', 'inst_BBB_0'])
+        for name, key in keys_by_name.items():
+            self.assertIs(instance_index.keys_by_name[name], key)
+        capture_merge.release_instance_index()
+        capture_merge.release_fingerprint_index()
+
+    async def test_apply_capture_skips_unchanged_specs(self):
+        capture_stage = create_capture_stage([('AAA', (0, 0, 0))])
+        UsdGeom.Mesh.Define(capture_stage, '/RootNode/meshes/mesh_AAA').CreatePointsAttr([(0, 0, 0), (1, 0, 0)])
+        UsdGeom.Mesh.Define(capture_stage, '/RootNode/meshes/mesh_BBB').CreatePointsAttr([(0, 1, 0)])
+        capture_layer = capture_stage.GetRootLayer()
+        dest_stage = Usd.Stage.CreateInMemory()
+
+        prepared = capture_merge.prepare_capture(capture_layer.identifier)
+        report = capture_merge.apply_prepared_capture(prepared, dest_stage, 1e-4)
+        self.assertEqual(report.specs['meshes'], capture_merge.SpecReport(new=2, updated=0, reused=0))
+
+        capture_stage.GetAttributeAtPath('/RootNode/meshes/mesh_BBB.points').Set([(0, 2, 0)])
+        prepared = capture_merge.prepare_capture(capture_layer.identifier)
+        report = capture_merge.apply_prepared_capture(prepared, dest_stage, 1e-4)
+        self.assertEqual(report.specs['meshes'], capture_merge.SpecReport(new=0, updated=1, reused=1))
+        self.assertEqual(
+            list(dest_stage.GetRootLayer().GetAttributeAtPath('/RootNode/meshes/mesh_BBB.points').default),
+            [(0, 2, 0)],
+        )
+        self.assertEqual(
+            capture_merge.compute_spec_fingerprint(capture_layer, Sdf.Path('/RootNode/meshes/mesh_AAA')),
+            capture_merge.compute_spec_fingerprint(dest_stage.GetRootLayer(), Sdf.Path('/RootNode/meshes/mesh_AAA')),
+        )
+        capture_merge.release_fingerprint_index()
+
+    async def test_stage_mode_skips_unchanged_specs(self):
+        capture_stage = create_capture_stage([('AAA', (0, 0, 0))])
+        UsdGeom.Mesh.Define(capture_stage, '/RootNode/meshes/mesh_AAA').CreatePointsAttr([(0, 0, 0), (1, 0, 0)])
+        UsdGeom.Mesh.Define(capture_stage, '/RootNode/meshes/mesh_BBB').CreatePointsAttr([(0, 1, 0)])
+        capture_path = capture_stage.GetRootLayer().identifier
+        dest_stage = Usd.Stage.CreateInMemory()
+
+        report = capture_merge.import_capture_from_stage(capture_path, dest_stage, 1e-4)
+        self.assertEqual(report.specs['meshes'], capture_merge.SpecReport(new=2, updated=0, reused=0))
+        self.assertEqual(report.instances, capture_merge.MergeReport(kept=0, added=1, merged=0))
+
+        capture_stage.GetAttributeAtPath('/RootNode/meshes/mesh_BBB.points').Set([(0, 2, 0)])
+        report = capture_merge.import_capture_from_stage(capture_path, dest_stage, 1e-4)
+        self.assertEqual(report.specs['meshes'], capture_merge.SpecReport(new=0, updated=1, reused=1))
+        self.assertEqual(report.instances, capture_merge.MergeReport(kept=1, added=0, merged=1))
+        self.assertEqual(
+            list(dest_stage.GetRootLayer().GetAttributeAtPath('/RootNode/meshes/mesh_BBB.points').default),
+            [(0, 2, 0)],
+        )
+        capture_merge.release_instance_index()
+        capture_merge.release_fingerprint_index()
+
+    async def test_prepare_capture_from_worker_parsed_capture(self):
+        capture_stage = create_capture_stage([('AAA', (0, 0, 0)), ('AAA', (5, 0, 0))])
+        UsdGeom.Mesh.Define(capture_stage, '/RootNode/meshes/mesh_AAA/mesh').CreatePointsAttr([(0, 0, 0)])
+        capture_path = capture_stage.GetRootLayer().identifier
+        # Parsed captures are sent back from worker processes.
+        parsed = pickle.loads(pickle.dumps(capture_merge.parse_capture(capture_path)))
+        prepared = capture_merge.prepare_capture(capture_path, parsed=parsed)
+
+        parsed_here = capture_merge.prepare_capture(capture_path)
+        self.assertEqual(prepared.child_paths, parsed_here.child_paths)
+        self.assertEqual(prepared.fingerprints, parsed_here.fingerprints)
+        self.assertEqual([path for _, _, _, path in prepared.instances], [
+            Sdf.Path('/RootNode/instances/inst_AAA_0'), Sdf.Path('/RootNode/instances/inst_AAA_1')
+        ])
+        dest_stage = Usd.Stage.CreateInMemory()
+        report = capture_merge.apply_prepared_capture(prepared, dest_stage, 1e-4)
+        self.assertEqual(report.instances, capture_merge.MergeReport(kept=0, added=2, merged=0))
+        self.assertTrue(dest_stage.GetPrimAtPath('/RootNode/meshes/mesh_AAA/mesh'))
+        capture_merge.release_instance_index()
+        capture_merge.release_fingerprint_index()
+
+    async def test_fingerprint_covers_bindings_and_connections(self):
+        stage = Usd.Stage.CreateInMemory()
+        mesh = UsdGeom.Mesh.Define(stage, '/RootNode/meshes/mesh_AAA/mesh')
+        mesh.GetPrim().CreateRelationship('material:binding').SetTargets(['/RootNode/Looks/mat_AAA'])
+        shader = stage.DefinePrim('/RootNode/Looks/mat_AAA/Shader', 'Shader')
+        shader.CreateAttribute('outputs:out', Sdf.ValueTypeNames.Token)
+        material = stage.DefinePrim('/RootNode/Looks/mat_AAA', 'Material')
+        material.CreateAttribute('outputs:mdl:surface', Sdf.ValueTypeNames.Token).AddConnection(
+            '/RootNode/Looks/mat_AAA/Shader.outputs:out'
+        )
+        layer = stage.GetRootLayer()
+        mesh_fingerprint = capture_merge.compute_spec_fingerprint(layer, Sdf.Path('/RootNode/meshes/mesh_AAA'))
+        self.assertIsNotNone(mesh_fingerprint)
+        self.assertIsNotNone(capture_merge.compute_spec_fingerprint(layer, Sdf.Path('/RootNode/Looks/mat_AAA')))
+
+        mesh.GetPrim().GetRelationship('material:binding').SetTargets(['/RootNode/Looks/mat_BBB'])
+        self.assertNotEqual(
+            capture_merge.compute_spec_fingerprint(layer, Sdf.Path('/RootNode/meshes/mesh_AAA')), mesh_fingerprint
+        )
+
+    async def test_reimport_recopies_changed_material_binding(self):
+        capture_stage = create_capture_stage([])
+        mesh = UsdGeom.Mesh.Define(capture_stage, '/RootNode/meshes/mesh_AAA/mesh')
+        mesh.CreatePointsAttr([(0, 0, 0), (1, 0, 0)])
+        binding = mesh.GetPrim().CreateRelationship('material:binding')
+        binding.SetTargets(['/RootNode/Looks/mat_AAA'])
+        capture_layer = capture_stage.GetRootLayer()
+        dest_stage = Usd.Stage.CreateInMemory()
+        capture_merge.apply_prepared_capture(capture_merge.prepare_capture(capture_layer.identifier), dest_stage, 1e-4)
+
+        binding.SetTargets(['/RootNode/Looks/mat_BBB'])
+        prepared = capture_merge.prepare_capture(capture_layer.identifier)
+        report = capture_merge.apply_prepared_capture(prepared, dest_stage, 1e-4)
+
+        self.assertEqual(report.specs['meshes'], capture_merge.SpecReport(new=0, updated=1, reused=0))
+        dest_binding = dest_stage.GetRelationshipAtPath('/RootNode/meshes/mesh_AAA/mesh.material:binding')
+        self.assertEqual(dest_binding.GetTargets(), [Sdf.Path('/RootNode/Looks/mat_BBB')])
+        capture_merge.release_fingerprint_index()
@@ -0,0 +1,35 @@
+import omni.kit.commands
+import omni.kit.test
+import omni.kit.undo
+import omni.usd
+from pxr import Sdf
+
+from ekozerski.rtxremixtools import commands
+
+
+class TestCommands(omni.kit.test.AsyncTestCase):
+    async def setUp(self):
+        await omni.usd.get_context().new_stage_async()
+        self.stage = omni.usd.get_context().get_stage()
+
+    async def test_set_preserve_original_draw_call_is_a_single_undo(self):
+        mesh_paths = [Sdf.Path(f'/RootNode/meshes/mesh_{index}') for index in range(3)]
+        [self.stage.DefinePrim(path) for path in mesh_paths]
+        self.stage.GetPrimAtPath(mesh_paths[0]).CreateAttribute(
+            commands.PRESERVE_ORIGINAL_DRAW_CALL_ATTR, Sdf.ValueTypeNames.Int, custom=True
+        ).Set(1)
+
+        changes = commands.get_preserve_original_draw_call_changes(self.stage, mesh_paths, True)
+        self.assertEqual(changes, mesh_paths[1:])
+
+        omni.kit.commands.execute('SetPreserveOriginalDrawCallCommand', prim_paths=mesh_paths, enabled=True)
+        values = [
+            self.stage.GetPrimAtPath(path).GetAttribute(commands.PRESERVE_ORIGINAL_DRAW_CALL_ATTR).Get()
+            for path in mesh_paths
+        ]
+        self.assertEqual(values, [1, 1, 1])
+
+        omni.kit.undo.undo()
+        self.assertTrue(self.stage.GetPrimAtPath(mesh_paths[0]).GetAttribute('preserveOriginalDrawCall'))
+        self.assertFalse(self.stage.GetPrimAtPath(mesh_paths[1]).GetAttribute('preserveOriginalDrawCall'))
+        self.assertFalse(self.stage.GetPrimAtPath(mesh_paths[2]).GetAttribute('preserveOriginalDrawCall'))
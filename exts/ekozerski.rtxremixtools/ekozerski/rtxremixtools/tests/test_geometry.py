@@ -0,0 +1,159 @@
+import numpy
+import omni.kit.test
+from pxr import Usd, UsdGeom, Sdf, Vt
+
+from ekozerski.rtxremixtools.core import geometry
+
+
+def create_synthetic_mesh(stage, path, triangle_count):
+    """
+    Creates a triangulated mesh exported the way DCC tools usually do: indexed points and faceVarying normals/uvs.
+    """
+    vertex_count = triangle_count // 2 + 3
+    rng = numpy.random.default_rng(seed=triangle_count)
+    mesh = UsdGeom.Mesh.Define(stage, path)
+    mesh.CreatePointsAttr(Vt.Vec3fArray.FromNumpy(rng.random((vertex_count, 3), dtype=numpy.float32)))
+    mesh.CreateFaceVertexCountsAttr(Vt.IntArray.FromNumpy(numpy.full(triangle_count, 3, dtype=numpy.int32)))
+    face_vertex_indices = rng.integers(0, vertex_count, triangle_count * 3, dtype=numpy.int32)
+    mesh.CreateFaceVertexIndicesAttr(Vt.IntArray.FromNumpy(face_vertex_indices))
+    mesh.CreateNormalsAttr(Vt.Vec3fArray.FromNumpy(rng.random((triangle_count * 3, 3), dtype=numpy.float32)))
+    mesh.SetNormalsInterpolation(UsdGeom.Tokens.faceVarying)
+    primvar_api = UsdGeom.PrimvarsAPI(mesh)
+    st = primvar_api.CreatePrimvar('st', Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.faceVarying)
+    st.Set(Vt.Vec2fArray.FromNumpy(rng.random((triangle_count * 3, 2), dtype=numpy.float32)))
+    return mesh
+
+
+class TestGeometry(omni.kit.test.AsyncTestCase):
+    async def test_vectorized_conversion_matches_per_element(self):
+        stage = Usd.Stage.CreateInMemory()
+        per_element_mesh = create_synthetic_mesh(stage, '/per_element', 1000)
+        vectorized_mesh = create_synthetic_mesh(stage, '/vectorized', 1000)
+
+        geometry.convert_mesh_to_vertex_interpolation_mode(per_element_mesh, vectorized=False)
+        geometry.convert_mesh_to_vertex_interpolation_mode(vectorized_mesh, vectorized=True)
+
+        for attr_name in ['points', 'normals', 'faceVertexIndices', 'primvars:st']:
+            expected = per_element_mesh.GetPrim().GetAttribute(attr_name).Get()
+            result = vectorized_mesh.GetPrim().GetAttribute(attr_name).Get()
+            self.assertEqual(expected, result, attr_name)
+        self.assertEqual(vectorized_mesh.GetNormalsInterpolation(), UsdGeom.Tokens.vertex)
+
+    async def test_conversion_keeps_constant_primvars(self):
+        stage = Usd.Stage.CreateInMemory()
+        mesh = create_synthetic_mesh(stage, '/mesh', 10)
+        display_color = UsdGeom.PrimvarsAPI(mesh).CreatePrimvar(
+            'displayColor', Sdf.ValueTypeNames.Color3fArray, UsdGeom.Tokens.constant
+        )
+        display_color.Set([(1, 0, 0)])
+
+        geometry.convert_mesh_to_vertex_interpolation_mode(mesh)
+
+        self.assertEqual(display_color.GetInterpolation(), UsdGeom.Tokens.constant)
+        self.assertEqual(len(display_color.Get()), 1)
+
+    async def test_weld_vertices_after_conversion(self):
+        stage = Usd.Stage.CreateInMemory()
+        mesh = UsdGeom.Mesh.Define(stage, '/quad')
+        mesh.CreatePointsAttr([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)])
+        mesh.CreateFaceVertexCountsAttr([3, 3])
+        mesh.CreateFaceVertexIndicesAttr([0, 1, 2, 0, 2, 3])
+        mesh.CreateNormalsAttr([(0, 0, 1)] * 6)
+        mesh.SetNormalsInterpolation(UsdGeom.Tokens.faceVarying)
+
+        geometry.convert_mesh_to_vertex_interpolation_mode(mesh)
+        self.assertEqual(len(mesh.GetPointsAttr().Get()), 6)
+
+        geometry.weld_vertices(mesh)
+        self.assertEqual(len(mesh.GetPointsAttr().Get()), 4)
+        self.assertEqual(len(mesh.GetNormalsAttr().Get()), 4)
+        self.assertEqual(list(mesh.GetFaceVertexIndicesAttr().Get()), [0, 1, 2, 0, 2, 3])
+
+    async def test_weld_vertices_across_cell_borders(self):
+        stage = Usd.Stage.CreateInMemory()
+        mesh = UsdGeom.Mesh.Define(stage, '/triangles')
+        # Vertices 2e-8 apart on both sides of 0.0005, where rounding to a 1e-3 grid would split them.
+        mesh.CreatePointsAttr([
+            (0, 0, 0), (1, 0, 0), (0.0005 - 1e-8, 1, 0), (0.0005 + 1e-8, 1, 0), (1, 1, 0), (0, 2, 0)
+        ])
+        mesh.CreateFaceVertexCountsAttr([3, 3])
+        mesh.CreateFaceVertexIndicesAttr([0, 1, 2, 3, 4, 5])
+
+        geometry.weld_vertices(mesh, tolerance=1e-3)
+
+        self.assertEqual(len(mesh.GetPointsAttr().Get()), 5)
+        self.assertEqual(list(mesh.GetFaceVertexIndicesAttr().Get()), [0, 1, 2, 2, 3, 4])
+
+    async def test_triangulate_mesh_carries_primvars(self):
+        stage = Usd.Stage.CreateInMemory()
+        mesh = UsdGeom.Mesh.Define(stage, '/quads')
+        mesh.CreatePointsAttr([(0, 0, 0), (1, 0, 0), (2, 0, 0), (2, 1, 0), (1, 1, 0), (0, 1, 0)])
+        mesh.CreateFaceVertexCountsAttr([4, 4])
+        mesh.CreateFaceVertexIndicesAttr([0, 1, 4, 5, 1, 2, 3, 4])
+        primvar_api = UsdGeom.PrimvarsAPI(mesh)
+        st = primvar_api.CreatePrimvar('st', Sdf.ValueTypeNames.TexCoord2fArray, UsdGeom.Tokens.faceVarying)
+        st.Set([(i, i) for i in range(8)])
+        face_ids = primvar_api.CreatePrimvar('faceIds', Sdf.ValueTypeNames.IntArray, UsdGeom.Tokens.uniform)
+        face_ids.Set([10, 20])
+        subset = UsdGeom.Subset.CreateGeomSubset(mesh, 'second_face', UsdGeom.Tokens.face, [1])
+
+        self.assertTrue(geometry.triangulate_mesh(mesh))
+
+        self.assertEqual(list(mesh.GetFaceVertexCountsAttr().Get()), [3, 3, 3, 3])
+        self.assertEqual(list(mesh.GetFaceVertexIndicesAttr().Get()), [0, 1, 4, 0, 4, 5, 1, 2, 3, 1, 3, 4])
+        self.assertEqual([uv[0] for uv in st.Get()], [0, 1, 2, 0, 2, 3, 4, 5, 6, 4, 6, 7])
+        self.assertEqual(list(face_ids.Get()), [10, 10, 20, 20])
+        self.assertEqual(list(subset.GetIndicesAttr().Get()), [2, 3])
+        self.assertFalse(geometry.triangulate_mesh(mesh))
+
+    async def test_triangulate_concave_polygon(self):
+        stage = Usd.Stage.CreateInMemory()
+        mesh = UsdGeom.Mesh.Define(stage, '/dart')
+        mesh.CreatePointsAttr([(0, 0, 0), (2, 1, 0), (0, 2, 0), (1, 1, 0)])
+        mesh.CreateFaceVertexCountsAttr([4])
+        mesh.CreateFaceVertexIndicesAttr([0, 1, 2, 3])
+
+        geometry.triangulate_mesh(mesh)
+
+        points = numpy.asarray(mesh.GetPointsAttr().Get())
+        triangles = points[numpy.asarray(mesh.GetFaceVertexIndicesAttr().Get()).reshape(-1, 3)]
+        signed_areas = numpy.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])[:, 2]
+        self.assertEqual(len(triangles), 2)
+        self.assertTrue(numpy.all(signed_areas > 0))
+
+    async def test_export_stage_copies_mesh_specs(self):
+        source_stage = Usd.Stage.CreateInMemory()
+        mesh = create_synthetic_mesh(source_stage, '/RootNode/meshes/mesh_AAA/mesh', 1000).GetPrim()
+
+        stage, mesh_path = geometry.create_export_stage(mesh.GetPath().pathString, mesh)
+
+        new_mesh = UsdGeom.Mesh(stage.GetPrimAtPath(mesh_path))
+        self.assertEqual(mesh_path.pathString, '/root/mesh')
+        self.assertEqual(stage.GetDefaultPrim().GetPath().pathString, '/root')
+        self.assertEqual(new_mesh.GetPointsAttr().Get(), UsdGeom.Mesh(mesh).GetPointsAttr().Get())
+        self.assertEqual(new_mesh.GetNormalsInterpolation(), UsdGeom.Tokens.faceVarying)
+        self.assertEqual(UsdGeom.GetStageUpAxis(stage), UsdGeom.GetStageUpAxis(source_stage))
+
+    async def test_export_stage_flattens_layered_attributes(self):
+        weak_layer = Sdf.Layer.CreateAnonymous()
+        weak_stage = Usd.Stage.Open(weak_layer)
+        weak_mesh = create_synthetic_mesh(weak_stage, '/mesh', 10)
+        weak_mesh.GetNormalsAttr().SetMetadata('documentation', 'weak')
+        source_stage = Usd.Stage.CreateInMemory()
+        source_stage.GetRootLayer().subLayerPaths.append(weak_layer.identifier)
+        mesh = UsdGeom.Mesh(source_stage.GetPrimAtPath('/mesh'))
+        # The stronger layer only overrides the values, the interpolation staying authored in the weaker one.
+        stronger_normals = [(0, 0, 1)] * 30
+        mesh.GetNormalsAttr().Set(stronger_normals)
+        mesh.GetNormalsAttr().SetMetadata('documentation', 'strong')
+        mesh.GetPointsAttr().Set([(0, 0, 0)] * 8, Usd.TimeCode(1))
+
+        stage, mesh_path = geometry.create_export_stage('/mesh', mesh.GetPrim())
+
+        new_mesh = UsdGeom.Mesh(stage.GetPrimAtPath(mesh_path))
+        self.assertEqual(list(new_mesh.GetNormalsAttr().Get()), stronger_normals)
+        self.assertEqual(new_mesh.GetNormalsInterpolation(), UsdGeom.Tokens.faceVarying)
+        self.assertEqual(new_mesh.GetNormalsAttr().GetMetadata('documentation'), 'strong')
+        self.assertEqual(new_mesh.GetPointsAttr().GetTimeSamples(), [1.0])
+        # Time samples of the stronger layer don't drop the default value of the weaker one.
+        self.assertEqual(list(new_mesh.GetPointsAttr().Get()), list(weak_mesh.GetPointsAttr().Get()))
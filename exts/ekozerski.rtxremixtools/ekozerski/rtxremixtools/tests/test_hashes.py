@@ -0,0 +1,79 @@
+import omni.kit.test
+from pxr import Usd, Sdf
+
+from ekozerski.rtxremixtools.core import hashes
+
+
+def create_capture_stage():
+    stage = Usd.Stage.CreateInMemory()
+    for path in [
+        '/RootNode/meshes/mesh_AAA/mesh',
+        '/RootNode/meshes/mesh_BBB/mesh',
+        '/RootNode/instances/inst_AAA_0/mesh',
+        '/RootNode/instances/inst_AAA_1/mesh',
+        '/RootNode/instances/inst_BBB_0/mesh',
+    ]:
+        stage.DefinePrim(path)
+    return stage
+
+
+class TestHashes(omni.kit.test.AsyncTestCase):
+    async def tearDown(self):
+        hashes.release_hash_index()
+
+    async def test_find_source_mesh_hash_prims(self):
+        stage = create_capture_stage()
+        source_meshes = hashes.find_source_mesh_hash_prims(stage, [
+            '/RootNode/instances/inst_AAA_0/mesh',
+            '/RootNode/instances/inst_AAA_1',
+            '/RootNode/meshes/mesh_BBB/mesh',
+            '/RootNode',
+        ])
+        self.assertEqual(
+            sorted(prim.GetPath().pathString for prim in source_meshes),
+            ['/RootNode/meshes/mesh_AAA', '/RootNode/meshes/mesh_BBB'],
+        )
+
+    async def test_hash_index_follows_stage_changes(self):
+        stage = create_capture_stage()
+        hash_index = hashes.get_hash_index(stage)
+        self.assertEqual(len(hash_index.get_instance_paths('AAA')), 2)
+
+        stage.DefinePrim('/RootNode/instances/inst_AAA_2')
+        stage.RemovePrim('/RootNode/instances/inst_AAA_0')
+        stage.RemovePrim('/RootNode/meshes/mesh_BBB')
+
+        self.assertEqual(
+            [path.pathString for path in hash_index.get_instance_paths('AAA')],
+            ['/RootNode/instances/inst_AAA_1', '/RootNode/instances/inst_AAA_2'],
+        )
+        self.assertIsNone(hash_index.get_source_mesh_path('/RootNode/instances/inst_BBB_0'))
+        orphan_instance = stage.GetPrimAtPath('/RootNode/instances/inst_BBB_0')
+        self.assertIsNone(hashes.find_source_mesh_hash_prim(stage, orphan_instance))
+
+    async def test_get_instance_paths_from_instance(self):
+        stage = create_capture_stage()
+        hash_index = hashes.get_hash_index(stage)
+        mesh_hash = hash_index.get_owning_hash('/RootNode/instances/inst_AAA_1/mesh')
+        self.assertEqual(
+            [path.pathString for path in hash_index.get_instance_paths(mesh_hash)],
+            ['/RootNode/instances/inst_AAA_0', '/RootNode/instances/inst_AAA_1'],
+        )
+
+    async def test_get_free_child_name(self):
+        child_names = {'AperturePBR_Opacity_0', 'AperturePBR_Opacity_2', 'mesh'}
+        self.assertEqual(hashes.get_free_child_name(child_names, 'AperturePBR_Opacity'), 'AperturePBR_Opacity_1')
+        self.assertEqual(hashes.get_free_child_name(child_names, 'AperturePBR_Opacity'), 'AperturePBR_Opacity_3')
+
+    async def test_layer_classification(self):
+        self.assertEqual(
+            hashes.classify_layer_path('C:/game/rtx-remix/captures/meshes/mesh_AAA.usd'), hashes.LAYER_CAPTURE
+        )
+        self.assertEqual(hashes.classify_layer_path('C:/game/rtx-remix/mods/MyMod/mod.usda'), hashes.LAYER_MOD)
+        self.assertEqual(hashes.classify_layer_path('C:/projects/assets/chair.usda'), hashes.LAYER_OTHER)
+
+        layer = Sdf.Layer.CreateAnonymous()
+        classifier = hashes.LayerClassifier()
+        self.assertEqual(classifier.classify(layer), hashes.LAYER_OTHER)
+        self.assertIn(layer.identifier, classifier._classes)
+        classifier.release()
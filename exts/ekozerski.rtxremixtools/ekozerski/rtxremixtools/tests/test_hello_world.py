@@ -1,48 +1,34 @@
 # NOTE:
 #   omni.kit.test - std python's unittest module with additional wrapping to add suport for async/await tests
 #   For most things refer to unittest docs: https://docs.python.org/3/library/unittest.html
+import omni.kit.app
 import omni.kit.test
-
-# Extnsion for writing UI tests (simulate UI interaction)
-import omni.kit.ui_test as ui_test
+from omni.kit.actions.core import get_action_registry
 
 # Import extension python module we are testing with absolute import path, as if we are external user (other extension)
 import ekozerski.rtxremixtools
 
 
-# Having a test class dervived from omni.kit.test.AsyncTestCase declared on the root of module will make it auto-discoverable by omni.kit.test
-class Test(omni.kit.test.AsyncTestCase):
-    # Before running each test
-    async def setUp(self):
-        pass
+EXTENSION_NAME = "ekozerski.rtxremixtools"
 
-    # After running each test
-    async def tearDown(self):
-        pass
 
-    # Actual test, notice it is "async" function, so "await" can be used if needed
+# Having a test class dervived from omni.kit.test.AsyncTestCase declared on the root of module will make it auto-discoverable by omni.kit.test
+class Test(omni.kit.test.AsyncTestCase):
     @omni.kit.test.omni_test_registry(guid="f898a949-bacc-41f5-be56-b4eb8923f54e")
-    async def test_hello_public_function(self):
-        result = ekozerski.rtxremixtools.some_public_function(4)
-        self.assertEqual(result, 256)
-
+    async def test_extension_is_enabled(self):
+        ext_manager = omni.kit.app.get_app().get_extension_manager()
+        self.assertTrue(ext_manager.is_extension_enabled(EXTENSION_NAME))
+        self.assertTrue(hasattr(ekozerski.rtxremixtools, "RtxRemixTools"))
 
     @omni.kit.test.omni_test_registry(guid="4626d574-659f-4a85-8958-9fa8588fbce3")
-    async def test_window_button(self):
-
-        # Find a label in our window
-        label = ui_test.find("My Window//Frame/**/Label[*]")
-
-        # Find buttons in our window
-        add_button = ui_test.find("My Window//Frame/**/Button[*].text=='Add'")
-        reset_button = ui_test.find("My Window//Frame/**/Button[*].text=='Reset'")
-
-        # Click reset button
-        await reset_button.click()
-        self.assertEqual(label.widget.text, "empty")
+    async def test_actions_are_registered(self):
+        ext_id = omni.kit.app.get_app().get_extension_manager().get_enabled_extension_id(EXTENSION_NAME)
+        action_registry = get_action_registry()
+        for action_id in ["select_source_mesh", "select_mesh_instances"]:
+            self.assertIsNotNone(action_registry.get_action(ext_id, action_id), action_id)
 
-        await add_button.click()
-        self.assertEqual(label.widget.text, "count: 1")
+    async def test_brush_is_registered_by_its_type(self):
+        # The extension registers the brush without importing it, so the type it registers must stay in sync.
+        from ekozerski.rtxremixtools import brush, commons
 
-        await add_button.click()
-        self.assertEqual(label.widget.text, "count: 2")
+        self.assertEqual(brush.RemixScatterBrush.get_type(), commons.BRUSH_TYPE)
@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+
+import omni.kit.test
+
+from ekozerski.rtxremixtools import profiling
+
+
+class TestProfiling(omni.kit.test.AsyncTestCase):
+    async def setUp(self):
+        profiling.clear()
+
+    async def tearDown(self):
+        profiling.set_enabled(False)
+        profiling.clear()
+
+    async def test_nothing_recorded_when_disabled(self):
+        profiling.set_enabled(False)
+        with profiling.trace("disabled", prims=1) as span:
+            span.set(points=3)
+        self.assertFalse(span)
+        self.assertEqual(profiling.get_events(), [])
+
+    async def test_trace_and_export_chrome_trace(self):
+        profiling.set_enabled(True, buffer_size=2)
+
+        @profiling.traced("decorated")
+        def decorated():
+            with profiling.trace("phase", prims=2) as span:
+                span.set(points=6)
+
+        [decorated() for _ in range(2)]
+        # Only the 2 latest events are kept by the ring buffer.
+        self.assertEqual([event.name for event in profiling.get_events()], ["phase", "decorated"])
+        self.assertEqual(profiling.summarize()["decorated"][0], 1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = profiling.export_chrome_trace(os.path.join(tmp_dir, "trace.json"))
+            with open(output_path) as f:
+                trace_events = json.load(f)["traceEvents"]
+        self.assertEqual(trace_events[0]["args"], {"prims": 2, "points": 6})
+        self.assertEqual(trace_events[0]["ph"], "X")